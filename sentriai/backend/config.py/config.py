@@ -54,6 +54,9 @@ class Settings(BaseSettings):
     YOLO_MODEL_PATH: str = "models/yolov8n.pt"
     CROWD_DETECTION_MODEL: str = "models/crowd_detection.h5"
     PANIC_DETECTION_MODEL: str = "models/panic_audio.h5"
+    MOTION_ANOMALY_MODEL: str = "models/motion_anomaly.joblib"
+    ZONE_BASELINE_PATH: str = "models/zone_baselines.json"
+    ZONE_BASELINE_SAVE_INTERVAL: float = 300.0  # seconds
     
     # Computer Vision Settings
     FRAME_SKIP: int = 3  # Process every nth frame
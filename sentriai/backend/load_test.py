@@ -0,0 +1,209 @@
+import argparse
+import contextlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from utils.camera_workers import analyze_frame, create_analyzers
+from utils.latency_tracing import tracer
+from utils.video_processing import MultiCameraProcessor
+
+
+def synthetic_url(index, width=640, height=480, fps=15.0, people=8, noise=0.0):
+    return f"synthetic://cam-{index}?width={width}&height={height}&fps={fps}&people={people}&noise={noise}"
+
+
+@contextlib.contextmanager
+def _quiet(enabled=True):
+    """Silence the per-camera connect/start prints of large steps"""
+    if not enabled:
+        yield
+        return
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def _make_analyze(capacity=1.0):
+    """Production per-frame pipeline (camera_workers.analyze_frame) as a DetectionScheduler analyze callable"""
+    from models.crowd_detection import CrowdDetector
+    from models.occupancy_forecast import default_forecaster
+    
+    local = threading.local()  # One HOG detector per worker thread
+    models = {}  # camera_id -> (AnomalyDetector, RiskScorer)
+    lock = threading.Lock()
+    
+    def analyze(camera_id, frame, captured_at):
+        detector = getattr(local, 'detector', None)
+        if detector is None:
+            detector = local.detector = CrowdDetector()
+        with lock:
+            if camera_id not in models:
+                models[camera_id] = create_analyzers(camera_id)
+        anomaly_detector, risk_scorer = models[camera_id]
+        return analyze_frame(frame, detector, anomaly_detector, risk_scorer, capacity, tracer.current(),
+                             timestamp=captured_at, forecaster=default_forecaster())
+    
+    return analyze
+
+
+def _counters(multi, scheduler):
+    """Per-camera (frames captured, analyses, render seconds) plus process CPU time"""
+    cameras = {}
+    for camera_id, processor in multi.cameras.items():
+        cap = processor.cap
+        cameras[camera_id] = (
+            processor.frame_count + processor.frames_grabbed,
+            scheduler.cameras[camera_id]['analyses'] if scheduler and camera_id in scheduler.cameras else 0,
+            getattr(cap, 'render_time', 0.0)
+        )
+    return cameras, time.process_time()
+
+
+def run_step(num_cameras, fps=15.0, width=640, height=480, people=8, noise=0.0, mode='detect',
+             analysis_fps=1.0, workers=None, duration=10.0, warmup=3.0, min_ratio=0.9, max_cpu=0.85,
+             quiet=True):
+    """
+    Drive num_cameras synthetic cameras for warmup + duration seconds and measure what was achieved
+    :param mode: 'capture' (ingest only) or 'detect' (plus the full analysis pipeline at analysis_fps per
+                 camera through a shared DetectionScheduler)
+    :param workers: Detection worker threads (default: CPU count)
+    :param min_ratio: Achieved / target rate every camera (10th percentile) must reach to count as sustained
+    :param max_cpu: CPU utilization (of all cores) above which a step does not count as sustained
+    :return: Measured rates, CPU cost per camera and whether the load was sustained
+    """
+    if mode not in ('capture', 'detect'):
+        raise ValueError(f"Unknown mode: {mode}")
+    cores = os.cpu_count() or 1
+    multi = MultiCameraProcessor()
+    scheduler = None
+    with _quiet(quiet):
+        for index in range(num_cameras):
+            multi.add_camera(f"cam-{index}", synthetic_url(index, width, height, fps, people, noise))
+        multi.start_all()
+        if mode == 'detect':
+            scheduler = multi.create_scheduler(_make_analyze(), pool_size=workers or cores,
+                                               min_rate=analysis_fps, base_rate=analysis_fps,
+                                               max_rate=analysis_fps)
+            scheduler.start()
+    
+    try:
+        time.sleep(warmup)
+        before, cpu_before = _counters(multi, scheduler)
+        start_time = time.time()
+        time.sleep(duration)
+        after, cpu_after = _counters(multi, scheduler)
+        elapsed = time.time() - start_time
+    finally:
+        with _quiet(quiet):
+            if scheduler:
+                scheduler.stop()
+            multi.stop_all()
+    
+    capture_rates = np.array([(after[cid][0] - before[cid][0]) / elapsed for cid in after])
+    analysis_rates = np.array([(after[cid][1] - before[cid][1]) / elapsed for cid in after])
+    render_seconds = sum(after[cid][2] - before[cid][2] for cid in after)
+    cpu_seconds = cpu_after - cpu_before
+    cpu_utilization = cpu_seconds / (elapsed * cores)
+    
+    capture_ok = np.percentile(capture_rates, 10) >= min_ratio * fps
+    analysis_ok = mode == 'capture' or np.percentile(analysis_rates, 10) >= min_ratio * analysis_fps
+    # Cores busy per camera, with and without the cost of generating the synthetic frames
+    cpu_per_camera = cpu_seconds / elapsed / num_cameras
+    generator_per_camera = render_seconds / elapsed / num_cameras
+    
+    return {
+        'cameras': num_cameras,
+        'mode': mode,
+        'elapsed': round(elapsed, 2),
+        'target_fps': fps,
+        'capture_fps_mean': round(float(capture_rates.mean()), 2),
+        'capture_fps_p10': round(float(np.percentile(capture_rates, 10)), 2),
+        'target_analysis_fps': analysis_fps if mode == 'detect' else None,
+        'analysis_fps_mean': round(float(analysis_rates.mean()), 2) if mode == 'detect' else None,
+        'analysis_fps_p10': round(float(np.percentile(analysis_rates, 10)), 2) if mode == 'detect' else None,
+        'detection_latency_ms': scheduler.get_stats()['latency_ms'] if scheduler else None,
+        'cpu_utilization': round(cpu_utilization, 3),
+        'cpu_per_camera': round(cpu_per_camera, 4),
+        'generator_cpu_per_camera': round(generator_per_camera, 4),
+        'sustained': bool(capture_ok and analysis_ok and cpu_utilization <= max_cpu)
+    }
+
+
+def run_ramp(camera_counts, stop_on_failure=True, max_cpu=0.85, **options):
+    """
+    Run steps with increasing camera counts and report the sustainable camera count per core
+    :return: {'steps': [...], 'max_sustained_cameras', 'cameras_per_core', 'estimated_cameras_per_core', ...}
+    """
+    cores = os.cpu_count() or 1
+    steps = []
+    for num_cameras in sorted(camera_counts):
+        step = run_step(num_cameras, max_cpu=max_cpu, **options)
+        steps.append(step)
+        print(f"{'✅' if step['sustained'] else '❌'} {num_cameras:>4} cameras: "
+              f"capture {step['capture_fps_p10']}/{step['target_fps']} fps (p10)"
+              + (f", analysis {step['analysis_fps_p10']}/{step['target_analysis_fps']} per s (p10), "
+                 f"latency {step['detection_latency_ms']} ms" if step['mode'] == 'detect' else '')
+              + f", CPU {step['cpu_utilization'] * 100:.0f}%")
+        if not step['sustained'] and stop_on_failure:
+            break
+    
+    sustained = [step for step in steps if step['sustained']]
+    best = max(sustained, key=lambda step: step['cameras'], default=None)
+    # Extrapolated from the measured CPU cost per camera (useful when the ramp never saturates)
+    estimate = estimate_without_generator = None
+    if best and best['cpu_per_camera'] > 0:
+        estimate = round(max_cpu / best['cpu_per_camera'], 2)
+        real_cost = best['cpu_per_camera'] - best['generator_cpu_per_camera']
+        if real_cost > 0:
+            estimate_without_generator = round(max_cpu / real_cost, 2)
+    return {
+        'cores': cores,
+        'steps': steps,
+        'max_sustained_cameras': best['cameras'] if best else 0,
+        'cameras_per_core': round(best['cameras'] / cores, 2) if best else 0.0,
+        'estimated_cameras_per_core': estimate,
+        'estimated_cameras_per_core_without_generator': estimate_without_generator
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Drive the backend with synthetic cameras and report the "
+                                                 "sustainable camera count per core")
+    parser.add_argument("--cameras", default="10,20,50,100,200", help="Comma-separated camera counts to ramp")
+    parser.add_argument("--mode", choices=['capture', 'detect'], default='detect',
+                        help="Ingest only, or ingest plus the full analysis pipeline")
+    parser.add_argument("--fps", type=float, default=15.0, help="Frame rate per camera")
+    parser.add_argument("--width", type=int, default=640, help="Frame width")
+    parser.add_argument("--height", type=int, default=480, help="Frame height")
+    parser.add_argument("--people", type=int, default=8, help="Moving figures per scene")
+    parser.add_argument("--noise", type=float, default=0.0, help="Sensor noise standard deviation")
+    parser.add_argument("--analysis-fps", type=float, default=1.0, help="Analyses per second per camera")
+    parser.add_argument("--workers", type=int, default=None, help="Detection threads (default: CPU count)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Measured seconds per step")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Seconds before measuring each step")
+    parser.add_argument("--min-ratio", type=float, default=0.9, help="Achieved/target rate to count as sustained")
+    parser.add_argument("--max-cpu", type=float, default=0.85, help="CPU utilization limit for a sustained step")
+    parser.add_argument("--keep-going", action='store_true', help="Run all steps even after one fails")
+    parser.add_argument("--verbose", action='store_true', help="Show per-camera output")
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+    
+    report = run_ramp([int(count) for count in args.cameras.split(',')], stop_on_failure=not args.keep_going,
+                      max_cpu=args.max_cpu, fps=args.fps, width=args.width, height=args.height,
+                      people=args.people, noise=args.noise, mode=args.mode, analysis_fps=args.analysis_fps,
+                      workers=args.workers, duration=args.duration, warmup=args.warmup,
+                      min_ratio=args.min_ratio, quiet=not args.verbose)
+    
+    print(f"📊 {report['max_sustained_cameras']} cameras sustained on {report['cores']} cores "
+          f"= {report['cameras_per_core']} cameras per core")
+    if report['estimated_cameras_per_core'] is not None:
+        print(f"📈 Estimated from CPU cost: {report['estimated_cameras_per_core']} cameras per core "
+              f"({report['estimated_cameras_per_core_without_generator']} without the synthetic generator)")
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report saved to {args.output}")
@@ -1,8 +1,28 @@
 import cv2
 import numpy as np
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from numpy.lib.stride_tricks import sliding_window_view
 import time
 
+from models.crowd_pressure import CrowdPressureTracker
+from models.flow_analysis import FlowAnalyzer
+
+
+def _prepare_gray(frame):
+    """Grayscale + blur used by all frame-difference motion measurements"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.GaussianBlur(gray, (21, 21), 0)
+
+
+def _motion_intensity(prev_gray, gray):
+    """Fraction of the frame that changed between two prepared gray frames"""
+    frame_delta = cv2.absdiff(prev_gray, gray)
+    thresh = cv2.threshold(frame_delta, 25, 255, cv2.THRESH_BINARY)[1]
+    thresh = cv2.dilate(thresh, None, iterations=2)
+    return np.sum(thresh) / (gray.shape[0] * gray.shape[1] * 255)
+
+
 class AnomalyDetector:
     """
     Detects anomalies in crowd behavior including:
@@ -12,31 +32,52 @@ class AnomalyDetector:
     - Stationary overcrowding
     """
     
-    def __init__(self):
+    def __init__(self, zone_id='default', baseline=None, flow_analyzer=None, anomaly_model=None,
+                 pressure_tracker=None):
+        """
+        :param zone_id: Camera/zone identifier used to key learned baselines
+        :param baseline: Optional ZoneBaseline; once warm, z-scores replace the fixed
+                         motion, rate-of-change and flow-variance thresholds
+        :param flow_analyzer: Optical-flow grid analyzer (a default FlowAnalyzer if None)
+        :param anomaly_model: Optional MotionAnomalyModel (usually shared by all cameras) whose
+                              learned score is added to comprehensive_analysis
+        :param pressure_tracker: Crowd-pressure field tracker (a default CrowdPressureTracker if None)
+        """
+        self.zone_id = zone_id
+        self.baseline = baseline
+        self.flow_analyzer = flow_analyzer or FlowAnalyzer()
+        self.anomaly_model = anomaly_model
+        self.pressure_tracker = pressure_tracker or CrowdPressureTracker()
         self.prev_frame = None
+        self.current_time = None  # Footage time of the frame being analyzed (None = wall clock)
         self.motion_history = deque(maxlen=30)  # Store last 30 frames of motion
         self.density_history = deque(maxlen=50)
         self.anomaly_threshold = 0.7
         
+        # Rule thresholds shared by live analysis and offline clip replay
+        self.rule_thresholds = {
+            'panic_motion': 0.3,
+            'panic_variance': 0.01,
+            'static_motion': 0.05,
+            'static_density': 0.6,
+            'spike_rate': 0.4,
+            'spike_density': 0.5,
+            'chaotic_variance': 5000
+        }
+    
     def detect_motion_anomaly(self, frame):
         """
         Detects sudden unusual motion patterns that might indicate panic
         Returns: dict with anomaly info
         """
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        gray = cv2.GaussianBlur(gray, (21, 21), 0)
+        gray = _prepare_gray(frame)
         
         if self.prev_frame is None:
             self.prev_frame = gray
             return {"anomaly_detected": False, "type": None, "severity": 0}
         
-        # Calculate frame difference
-        frame_delta = cv2.absdiff(self.prev_frame, gray)
-        thresh = cv2.threshold(frame_delta, 25, 255, cv2.THRESH_BINARY)[1]
-        thresh = cv2.dilate(thresh, None, iterations=2)
-        
-        # Calculate motion intensity
-        motion_intensity = np.sum(thresh) / (frame.shape[0] * frame.shape[1] * 255)
+        # Calculate motion intensity from frame difference
+        motion_intensity = _motion_intensity(self.prev_frame, gray)
         self.motion_history.append(motion_intensity)
         
         # Detect anomalies
@@ -53,27 +94,31 @@ class AnomalyDetector:
         recent_motion = list(self.motion_history)[-10:]
         avg_motion = np.mean(recent_motion)
         motion_variance = np.var(recent_motion)
+        thresholds = self.rule_thresholds
+        motion_z = self._baseline_z('avg_motion', avg_motion)
         
         # Detect sudden spike in motion (possible panic)
-        if avg_motion > 0.3 and motion_variance > 0.01:
+        if (self._exceeds(motion_z, avg_motion, thresholds['panic_motion']) and
+                motion_variance > thresholds['panic_variance']):
             return {
                 "anomaly_detected": True,
                 "type": "PANIC_MOVEMENT",
                 "severity": min(avg_motion * 3, 1.0),
                 "description": "Sudden rapid crowd movement detected",
-                "timestamp": time.time()
+                "z_score": motion_z,
+                "timestamp": self._now()
             }
         
         # Detect unusual stillness in high-density area
-        if avg_motion < 0.05 and len(self.density_history) > 0:
+        if avg_motion < thresholds['static_motion'] and len(self.density_history) > 0:
             avg_density = np.mean(list(self.density_history)[-10:])
-            if avg_density > 0.6:
+            if avg_density > thresholds['static_density']:
                 return {
                     "anomaly_detected": True,
                     "type": "OVERCROWDING_STATIC",
                     "severity": avg_density,
                     "description": "Dangerous static overcrowding detected",
-                    "timestamp": time.time()
+                    "timestamp": self._now()
                 }
         
         return {"anomaly_detected": False, "type": None, "severity": 0}
@@ -132,13 +177,16 @@ class AnomalyDetector:
         older_avg = np.mean(older)
         
         rate_of_change = (recent_avg - older_avg) / older_avg if older_avg > 0 else 0
+        rate_z = self._baseline_z('rate_of_change', rate_of_change)
         
-        # Alert if density increased by more than 40% in short time
-        spike_detected = rate_of_change > 0.4 and recent_avg > 0.5
+        # Alert if density increased by more than 40% (or the zone's learned norm) in short time
+        spike_detected = (self._exceeds(rate_z, rate_of_change, self.rule_thresholds['spike_rate']) and
+                          recent_avg > self.rule_thresholds['spike_density'])
         
         return {
             "spike_detected": spike_detected,
             "rate_of_change": rate_of_change,
+            "z_score": rate_z,
             "current_density": current_density,
             "severity": "HIGH" if spike_detected else "NORMAL",
             "description": "Rapid crowd accumulation detected" if spike_detected else None
@@ -146,8 +194,17 @@ class AnomalyDetector:
     
     def analyze_crowd_flow(self, frame, person_detections):
         """
-        Analyze crowd movement patterns to detect bottlenecks or unusual flow
+        Analyze crowd movement patterns to detect bottlenecks, counter-flow or chaotic flow
+        - Optical-flow grid analysis (direction histograms, convergence, speed vs density)
+        - Variance of tracked person velocities, when trackers provide them
         """
+        # The grid analyzer runs on every frame so it always has the previous frame. It needs no
+        # person count: HOG often finds only a few people in exactly the dense crowds it flags
+        grid_result = self.flow_analyzer.analyze(frame, person_detections)
+        if grid_result["flow_anomaly"]:
+            return grid_result
+        
+        # Tracker velocity variance is only meaningful with enough people
         if len(person_detections) < 5:
             return {"flow_anomaly": False, "pattern": "NORMAL"}
         
@@ -157,32 +214,37 @@ class AnomalyDetector:
             if 'velocity' in person:
                 movements.append(person['velocity'])
         
-        if len(movements) < 3:
-            return {"flow_anomaly": False, "pattern": "NORMAL"}
-        
-        movements = np.array(movements)
-        
-        # Check for opposing flows (people moving in opposite directions)
-        mean_direction = np.mean(movements, axis=0)
-        direction_variance = np.var(movements, axis=0)
-        
-        # High variance = chaotic movement
-        if np.sum(direction_variance) > 5000:
-            return {
-                "flow_anomaly": True,
-                "pattern": "CHAOTIC",
-                "description": "Disorganized crowd movement detected",
-                "severity": 0.8
-            }
+        if len(movements) >= 3:
+            movements = np.array(movements)
+            
+            # Check for opposing flows (people moving in opposite directions)
+            direction_variance = np.var(movements, axis=0)
+            total_variance = np.sum(direction_variance)
+            variance_z = self._baseline_z('direction_variance', total_variance)
+            
+            # High variance = chaotic movement
+            if self._exceeds(variance_z, total_variance, self.rule_thresholds['chaotic_variance']):
+                return {
+                    "flow_anomaly": True,
+                    "pattern": "CHAOTIC",
+                    "description": "Disorganized crowd movement detected",
+                    "severity": 0.8,
+                    "z_score": variance_z,
+                    "cells": next((p["cells"] for p in grid_result["patterns"]
+                                   if p["pattern"] == "CHAOTIC"), [])
+                }
         
         return {"flow_anomaly": False, "pattern": "NORMAL"}
     
-    def comprehensive_analysis(self, frame, person_detections, current_density):
+    def comprehensive_analysis(self, frame, person_detections, current_density, timestamp=None):
         """
         Run all anomaly detection methods and return comprehensive report
+        :param timestamp: Capture time of the frame in unix seconds (default: now); recorded footage
+                          passes its own time so baselines bucket by when it was filmed
         """
+        self.current_time = timestamp
         results = {
-            "timestamp": time.time(),
+            "timestamp": self._now(),
             "anomalies": [],
             "overall_risk": "LOW"
         }
@@ -207,18 +269,43 @@ class AnomalyDetector:
             results["anomalies"].append({
                 "type": "DENSITY_SPIKE",
                 "severity": 0.9,
-                "description": density_result["description"]
+                "description": density_result["description"],
+                "z_score": density_result["z_score"]
             })
         
         # Crowd flow analysis
         flow_result = self.analyze_crowd_flow(frame, person_detections)
+        results["flow"] = flow_result
         if flow_result["flow_anomaly"]:
             results["anomalies"].append({
                 "type": "FLOW_ANOMALY",
+                "pattern": flow_result["pattern"],
                 "severity": flow_result.get("severity", 0.7),
-                "description": flow_result["description"]
+                "description": flow_result["description"],
+                "cells": flow_result.get("cells", []),
+                "z_score": flow_result.get("z_score")
             })
         
+        # Crowd pressure (density x local velocity variance) on the flow grid
+        flow_grid = self.flow_analyzer.last_grid
+        if flow_grid is not None:
+            pressure = self.pressure_tracker.update(flow_grid['occupancy'], flow_grid['velocity_variance'])
+            results["pressure"] = pressure
+            if pressure["pressure_detected"]:
+                results["anomalies"].append({
+                    "type": "CROWD_PRESSURE",
+                    "severity": max(pressure["severity"], 0.6),
+                    "description": "Crowd pressure building - possible crush precursor",
+                    "cells": [h["cell"] for h in pressure["hotspots"]]
+                })
+        
+        # Learned motion-feature score (micro-batched across cameras by the model)
+        if self.anomaly_model is not None:
+            motion = self.motion_history[-1] if self.motion_history else 0.0
+            features = self.anomaly_model.build_features(
+                self.flow_analyzer.last_grid, motion, current_density, self.flow_analyzer.num_bins)
+            results["learned_anomaly"] = self.anomaly_model.submit(self.zone_id, features)
+        
         # Calculate overall risk
         if len(results["anomalies"]) > 0:
             max_severity = max([a["severity"] for a in results["anomalies"]])
@@ -231,11 +318,269 @@ class AnomalyDetector:
         
         return results
     
+    def _baseline_z(self, metric, value):
+        """Score a metric against this zone's learned baseline (None without a warm baseline)"""
+        if self.baseline is None:
+            return None
+        return self.baseline.update(self.zone_id, metric, value, self.current_time)
+    
+    def _now(self):
+        """Time of the frame being analyzed"""
+        return time.time() if self.current_time is None else self.current_time
+    
+    def _exceeds(self, z_score, value, fixed_threshold):
+        """Use the z-score once the baseline is warm, otherwise the fixed threshold"""
+        if z_score is None:
+            return value > fixed_threshold
+        return z_score > self.baseline.z_threshold
+    
+    # ==================== OFFLINE CLIP REPLAY ====================
+    
+    def analyze_clip(self, video_path, frame_step=1, workers=4, density_fn=None, start_time=None):
+        """
+        Replay a recorded clip through the temporal anomaly rules, much faster than real time.
+        Sampled frames are decoded in parallel chunks (each worker owns its own capture),
+        then the rules run vectorized over the whole motion/density series.
+        :param video_path: Path to a recorded video (e.g. output/*.mp4)
+        :param frame_step: Analyze every Nth frame (skipped frames are grabbed, not decoded)
+        :param workers: Number of decode threads
+        :param density_fn: Optional callable frame -> density (same units as comprehensive_analysis);
+                           called from worker threads. Without it density is 0 and only motion rules fire.
+        :param start_time: Unix time the clip starts at (baseline time-of-day buckets, default: now)
+        :return: dict with per-sample series, per-rule flags, the list of anomaly events and the
+                 number of sampled frames that failed to decode (kept as NaN samples)
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video: {video_path}")
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        cap.release()
+        
+        frame_step = max(1, int(frame_step))
+        sample_indices = np.arange(0, total_frames, frame_step)
+        if len(sample_indices) == 0:
+            result = self.analyze_series([], [], [])
+            result['failed_reads'] = 0
+            return result
+        
+        # A few chunks per worker keeps threads busy when chunks decode at different speeds
+        num_chunks = max(1, min(len(sample_indices), workers * 4))
+        chunks = [c for c in np.array_split(sample_indices, num_chunks) if len(c) > 0]
+        
+        def decode_chunk(indices):
+            return self._decode_chunk(video_path, indices, frame_step, density_fn)
+        
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            chunk_results = list(executor.map(decode_chunk, chunks))
+        
+        frame_indices = np.concatenate([r[0] for r in chunk_results])
+        motion = np.concatenate([r[1] for r in chunk_results])
+        density = np.concatenate([r[2] for r in chunk_results])
+        failed_reads = sum(r[3] for r in chunk_results)
+        if failed_reads:
+            print(f"⚠️ {video_path}: {failed_reads} sampled frames could not be decoded")
+        
+        result = self.analyze_series(motion, density, frame_indices / fps, start_time)
+        result['failed_reads'] = failed_reads
+        result['source'] = video_path
+        result['fps'] = fps
+        result['frame_step'] = frame_step
+        result['frame_indices'] = frame_indices
+        return result
+    
+    @staticmethod
+    def _decode_chunk(video_path, indices, frame_step, density_fn):
+        """
+        Decode one chunk of sampled frames and measure motion against the previous sample.
+        The sample preceding the chunk is decoded as well so chunk boundaries get a motion value.
+        A frame that fails to decode becomes a NaN sample (and the next one has no motion value);
+        reading carries on with the following samples.
+        :return: (frame indices, motion, density, failed reads)
+        """
+        cap = cv2.VideoCapture(video_path)
+        first = int(indices[0])
+        prev_index = first - frame_step if first > 0 else None
+        targets = ([prev_index] if prev_index is not None else []) + [int(i) for i in indices]
+        
+        cap.set(cv2.CAP_PROP_POS_FRAMES, targets[0])
+        position = targets[0]
+        prev_gray = None
+        read_indices, motion, density = [], [], []
+        failed_reads = 0
+        
+        for target in targets:
+            # Frames between samples are grabbed without decoding
+            while position < target:
+                cap.grab()
+                position += 1
+            ret, frame = cap.read()
+            position += 1
+            if not ret:
+                prev_gray = None
+                if target != prev_index:
+                    failed_reads += 1
+                    read_indices.append(target)
+                    motion.append(np.nan)
+                    density.append(np.nan)
+                continue
+            
+            gray = _prepare_gray(frame)
+            if target != prev_index:
+                read_indices.append(target)
+                motion.append(_motion_intensity(prev_gray, gray) if prev_gray is not None else np.nan)
+                density.append(density_fn(frame) if density_fn else 0.0)
+            prev_gray = gray
+        
+        cap.release()
+        return (np.array(read_indices, dtype=np.int64),
+                np.array(motion, dtype=np.float64),
+                np.array(density, dtype=np.float64),
+                failed_reads)
+    
+    def analyze_series(self, motion, density, timestamps=None, start_time=None):
+        """
+        Run the temporal rules vectorized over a whole motion/density series.
+        Sample t sees the same windows comprehensive_analysis would see at frame t:
+        - PANIC_MOVEMENT / OVERCROWDING_STATIC over the last 10 motion values
+          (static overcrowding uses densities up to t-1, as in the live call order)
+        - DENSITY_SPIKE comparing the last 10 densities with the 10 before them
+        With a baseline the window values are scored and folded into it in sample order, so
+        warm zones use the same z-scores as live analysis.
+        :param motion: Motion intensity per sample (first value is ignored, there is no previous frame)
+        :param density: Density per sample
+        :param timestamps: Optional timestamps in seconds (defaults to sample index)
+        :param start_time: Unix time of timestamp 0, for the baseline's time-of-day buckets (default: now)
+        :return: dict with series, flags per anomaly type, events and summary counts
+        """
+        motion = np.asarray(motion, dtype=np.float64)
+        density = np.asarray(density, dtype=np.float64)
+        n = len(density)
+        timestamps = np.arange(n, dtype=np.float64) if timestamps is None else np.asarray(timestamps, dtype=np.float64)
+        thresholds = self.rule_thresholds
+        
+        clock = None if start_time is None else start_time + timestamps
+        panic = np.zeros(n, dtype=bool)
+        static = np.zeros(n, dtype=bool)
+        spike = np.zeros(n, dtype=bool)
+        avg_motion = np.full(n, np.nan)
+        motion_z = np.full(n, np.nan)
+        rate_z = np.full(n, np.nan)
+        static_density = np.full(n, np.nan)
+        
+        # Prefix sums give any trailing density mean in O(1); NaN samples (failed decodes) are left out
+        known = ~np.isnan(density)
+        density_cumsum = np.concatenate(([0.0], np.cumsum(np.where(known, density, 0.0))))
+        known_cumsum = np.concatenate(([0], np.cumsum(known)))
+        
+        def window_mean(start, end):
+            counts = known_cumsum[end] - known_cumsum[start]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                return np.where(counts > 0, (density_cumsum[end] - density_cumsum[start]) / counts, np.nan)
+        
+        # Motion rules: window of 10 motion values (motion starts at sample 1)
+        if n >= 11:
+            windows = sliding_window_view(motion[1:], 10)
+            t = np.arange(10, n)
+            avg_motion[t] = windows.mean(axis=1)
+            motion_variance = windows.var(axis=1)
+            motion_z[t] = self._series_z('avg_motion', avg_motion, t, clock)
+            panic[t] = (self._series_exceeds(motion_z[t], avg_motion[t], thresholds['panic_motion']) &
+                        (motion_variance > thresholds['panic_variance']))
+            
+            lo = np.maximum(t - 10, 0)
+            static_density[t] = window_mean(lo, t)
+            static[t] = (~panic[t] &
+                         (avg_motion[t] < thresholds['static_motion']) &
+                         (static_density[t] > thresholds['static_density']))
+        
+        # Density spike rule: last 10 vs previous 10 densities
+        rate_of_change = np.zeros(n)
+        if n >= 20:
+            t = np.arange(19, n)
+            recent = window_mean(t - 9, t + 1)
+            older = window_mean(t - 19, t - 9)
+            safe_older = np.where(older > 0, older, 1.0)
+            rate_of_change[t] = np.where(older > 0, (recent - older) / safe_older,
+                                         np.where(np.isnan(older) | np.isnan(recent), np.nan, 0.0))
+            rate_z[t] = self._series_z('rate_of_change', rate_of_change, t, clock)
+            spike[t] = (self._series_exceeds(rate_z[t], rate_of_change[t], thresholds['spike_rate']) &
+                        (recent > thresholds['spike_density']))
+        
+        severities = {
+            'PANIC_MOVEMENT': np.minimum(np.nan_to_num(avg_motion) * 3, 1.0),
+            'OVERCROWDING_STATIC': np.nan_to_num(static_density),
+            'DENSITY_SPIKE': np.full(n, 0.9)
+        }
+        descriptions = {
+            'PANIC_MOVEMENT': "Sudden rapid crowd movement detected",
+            'OVERCROWDING_STATIC': "Dangerous static overcrowding detected",
+            'DENSITY_SPIKE': "Rapid crowd accumulation detected"
+        }
+        flags = {
+            'PANIC_MOVEMENT': panic,
+            'OVERCROWDING_STATIC': static,
+            'DENSITY_SPIKE': spike
+        }
+        
+        events = []
+        for anomaly_type, mask in flags.items():
+            for idx in np.flatnonzero(mask):
+                events.append({
+                    'type': anomaly_type,
+                    'sample': int(idx),
+                    'timestamp': float(timestamps[idx]),
+                    'severity': float(severities[anomaly_type][idx]),
+                    'description': descriptions[anomaly_type]
+                })
+        events.sort(key=lambda e: (e['sample'], e['type']))
+        
+        return {
+            'samples': n,
+            'series': {
+                'timestamp': timestamps,
+                'motion': motion,
+                'density': density,
+                'avg_motion': avg_motion,
+                'rate_of_change': rate_of_change,
+                'motion_z': motion_z,
+                'rate_z': rate_z
+            },
+            'flags': flags,
+            'events': events,
+            'summary': {anomaly_type: int(mask.sum()) for anomaly_type, mask in flags.items()}
+        }
+    
+    def _series_z(self, metric, values, indices, clock):
+        """
+        Baseline z-scores of values[indices], updating the baseline in sample order like the live
+        rules do (NaN without a warm baseline; NaN samples are skipped)
+        """
+        z_scores = np.full(len(indices), np.nan)
+        if self.baseline is None:
+            return z_scores
+        for i, t in enumerate(indices):
+            if np.isnan(values[t]):
+                continue
+            z = self.baseline.update(self.zone_id, metric, float(values[t]),
+                                     None if clock is None else float(clock[t]))
+            if z is not None:
+                z_scores[i] = z
+        return z_scores
+    
+    def _series_exceeds(self, z_scores, values, fixed_threshold):
+        """Vectorized _exceeds: z-score where the baseline was warm, otherwise the fixed threshold"""
+        if self.baseline is None:
+            return values > fixed_threshold
+        return np.where(np.isnan(z_scores), values > fixed_threshold, z_scores > self.baseline.z_threshold)
+    
     def reset(self):
         """Reset detection history"""
         self.prev_frame = None
         self.motion_history.clear()
         self.density_history.clear()
+        self.flow_analyzer.reset()
+        self.pressure_tracker.reset()
 
 
 # Example usage
@@ -0,0 +1,89 @@
+import numpy as np
+from collections import deque
+
+
+class CrowdPressureTracker:
+    """
+    Per-cell "crowd pressure" (local density x local velocity variance):
+    - Computed on the FlowAnalyzer grid, vectorized over all cells
+    - Smoothed per cell with an EWMA and tracked over a short history
+    - Cells above threshold for several consecutive frames are reported as hotspots
+    """
+    
+    def __init__(self, pressure_threshold=1.0, alpha=0.3, sustain_frames=5, history_size=30):
+        """
+        :param pressure_threshold: Smoothed pressure that marks a cell as critical
+                                   (occupancy fraction x velocity variance in px^2/frame^2)
+        :param alpha: EWMA smoothing factor per cell
+        :param sustain_frames: Consecutive frames above threshold before a hotspot is reported
+        :param history_size: Frames of smoothed pressure kept for trend estimation
+        """
+        self.pressure_threshold = pressure_threshold
+        self.alpha = alpha
+        self.sustain_frames = sustain_frames
+        self.history = deque(maxlen=history_size)
+        self.smoothed = None
+        self.sustained = None
+    
+    def compute_pressure(self, density_grid, velocity_variance):
+        """Instantaneous pressure field"""
+        return np.asarray(density_grid, dtype=np.float64) * np.asarray(velocity_variance, dtype=np.float64)
+    
+    def update(self, density_grid, velocity_variance):
+        """
+        Fold one frame into the pressure field
+        :param density_grid: Per-cell occupancy (rows x cols, 0..1)
+        :param velocity_variance: Per-cell local velocity variance (rows x cols)
+        :return: dict with pressure statistics and hotspot cells
+        """
+        pressure = self.compute_pressure(density_grid, velocity_variance)
+        if self.smoothed is None or self.smoothed.shape != pressure.shape:
+            self.smoothed = pressure.copy()
+            self.sustained = np.zeros(pressure.shape, dtype=np.int32)
+            self.history.clear()
+        else:
+            self.smoothed += self.alpha * (pressure - self.smoothed)
+        
+        above = self.smoothed > self.pressure_threshold
+        self.sustained = np.where(above, self.sustained + 1, 0)
+        self.history.append(self.smoothed.copy())
+        
+        trend = self._trend()
+        hotspot_mask = self.sustained >= self.sustain_frames
+        order = np.argsort(-self.smoothed[hotspot_mask])
+        cells = np.argwhere(hotspot_mask)[order]
+        
+        hotspots = [{
+            'cell': (int(r), int(c)),
+            'pressure': round(float(self.smoothed[r, c]), 3),
+            'trend': round(float(trend[r, c]), 4),
+            'frames_above': int(self.sustained[r, c])
+        } for r, c in cells]
+        
+        max_pressure = float(self.smoothed.max()) if self.smoothed.size else 0.0
+        return {
+            'pressure_detected': len(hotspots) > 0,
+            'max_pressure': round(max_pressure, 3),
+            'mean_pressure': round(float(self.smoothed.mean()), 3) if self.smoothed.size else 0.0,
+            'severity': round(min(max_pressure / (2 * self.pressure_threshold), 1.0), 3),
+            'hotspots': hotspots
+        }
+    
+    def _trend(self):
+        """Least-squares slope of smoothed pressure per cell over the kept history"""
+        if len(self.history) < 2:
+            return np.zeros_like(self.smoothed)
+        stack = np.stack(self.history)
+        t = np.arange(len(stack), dtype=np.float64)
+        t -= t.mean()
+        return np.tensordot(t, stack - stack.mean(axis=0), axes=(0, 0)) / np.sum(t ** 2)
+    
+    def get_pressure_grid(self):
+        """Current smoothed pressure field (rows x cols) for heatmaps"""
+        return None if self.smoothed is None else self.smoothed.copy()
+    
+    def reset(self):
+        """Clear all pressure history"""
+        self.history.clear()
+        self.smoothed = None
+        self.sustained = None
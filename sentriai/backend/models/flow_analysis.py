@@ -0,0 +1,264 @@
+import cv2
+import numpy as np
+import time
+
+
+class FlowAnalyzer:
+    """
+    Grid-based crowd flow analysis on dense optical flow:
+    - Magnitude-weighted direction histograms per cell and for the whole frame
+    - Divergence/convergence of the mean cell flow
+    - Per-cell speed versus person occupancy
+    - Emits BOTTLENECK, COUNTER_FLOW and CHAOTIC patterns with cell locations
+    - Adapts its working resolution to stay inside a per-frame time budget
+    """
+    
+    def __init__(self, grid_size=(8, 6), num_bins=8, time_budget_ms=15.0):
+        """
+        :param grid_size: (columns, rows) of the analysis grid
+        :param num_bins: Direction histogram bins
+        :param time_budget_ms: Target processing time per frame
+        """
+        self.grid_cols, self.grid_rows = grid_size
+        self.num_bins = num_bins
+        self.time_budget_ms = time_budget_ms
+        
+        # Working resolution relative to the input frame, tuned by the time budget
+        self.scale = 0.25
+        self.min_scale = 0.1
+        self.max_scale = 0.5
+        
+        self.prev_gray = None
+        self.last_grid = None
+        self.last_elapsed_ms = 0.0
+        
+        # Pattern thresholds (speeds in input-frame pixels per frame)
+        self.thresholds = {
+            'min_speed': 1.0,             # cell counts as moving
+            'moving_fraction': 0.25,      # share of moving cells for frame-level patterns
+            'chaotic_entropy': 0.85,      # normalized direction entropy
+            'coherence': 0.5,             # neighbourhood direction agreement (0..1)
+            'counter_share': 0.2,         # flow share needed on both opposing sides
+            'dense_occupancy': 0.35,      # fraction of a cell covered by people
+            'slow_ratio': 0.5,            # dense cell slower than this share of median moving speed
+            'convergence': 0.05           # negative divergence of the cell flow field
+        }
+    
+    def compute_flow_grid(self, frame):
+        """
+        Compute dense optical flow at the working resolution and pool it into grid cells
+        :return: dict of per-cell arrays (rows x cols) or None for the first frame
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        width = max(self.grid_cols * 4, int(gray.shape[1] * self.scale) // self.grid_cols * self.grid_cols)
+        height = max(self.grid_rows * 4, int(gray.shape[0] * self.scale) // self.grid_rows * self.grid_rows)
+        small = cv2.resize(gray, (width, height), interpolation=cv2.INTER_AREA)
+        
+        prev = self.prev_gray
+        self.prev_gray = small
+        if prev is None:
+            return None
+        if prev.shape != small.shape:
+            # Working resolution changed since the last frame
+            prev = cv2.resize(prev, (width, height), interpolation=cv2.INTER_AREA)
+        
+        flow = cv2.calcOpticalFlowFarneback(prev, small, None, 0.5, 2, 9, 2, 5, 1.1, 0)
+        # Express speeds in input-frame pixels so thresholds do not depend on the scale
+        flow *= gray.shape[1] / width
+        
+        rows, cols, bins = self.grid_rows, self.grid_cols, self.num_bins
+        cell_h, cell_w = height // rows, width // cols
+        cells = flow.reshape(rows, cell_h, cols, cell_w, 2)
+        
+        mean_flow = cells.mean(axis=(1, 3))
+        mean_sq = (cells ** 2).mean(axis=(1, 3))
+        magnitude = np.sqrt(flow[..., 0] ** 2 + flow[..., 1] ** 2)
+        angle = np.arctan2(flow[..., 1], flow[..., 0])
+        
+        # Magnitude-weighted direction histogram per cell via one bincount
+        bin_index = ((angle + np.pi) / (2 * np.pi) * bins).astype(np.int64) % bins
+        cell_index = (np.arange(height)[:, None] // cell_h) * cols + (np.arange(width)[None, :] // cell_w)
+        weights = np.where(magnitude > self.thresholds['min_speed'], magnitude, 0.0)
+        histograms = np.bincount(
+            (cell_index * bins + bin_index).ravel(),
+            weights=weights.ravel(),
+            minlength=rows * cols * bins
+        ).reshape(rows, cols, bins)
+        
+        vx, vy = mean_flow[..., 0], mean_flow[..., 1]
+        divergence = np.gradient(vx, axis=1) + np.gradient(vy, axis=0)
+        
+        return {
+            'mean_flow': mean_flow,
+            'speed': magnitude.reshape(rows, cell_h, cols, cell_w).mean(axis=(1, 3)),
+            # Local velocity variance: E[v^2] - E[v]^2 summed over both axes
+            'velocity_variance': np.maximum(mean_sq - mean_flow ** 2, 0.0).sum(axis=-1),
+            'histograms': histograms,
+            'divergence': divergence
+        }
+    
+    def occupancy_grid(self, person_detections, frame_shape):
+        """
+        Fraction of each cell covered by person boxes, computed from box/cell overlaps
+        Detections without a bbox are treated as a nominal 48x96 px box around 'center'.
+        """
+        rows, cols = self.grid_rows, self.grid_cols
+        if not person_detections:
+            return np.zeros((rows, cols))
+        
+        boxes = []
+        for person in person_detections:
+            if len(person.get('bbox', [])) == 4:
+                boxes.append(person['bbox'])
+            elif 'center' in person:
+                x, y = person['center']
+                boxes.append([x - 24, y - 48, x + 24, y + 48])
+        if not boxes:
+            return np.zeros((rows, cols))
+        
+        boxes = np.asarray(boxes, dtype=np.float64)
+        height, width = frame_shape[:2]
+        x_edges = np.linspace(0, width, cols + 1)
+        y_edges = np.linspace(0, height, rows + 1)
+        
+        # Overlap of every box with every column / row band, then outer product per box
+        x_overlap = np.clip(np.minimum(boxes[:, 2:3], x_edges[None, 1:]) -
+                            np.maximum(boxes[:, 0:1], x_edges[None, :-1]), 0, None)
+        y_overlap = np.clip(np.minimum(boxes[:, 3:4], y_edges[None, 1:]) -
+                            np.maximum(boxes[:, 1:2], y_edges[None, :-1]), 0, None)
+        covered = np.einsum('nr,nc->rc', y_overlap, x_overlap)
+        return np.minimum(covered / ((width / cols) * (height / rows)), 1.0)
+    
+    def analyze(self, frame, person_detections=None, detection_shape=None):
+        """
+        Analyze crowd flow for one frame
+        :param frame: Current BGR frame
+        :param person_detections: Detections with 'bbox' (or 'center') for per-cell density
+        :param detection_shape: Frame shape the detection coordinates refer to (defaults to frame)
+        :return: dict with primary pattern, all detected patterns and their cells
+                 (the raw per-cell arrays stay available as self.last_grid)
+        """
+        start = time.perf_counter()
+        result = {"flow_anomaly": False, "pattern": "NORMAL", "patterns": []}
+        
+        grid = self.compute_flow_grid(frame)
+        if grid is not None:
+            grid['occupancy'] = self.occupancy_grid(person_detections, detection_shape or frame.shape)
+            result['patterns'] = self._detect_patterns(grid)
+            result['direction_histogram'] = self._normalized(
+                grid['histograms'].sum(axis=(0, 1))).round(4).tolist()
+        self.last_grid = grid
+        
+        if result['patterns']:
+            primary = max(result['patterns'], key=lambda p: p['severity'])
+            result.update({
+                "flow_anomaly": True,
+                "pattern": primary['pattern'],
+                "severity": primary['severity'],
+                "description": primary['description'],
+                "cells": primary['cells']
+            })
+        
+        self._apply_time_budget((time.perf_counter() - start) * 1000)
+        result['elapsed_ms'] = round(self.last_elapsed_ms, 2)
+        result['within_budget'] = self.last_elapsed_ms <= self.time_budget_ms
+        return result
+    
+    def _detect_patterns(self, grid):
+        """Derive flow patterns from the pooled grid (all vectorized over cells)"""
+        t = self.thresholds
+        bins = self.num_bins
+        speed = grid['speed']
+        histograms = grid['histograms']
+        moving = speed > t['min_speed']
+        patterns = []
+        
+        if moving.mean() >= t['moving_fraction']:
+            frame_hist = self._normalized(histograms[moving].sum(axis=0))
+            
+            # CHAOTIC: flow spread over all directions
+            if self._entropy(frame_hist) > t['chaotic_entropy']:
+                cell_entropy = self._entropy(self._normalized(histograms))
+                incoherent = self._local_coherence(grid['mean_flow'], moving) < t['coherence']
+                cells = np.argwhere(moving & ((cell_entropy > t['chaotic_entropy']) | incoherent))
+                patterns.append(self._pattern(
+                    'CHAOTIC', 0.8, cells, "Disorganized crowd movement detected"))
+            
+            # COUNTER_FLOW: significant flow on both sides of the dominant direction
+            else:
+                dominant = int(np.argmax(frame_hist))
+                opposite = (dominant + bins // 2) % bins
+                sector = [(opposite - 1) % bins, opposite, (opposite + 1) % bins]
+                forward = [(dominant - 1) % bins, dominant, (dominant + 1) % bins]
+                if (frame_hist[sector].sum() >= t['counter_share'] and
+                        frame_hist[forward].sum() >= t['counter_share']):
+                    cell_dominant = np.argmax(histograms, axis=-1)
+                    cells = np.argwhere(moving & np.isin(cell_dominant, sector))
+                    patterns.append(self._pattern(
+                        'COUNTER_FLOW', 0.75, cells, "Opposing crowd streams detected"))
+        
+        # BOTTLENECK: dense, slow cells where the surrounding flow converges
+        dense = grid['occupancy'] >= t['dense_occupancy']
+        if dense.any():
+            reference_speed = np.median(speed[moving]) if moving.any() else t['min_speed']
+            slow = speed < reference_speed * t['slow_ratio']
+            convergence = -grid['divergence']
+            # A cell converges if it or any 4-neighbour shows inflow
+            padded = np.pad(convergence, 1, constant_values=-np.inf)
+            neighbourhood = np.max(np.stack([
+                padded[1:-1, 1:-1], padded[:-2, 1:-1], padded[2:, 1:-1],
+                padded[1:-1, :-2], padded[1:-1, 2:]
+            ]), axis=0)
+            cells = np.argwhere(dense & slow & (neighbourhood > t['convergence']))
+            if len(cells):
+                patterns.append(self._pattern(
+                    'BOTTLENECK', 0.7, cells, "Crowd bottleneck forming"))
+        
+        return patterns
+    
+    @staticmethod
+    def _local_coherence(mean_flow, moving):
+        """Length of the mean unit direction over each cell's 3x3 moving neighbourhood"""
+        norm = np.linalg.norm(mean_flow, axis=-1, keepdims=True)
+        units = np.divide(mean_flow, norm, out=np.zeros_like(mean_flow), where=norm > 0)
+        units = units * moving[..., None]
+        padded_units = np.pad(units, ((1, 1), (1, 1), (0, 0)))
+        padded_moving = np.pad(moving.astype(np.float64), 1)
+        rows, cols = moving.shape
+        summed = sum(padded_units[dr:dr + rows, dc:dc + cols]
+                     for dr in range(3) for dc in range(3))
+        counts = sum(padded_moving[dr:dr + rows, dc:dc + cols]
+                     for dr in range(3) for dc in range(3))
+        return np.linalg.norm(summed, axis=-1) / np.maximum(counts, 1.0)
+    
+    def _pattern(self, name, base_severity, cells, description):
+        cell_list = [(int(r), int(c)) for r, c in cells]
+        coverage = len(cell_list) / float(self.grid_rows * self.grid_cols)
+        return {
+            'pattern': name,
+            'severity': round(min(base_severity + coverage * 0.5, 1.0), 3),
+            'cells': cell_list,
+            'description': description
+        }
+    
+    def _apply_time_budget(self, elapsed_ms):
+        """Shrink the working resolution when over budget, grow it back when well under"""
+        self.last_elapsed_ms = elapsed_ms
+        if elapsed_ms > self.time_budget_ms:
+            self.scale = max(self.min_scale, self.scale * 0.75)
+        elif elapsed_ms < self.time_budget_ms * 0.5:
+            self.scale = min(self.max_scale, self.scale * 1.05)
+    
+    @staticmethod
+    def _normalized(histogram):
+        total = histogram.sum(axis=-1, keepdims=True)
+        return np.divide(histogram, total, out=np.zeros_like(histogram, dtype=np.float64), where=total > 0)
+    
+    def _entropy(self, distribution):
+        logs = np.log(distribution, out=np.zeros_like(distribution), where=distribution > 0)
+        return -(distribution * logs).sum(axis=-1) / np.log(self.num_bins)
+    
+    def reset(self):
+        """Forget the previous frame"""
+        self.prev_gray = None
+        self.last_grid = None
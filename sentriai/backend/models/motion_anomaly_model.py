@@ -0,0 +1,254 @@
+import argparse
+import os
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+
+import cv2
+import joblib
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from models.anomaly_detection import _prepare_gray, _motion_intensity
+from models.flow_analysis import FlowAnalyzer
+
+DEFAULT_MODEL_PATH = os.getenv("MOTION_ANOMALY_MODEL", "models/motion_anomaly.joblib")
+
+
+def build_feature_vector(flow_grid, motion_intensity, density, num_bins=8):
+    """
+    Compact per-frame feature vector:
+    normalized flow direction histogram + mean flow speed + motion intensity + density
+    :param flow_grid: FlowAnalyzer.last_grid (None before the analyzer has two frames)
+    """
+    if flow_grid is None:
+        histogram = np.zeros(num_bins)
+        speed = 0.0
+    else:
+        histogram = flow_grid['histograms'].sum(axis=(0, 1))
+        total = histogram.sum()
+        histogram = histogram / total if total > 0 else np.zeros_like(histogram)
+        speed = float(flow_grid['speed'].mean())
+    return np.concatenate([histogram, [speed, motion_intensity, density]]).astype(np.float64)
+
+
+class MotionAnomalyModel:
+    """
+    Unsupervised anomaly score on motion features:
+    - IsolationForest trained offline on footage of normal crowd behaviour
+    - Online scoring in micro-batches: features from all cameras are collected and
+      scored with one model call per batch; submit() waits (briefly) for the batch
+      that scores its own sample
+    """
+    
+    def __init__(self, model, threshold=0.6, max_batch=64, batch_interval=0.05):
+        """
+        :param model: Fitted IsolationForest
+        :param threshold: Score above which a sample is flagged (set from training data)
+        :param max_batch: Pending samples that trigger an immediate flush
+        :param batch_interval: Flush period of the background batching thread (seconds)
+        """
+        self.model = model
+        self.threshold = threshold
+        self.max_batch = max_batch
+        self.batch_interval = batch_interval
+        
+        self.pending = {}         # camera_id -> (submission seq, latest feature vector)
+        self.latest_scores = {}   # camera_id -> last scored result
+        self.submitted = 0
+        self.lock = threading.Lock()
+        self.scored = threading.Condition(self.lock)
+        self.stats = {'batches': 0, 'samples': 0}
+        
+        self.is_running = False
+        self.batch_thread = None
+    
+    build_features = staticmethod(build_feature_vector)
+    
+    @classmethod
+    def train(cls, features, n_estimators=200, threshold_percentile=99.5, random_state=42, **kwargs):
+        """
+        Train on feature vectors from normal footage
+        :param features: Array (n_samples, n_features)
+        :param threshold_percentile: Training-score percentile used as the anomaly threshold
+        """
+        features = np.asarray(features, dtype=np.float64)
+        model = IsolationForest(n_estimators=n_estimators, random_state=random_state)
+        model.fit(features)
+        scores = -model.score_samples(features)
+        threshold = float(np.percentile(scores, threshold_percentile))
+        return cls(model, threshold=threshold, **kwargs)
+    
+    def save(self, path):
+        """Persist the fitted model and its threshold"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        joblib.dump({
+            'model': self.model,
+            'threshold': self.threshold,
+            'trained_at': datetime.now().isoformat()
+        }, path)
+        return path
+    
+    @classmethod
+    def load(cls, path, **kwargs):
+        """Load a model written by save()"""
+        data = joblib.load(path)
+        return cls(data['model'], threshold=data['threshold'], **kwargs)
+    
+    def score_batch(self, features):
+        """
+        Score many feature vectors in one model call
+        :return: Array of anomaly scores in (0, 1], higher = more anomalous (~0.5 is typical)
+        """
+        features = np.atleast_2d(np.asarray(features, dtype=np.float64))
+        return -self.model.score_samples(features)
+    
+    def submit(self, camera_id, features, wait=None):
+        """
+        Queue a camera's latest features for the next micro-batch and wait for their score
+        (scored right away when the batching thread is not running, e.g. offline)
+        :param wait: Longest wait for the batch in seconds (default: two batch intervals)
+        :return: Score dict with the submission 'seq'; 'lagged' is True when the batch did not
+                 finish in time and the camera's previous score is returned instead. None if the
+                 camera has never been scored.
+        """
+        with self.lock:
+            self.submitted += 1
+            seq = self.submitted
+            self.pending[camera_id] = (seq, features)
+            flush_now = len(self.pending) >= self.max_batch or not self.is_running
+        if flush_now:
+            self.flush()
+        
+        wait = 2 * self.batch_interval if wait is None else wait
+        with self.scored:
+            self.scored.wait_for(lambda: self.latest_scores.get(camera_id, {}).get('seq', 0) >= seq, wait)
+            result = self.latest_scores.get(camera_id)
+            if result is None:
+                return None
+            return dict(result, lagged=result['seq'] < seq)
+    
+    def flush(self):
+        """Score all pending cameras with a single model call"""
+        with self.lock:
+            if not self.pending:
+                return 0
+            batch = self.pending
+            self.pending = {}
+        
+        camera_ids = list(batch.keys())
+        scores = self.score_batch(np.stack([batch[c][1] for c in camera_ids]))
+        now = time.time()
+        with self.scored:
+            for camera_id, score in zip(camera_ids, scores):
+                self.latest_scores[camera_id] = {
+                    'score': round(float(score), 4),
+                    'anomalous': bool(score > self.threshold),
+                    'threshold': round(self.threshold, 4),
+                    'timestamp': now,
+                    'seq': batch[camera_id][0]
+                }
+            self.stats['batches'] += 1
+            self.stats['samples'] += len(camera_ids)
+            self.scored.notify_all()
+        return len(camera_ids)
+    
+    def start(self):
+        """Start the background micro-batching thread"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self.batch_thread = threading.Thread(target=self._batch_loop, daemon=True)
+        self.batch_thread.start()
+    
+    def stop(self):
+        """Stop batching and score whatever is still pending"""
+        self.is_running = False
+        if self.batch_thread:
+            self.batch_thread.join(timeout=2)
+        self.flush()
+    
+    def _batch_loop(self):
+        while self.is_running:
+            time.sleep(self.batch_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Motion anomaly scoring error: {str(e)}")
+
+
+@lru_cache()
+def load_default_model(path=DEFAULT_MODEL_PATH):
+    """
+    Load the persisted model once per process and start its batching thread.
+    Returns None when no model has been trained yet.
+    """
+    if not os.path.exists(path):
+        print(f"⚠️ Motion anomaly model not found: {path}")
+        return None
+    model = MotionAnomalyModel.load(path)
+    model.start()
+    print(f"✅ Motion anomaly model loaded: {path}")
+    return model
+
+
+def extract_features_from_video(video_path, frame_step=2, density_fn=None):
+    """
+    Build training features from a recorded clip of normal crowd behaviour
+    :param density_fn: Optional callable frame -> density
+    :return: Array (n_samples, n_features)
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video: {video_path}")
+    
+    analyzer = FlowAnalyzer()
+    prev_gray = None
+    features = []
+    frame_index = 0
+    
+    while True:
+        if frame_index % frame_step != 0:
+            if not cap.grab():
+                break
+            frame_index += 1
+            continue
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frame_index += 1
+        
+        analyzer.analyze(frame)
+        gray = _prepare_gray(frame)
+        if prev_gray is not None and analyzer.last_grid is not None:
+            density = density_fn(frame) if density_fn else 0.0
+            features.append(build_feature_vector(
+                analyzer.last_grid, _motion_intensity(prev_gray, gray), density, analyzer.num_bins))
+        prev_gray = gray
+    
+    cap.release()
+    return np.array(features)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the motion anomaly model from normal footage")
+    parser.add_argument("videos", nargs="+", help="Recorded clips of normal crowd behaviour")
+    parser.add_argument("--output", default=DEFAULT_MODEL_PATH, help="Where to save the model")
+    parser.add_argument("--frame-step", type=int, default=2,
+                        help="Use every Nth frame (match the live analysis rate)")
+    args = parser.parse_args()
+    
+    all_features = []
+    for video in args.videos:
+        video_features = extract_features_from_video(video, frame_step=args.frame_step)
+        print(f"📹 {video}: {len(video_features)} samples")
+        if len(video_features):
+            all_features.append(video_features)
+    
+    if not all_features:
+        raise SystemExit("❌ No training samples extracted")
+    
+    trained = MotionAnomalyModel.train(np.vstack(all_features))
+    trained.save(args.output)
+    print(f"✅ Model saved to {args.output} (threshold {trained.threshold:.3f})")
@@ -0,0 +1,153 @@
+import math
+import time
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+
+
+class OccupancyForecaster:
+    """
+    Short-horizon density forecasting per zone:
+    - Holt linear trend with time-aware smoothing (samples may arrive at any rate)
+    - Additive time-of-day seasonal profile (Holt-Winters style)
+    - O(1) update per sample, confidence bands from the one-step residual variance
+    """
+    
+    def __init__(self, level_time_constant=120.0, trend_time_constant=600.0, season_rate=0.1,
+                 season_bucket_minutes=15, min_samples=30, confidence_z=1.96):
+        """
+        :param level_time_constant: Memory of the level smoothing (seconds)
+        :param trend_time_constant: Memory of the trend smoothing (seconds)
+        :param season_rate: Seasonal smoothing factor per full visit of a time-of-day bucket
+        :param season_bucket_minutes: Width of the time-of-day buckets of the seasonal profile
+        :param min_samples: Samples needed before a zone's forecast is reported as ready
+        :param confidence_z: Z-value of the confidence band (1.96 ~ 95%)
+        """
+        self.level_time_constant = level_time_constant
+        self.trend_time_constant = trend_time_constant
+        self.season_rate = season_rate
+        self.season_bucket_seconds = season_bucket_minutes * 60
+        self.season_buckets = int(24 * 3600 // self.season_bucket_seconds)
+        self.min_samples = min_samples
+        self.confidence_z = confidence_z
+        
+        # zone -> {level, trend (per second), residual_var, last_ts, count, season}
+        self.zones = {}
+    
+    def season_bucket(self, timestamp):
+        """Time-of-day bucket for a unix timestamp"""
+        moment = datetime.fromtimestamp(timestamp)
+        seconds = moment.hour * 3600 + moment.minute * 60 + moment.second
+        return int(seconds // self.season_bucket_seconds) % self.season_buckets
+    
+    def update(self, zone, density, timestamp=None):
+        """
+        Fold one density sample into the zone's model
+        :return: One-step forecast error for this sample (None for the first sample)
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        density = float(density)
+        state = self.zones.get(zone)
+        if state is None:
+            self.zones[zone] = {
+                'level': density,
+                'trend': 0.0,
+                'residual_var': 0.0,
+                'last_ts': timestamp,
+                'count': 1,
+                'season': np.zeros(self.season_buckets)
+            }
+            return None
+        
+        dt = max(timestamp - state['last_ts'], 1e-3)
+        bucket = self.season_bucket(timestamp)
+        season = state['season']
+        
+        # Smoothing factors scaled to the time elapsed since the previous sample
+        alpha = 1.0 - math.exp(-dt / self.level_time_constant)
+        beta = 1.0 - math.exp(-dt / self.trend_time_constant)
+        gamma = min(self.season_rate * dt / self.season_bucket_seconds, 1.0)
+        
+        predicted_level = state['level'] + state['trend'] * dt
+        error = density - (predicted_level + season[bucket])
+        
+        level = predicted_level + alpha * error
+        state['trend'] += beta * ((level - state['level']) / dt - state['trend'])
+        state['level'] = level
+        season[bucket] += gamma * (density - level - season[bucket])
+        
+        # Residual variance: cumulative average while warming up, then an EWMA
+        weight = max(alpha, 1.0 / state['count'])
+        state['residual_var'] += weight * (error * error - state['residual_var'])
+        state['last_ts'] = timestamp
+        state['count'] += 1
+        return error
+    
+    def forecast(self, zone, horizons_minutes=(5, 10, 15), now=None):
+        """
+        Predicted density for each horizon with a confidence band
+        :param now: Reference time (defaults to the zone's last sample)
+        :return: dict or None for unknown zones
+        """
+        state = self.zones.get(zone)
+        if state is None:
+            return None
+        
+        now = state['last_ts'] if now is None else now
+        sigma = math.sqrt(state['residual_var'])
+        points = []
+        for minutes in horizons_minutes:
+            target = now + minutes * 60
+            ahead = target - state['last_ts']
+            mean = state['level'] + state['trend'] * ahead + state['season'][self.season_bucket(target)]
+            # Uncertainty grows with the horizon relative to the level memory
+            spread = self.confidence_z * sigma * math.sqrt(1.0 + ahead / self.level_time_constant)
+            points.append({
+                'horizon_minutes': minutes,
+                'timestamp': datetime.fromtimestamp(target).isoformat(),
+                'density': round(max(mean, 0.0), 4),
+                'lower': round(max(mean - spread, 0.0), 4),
+                'upper': round(max(mean + spread, 0.0), 4)
+            })
+        
+        return {
+            'zone': zone,
+            'level': round(state['level'], 4),
+            'trend_per_minute': round(state['trend'] * 60, 5),
+            'samples': state['count'],
+            'ready': state['count'] >= self.min_samples,
+            'forecast': points
+        }
+    
+    def predicted_density(self, zone, horizon_minutes=10, now=None):
+        """Point forecast for one horizon (None until the zone is warm)"""
+        result = self.forecast(zone, (horizon_minutes,), now)
+        if result is None or not result['ready']:
+            return None
+        return result['forecast'][0]['density']
+    
+    def to_dict(self):
+        """Serialize the learned state so it survives restarts"""
+        return {
+            'zones': {zone: dict(state, season=state['season'].tolist())
+                      for zone, state in self.zones.items()}
+        }
+    
+    def load_dict(self, data):
+        """Restore state produced by to_dict"""
+        for zone, state in data.get('zones', {}).items():
+            self.zones[zone] = dict(state, season=np.asarray(state['season'], dtype=np.float64))
+    
+    def reset(self, zone=None):
+        """Forget one zone (or all zones)"""
+        if zone is None:
+            self.zones.clear()
+        else:
+            self.zones.pop(zone, None)
+
+
+@lru_cache()
+def default_forecaster():
+    """Forecaster shared by the live pipelines of this process (feeds RiskScorer's forecast term)"""
+    return OccupancyForecaster()
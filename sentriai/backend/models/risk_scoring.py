@@ -1,9 +1,184 @@
 import numpy as np
 import time
+import os
+import atexit
+import weakref
 from datetime import datetime
-from collections import deque
+from collections import deque, OrderedDict
+from itertools import islice
 import json
 
+# Weight of each anomaly type in the anomaly risk component
+ANOMALY_WEIGHTS = {
+    'PANIC_MOVEMENT': 1.0,
+    'FIGHTING': 0.9,
+    'DENSITY_SPIKE': 0.85,
+    'FLOW_ANOMALY': 0.7,
+    'OVERCROWDING_STATIC': 0.95,
+    'CROWD_PRESSURE': 1.0
+}
+ANOMALY_TYPES = list(ANOMALY_WEIGHTS.keys())
+
+# Flow pattern -> (risk score, level); unknown anomalous patterns score 0.3
+FLOW_PATTERN_RISK = {
+    'CHAOTIC': (0.75, 'HIGH'),
+    'COUNTER_FLOW': (0.7, 'HIGH'),
+    'BOTTLENECK': (0.65, 'MEDIUM')
+}
+
+# Integer codes for flow patterns in batch scoring (NO_DATA = no flow analysis for the zone)
+FLOW_PATTERN_CODES = {'NO_DATA': -1, 'NORMAL': 0, 'CHAOTIC': 1, 'COUNTER_FLOW': 2, 'BOTTLENECK': 3}
+
+RISK_LEVELS = ['LOW', 'MEDIUM', 'HIGH', 'CRITICAL']
+RISK_COLORS = {'LOW': '#00FF00', 'MEDIUM': '#FFCC00', 'HIGH': '#FF6600', 'CRITICAL': '#FF0000'}
+
+# Scorers whose spilled alerts still need writing at interpreter exit
+_open_scorers = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_open_scorers():
+    for scorer in list(_open_scorers):
+        scorer.flush()
+
+
+def history_to_arrays(records):
+    """
+    Column arrays from stored crowd history entries (AnalyticsEngine.store_crowd_data format),
+    in one pass over the records
+    :return: dict with density, anomaly_severities ({type: (N,)}), flow_codes, zone_codes,
+             zones, hour, stored_level_index (-1 = unknown) and stored_score arrays
+    """
+    n = len(records)
+    density = np.zeros(n)
+    flow_codes = np.full(n, FLOW_PATTERN_CODES['NO_DATA'], dtype=np.int64)
+    zone_codes = np.zeros(n, dtype=np.int64)
+    stored_level = np.full(n, -1, dtype=np.int64)
+    stored_score = np.zeros(n)
+    timestamps = np.empty(n, dtype=object)
+    severities = {}
+    zones = {}
+    level_codes = {level: i for i, level in enumerate(RISK_LEVELS)}
+    
+    for i, record in enumerate(records):
+        density[i] = record.get('density', 0)
+        zone_codes[i] = zones.setdefault(record.get('zone', 'ZONE_A'), len(zones))
+        stored_level[i] = level_codes.get(record.get('risk_level'), -1)
+        stored_score[i] = record.get('risk_score', 0)
+        timestamps[i] = record.get('timestamp')
+        
+        pattern = record.get('flow_pattern')
+        if pattern is not None:
+            flow_codes[i] = FLOW_PATTERN_CODES.get(pattern, FLOW_PATTERN_CODES['NORMAL'])
+        
+        for anomaly in record.get('anomalies') or []:
+            anomaly_type = anomaly.get('type', 'UNKNOWN')
+            if anomaly_type not in severities:
+                severities[anomaly_type] = np.zeros(n)
+            severities[anomaly_type][i] += anomaly.get('severity', 0.5)
+    
+    # Hour of day from the ISO timestamps (records without one count as daytime)
+    hour = np.full(n, 12, dtype=np.int64)
+    has_time = np.array([t is not None for t in timestamps], dtype=bool)
+    if has_time.any():
+        moments = np.array(timestamps[has_time].tolist(), dtype='datetime64[s]')
+        hour[has_time] = (moments - moments.astype('datetime64[D]')).astype('timedelta64[h]').astype(np.int64)
+    
+    return {
+        'density': density,
+        'anomaly_severities': severities,
+        'flow_codes': flow_codes,
+        'zone_codes': zone_codes,
+        'zones': list(zones.keys()),
+        'hour': hour,
+        'stored_level_index': stored_level,
+        'stored_score': stored_score
+    }
+
+
+def _density_step(density_ratio):
+    """Vectorized calculate_density_risk score for an array of density ratios"""
+    return np.select([density_ratio >= 0.8, density_ratio >= 0.6, density_ratio >= 0.4],
+                     [0.95, 0.75, 0.55], default=0.25)
+
+
+def _historical_component(scores):
+    """
+    Vectorized calculate_historical_risk over one zone's chronological score series:
+    element i only sees the scores before it, like the live risk_history
+    """
+    n = len(scores)
+    prior = np.arange(n)
+    cumulative = np.concatenate([[0.0], np.cumsum(scores)])
+    recent = (cumulative[prior] - cumulative[np.maximum(prior - 10, 0)]) / 10
+    older = np.where(prior >= 20,
+                     (cumulative[np.maximum(prior - 10, 0)] - cumulative[np.maximum(prior - 20, 0)]) / 10,
+                     recent)
+    change = recent - older
+    component = np.select([change > 0.15, change < -0.15], [0.7, 0.2], default=recent * 0.3)
+    component[prior < 10] = 0.0
+    return component
+
+
+def recalibrate_history(records, weights=None, thresholds=None, capacity=1.0, environmental=0.0):
+    """
+    What-if analysis: re-score stored crowd history with candidate weights/thresholds
+    and compare against the levels that were recorded at the time
+    :param records: Stored history entries or the output of history_to_arrays
+    :param weights: Partial override of RiskScorer.weights
+    :param thresholds: Partial override of RiskScorer.thresholds
+    :return: dict with level distributions, alert counts and level transitions
+    """
+    start_time = time.time()
+    scorer = RiskScorer(alert_log_path=None)
+    for name, overrides, current in (('weight', weights, scorer.weights),
+                                     ('threshold', thresholds, scorer.thresholds)):
+        unknown = set(overrides or {}) - set(current)
+        if unknown:
+            raise ValueError(f"Unknown {name} keys: {sorted(unknown)}")
+        current.update({key: float(value) for key, value in (overrides or {}).items()})
+    
+    arrays = records if isinstance(records, dict) else history_to_arrays(records)
+    rescored = scorer.rescore_history(arrays, capacity=capacity, environmental=environmental)
+    
+    new_level = rescored['level_index']
+    old_level = arrays['stored_level_index']
+    known = old_level >= 0
+    transitions = np.zeros((len(RISK_LEVELS), len(RISK_LEVELS)), dtype=np.int64)
+    np.add.at(transitions, (old_level[known], new_level[known]), 1)
+    
+    zone_alerts = np.bincount(arrays['zone_codes'], weights=rescored['alert_required'],
+                              minlength=len(arrays['zones']))
+    scores = rescored['overall_score']
+    
+    return {
+        'samples': int(len(scores)),
+        'weights': scorer.weights,
+        'thresholds': scorer.thresholds,
+        'level_distribution': dict(zip(RISK_LEVELS, np.bincount(new_level, minlength=4).tolist())),
+        'stored_level_distribution': dict(zip(RISK_LEVELS, np.bincount(old_level[known], minlength=4).tolist())),
+        'alerts': int(rescored['alert_required'].sum()),
+        'stored_alerts': int((old_level >= 2).sum()),
+        'alerts_by_zone': {zone: int(count) for zone, count in zip(arrays['zones'], zone_alerts)},
+        'changed_levels': int((new_level[known] != old_level[known]).sum()),
+        'transitions': {old: dict(zip(RISK_LEVELS, transitions[i].tolist()))
+                        for i, old in enumerate(RISK_LEVELS)},
+        'score_statistics': {
+            'mean': round(float(scores.mean()), 4) if len(scores) else 0.0,
+            'p95': round(float(np.percentile(scores, 95)), 4) if len(scores) else 0.0,
+            'max': round(float(scores.max()), 4) if len(scores) else 0.0
+        },
+        'elapsed_ms': round((time.time() - start_time) * 1000, 1)
+    }
+
+
+def _json_default(value):
+    """Serialize NumPy scalars/arrays found in risk components"""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+
 class RiskScorer:
     """
     Comprehensive risk scoring system that combines multiple factors:
@@ -14,18 +189,39 @@ class RiskScorer:
     - Time-based risk factors
     """
     
-    def __init__(self):
+    def __init__(self, alert_history_size=1000, alert_log_path="logs/risk_alerts.jsonl"):
+        """
+        :param alert_history_size: Alerts kept in memory; older ones are spilled to disk
+        :param alert_log_path: Append-only JSON-lines log for spilled alerts (None = drop them)
+        """
         self.risk_history = deque(maxlen=100)
-        self.alert_history = []
+        self.alert_history = deque(maxlen=alert_history_size)
         self.baseline_density = 0.3  # Normal crowd density threshold
         
-        # Risk weight factors
+        # Alert spill log and running counters (cover spilled alerts too)
+        self.alert_log_path = alert_log_path
+        self.spill_batch_size = 100
+        self.spill_interval = 60.0  # Seconds a spilled alert may wait for a full batch
+        self._spill_buffer = []
+        self._last_spill = time.time()
+        self.spilled_alerts = 0
+        self.alert_counts = {'total': 0, 'CRITICAL': 0, 'HIGH': 0}
+        
+        # Recommendations memoized by risk signature (bounded LRU)
+        self.recommendation_cache = OrderedDict()
+        self.recommendation_cache_size = 256
+        self.recommendation_cache_stats = {'hits': 0, 'misses': 0}
+        _open_scorers.add(self)
+        
+        # Risk weight factors: the first five sum to 1.0; 'forecast' weights an additive escalation
+        # term (zero without a forecast), and the overall score is clamped to 1.0
         self.weights = {
             'density': 0.30,
             'anomaly': 0.35,
             'flow': 0.15,
             'history': 0.10,
-            'environmental': 0.10
+            'environmental': 0.10,
+            'forecast': 0.15
         }
         
         # Risk thresholds
@@ -65,31 +261,39 @@ class RiskScorer:
             'description': f"Crowd density at {density_ratio*100:.1f}% of capacity"
         }
     
+    def calculate_forecast_risk(self, predicted_density, area_capacity, density_risk):
+        """
+        Calculate escalation risk from the short-horizon density forecast.
+        Only the part of the forecast density risk above the current density risk counts,
+        so a crowd that is still growing is flagged before it gets dense.
+        """
+        if predicted_density is None:
+            return {'score': 0.0, 'level': 'LOW', 'predicted_density': None}
+        
+        predicted_risk = self.calculate_density_risk(predicted_density, area_capacity)
+        return {
+            'score': max(predicted_risk['score'] - density_risk['score'], 0.0),
+            'level': predicted_risk['level'],
+            'predicted_density': predicted_density,
+            'description': f"Forecast density at {predicted_risk['density_ratio']*100:.1f}% of capacity"
+        }
+    
     def calculate_anomaly_risk(self, anomaly_results):
         """
         Calculate risk based on detected anomalies
         """
         if not anomaly_results or not anomaly_results.get('anomalies'):
-            return {'score': 0.0, 'level': 'LOW', 'anomalies': []}
+            return {'score': 0.0, 'level': 'LOW', 'anomalies': [], 'anomaly_count': 0}
         
         anomalies = anomaly_results['anomalies']
         
-        # Weight different anomaly types
-        anomaly_weights = {
-            'PANIC_MOVEMENT': 1.0,
-            'FIGHTING': 0.9,
-            'DENSITY_SPIKE': 0.85,
-            'FLOW_ANOMALY': 0.7,
-            'OVERCROWDING_STATIC': 0.95
-        }
-        
         total_risk = 0
         weighted_anomalies = []
         
         for anomaly in anomalies:
             anomaly_type = anomaly.get('type', 'UNKNOWN')
             severity = anomaly.get('severity', 0.5)
-            weight = anomaly_weights.get(anomaly_type, 0.5)
+            weight = ANOMALY_WEIGHTS.get(anomaly_type, 0.5)
             
             anomaly_risk = severity * weight
             total_risk += anomaly_risk
@@ -98,7 +302,8 @@ class RiskScorer:
                 'type': anomaly_type,
                 'severity': severity,
                 'weighted_risk': anomaly_risk,
-                'description': anomaly.get('description', '')
+                'description': anomaly.get('description', ''),
+                'cells': anomaly.get('cells', [])
             })
         
         # Normalize risk score (cap at 1.0)
@@ -131,20 +336,13 @@ class RiskScorer:
         pattern = flow_data.get('pattern', 'NORMAL')
         severity = flow_data.get('severity', 0.5)
         
-        if pattern == 'CHAOTIC':
-            risk_score = 0.75
-            level = "HIGH"
-        elif pattern == 'BOTTLENECK':
-            risk_score = 0.65
-            level = "MEDIUM"
-        else:
-            risk_score = 0.3
-            level = "LOW"
+        risk_score, level = FLOW_PATTERN_RISK.get(pattern, (0.3, "LOW"))
         
         return {
             'score': risk_score,
             'level': level,
             'pattern': pattern,
+            'cells': flow_data.get('cells', []),
             'description': flow_data.get('description', '')
         }
     
@@ -181,12 +379,13 @@ class RiskScorer:
             'change_rate': trend_change
         }
     
-    def calculate_environmental_risk(self, environmental_factors=None):
+    def calculate_environmental_risk(self, environmental_factors=None, timestamp=None):
         """
         Calculate risk based on environmental conditions
         - Weather conditions
         - Time of day
         - Event type
+        :param timestamp: Unix time the conditions apply to (default: now)
         """
         if environmental_factors is None:
             environmental_factors = {}
@@ -201,7 +400,7 @@ class RiskScorer:
             factors.append("Adverse weather conditions")
         
         # Time of day (night events = higher risk)
-        current_hour = datetime.now().hour
+        current_hour = (datetime.now() if timestamp is None else datetime.fromtimestamp(timestamp)).hour
         if current_hour >= 21 or current_hour <= 5:
             risk_score += 0.2
             factors.append("Night time event")
@@ -225,10 +424,11 @@ class RiskScorer:
         }
     
     def calculate_overall_risk(self, crowd_data, anomaly_data, flow_data=None, 
-                              environmental_factors=None):
+                              environmental_factors=None, timestamp=None):
         """
         Calculate comprehensive risk score combining all factors
         Returns detailed risk assessment with actionable recommendations
+        :param timestamp: Capture time of the analyzed frame in unix seconds (default: now)
         """
         # Calculate individual risk components
         density_risk = self.calculate_density_risk(
@@ -242,15 +442,23 @@ class RiskScorer:
         
         historical_risk = self.calculate_historical_risk()
         
-        environmental_risk = self.calculate_environmental_risk(environmental_factors)
+        environmental_risk = self.calculate_environmental_risk(environmental_factors, timestamp)
+        
+        forecast_risk = self.calculate_forecast_risk(
+            crowd_data.get('predicted_density'),
+            crowd_data.get('capacity', 1.0),
+            density_risk
+        )
         
-        # Calculate weighted overall score
-        overall_score = (
+        # Calculate weighted overall score (the forecast escalation is added on top, capped at 1.0)
+        overall_score = min(
             density_risk['score'] * self.weights['density'] +
             anomaly_risk['score'] * self.weights['anomaly'] +
             flow_risk['score'] * self.weights['flow'] +
             historical_risk['score'] * self.weights['history'] +
-            environmental_risk['score'] * self.weights['environmental']
+            environmental_risk['score'] * self.weights['environmental'] +
+            forecast_risk['score'] * self.weights['forecast'],
+            1.0
         )
         
         # Store in history
@@ -277,7 +485,7 @@ class RiskScorer:
         
         # Create comprehensive report
         risk_report = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': (datetime.now() if timestamp is None else datetime.fromtimestamp(timestamp)).isoformat(),
             'overall_score': round(overall_score, 3),
             'risk_level': risk_level,
             'color_code': color_code,
@@ -286,9 +494,11 @@ class RiskScorer:
                 'anomalies': anomaly_risk,
                 'flow': flow_risk,
                 'historical': historical_risk,
-                'environmental': environmental_risk
+                'environmental': environmental_risk,
+                'forecast': forecast_risk
             },
             'recommendations': recommendations,
+            'pressure_hotspots': (anomaly_data or {}).get('pressure', {}).get('hotspots', []),
             'alert_required': risk_level in ['HIGH', 'CRITICAL'],
             'evacuation_recommended': risk_level == 'CRITICAL',
             'person_count': crowd_data.get('person_count', 0)
@@ -300,10 +510,164 @@ class RiskScorer:
         
         return risk_report
     
+    def score_batch(self, density, anomaly_severities=None, flow_codes=None, history=None,
+                    capacity=1.0, environmental=0.0, zone_ids=None, return_reports=False,
+                    predicted_density=None):
+        """
+        Score N zones at once from column arrays (same weights and thresholds as
+        calculate_overall_risk, computed with NumPy in one pass).
+        Unlike calculate_overall_risk this does not touch risk_history or the alert log.
+        :param density: (N,) current density per zone
+        :param anomaly_severities: (N, len(ANOMALY_TYPES)) severity matrix in ANOMALY_TYPES
+                                   column order, or dict {anomaly_type: (N,) severities}
+        :param flow_codes: (N,) FLOW_PATTERN_CODES per zone (default NO_DATA)
+        :param history: (N,) historical risk component per zone (default 0)
+        :param capacity: Scalar or (N,) area capacity
+        :param environmental: Scalar or (N,) environmental risk component
+        :param zone_ids: Optional zone identifiers used in the reports
+        :param return_reports: Also build the per-zone report dicts
+        :param predicted_density: Optional (N,) forecast density per zone (NaN = no forecast)
+        :return: dict of per-zone arrays (and 'reports' when requested)
+        """
+        density = np.asarray(density, dtype=np.float64)
+        n = len(density)
+        
+        # Density component: step function on the density-to-capacity ratio
+        capacity = np.asarray(capacity, dtype=np.float64)
+        density_score = _density_step(density / capacity)
+        
+        # Anomaly component: weighted severities, capped at 1.0
+        anomaly_score = np.zeros(n)
+        if anomaly_severities is not None:
+            if isinstance(anomaly_severities, dict):
+                for anomaly_type, severities in anomaly_severities.items():
+                    anomaly_score += np.asarray(severities, dtype=np.float64) * ANOMALY_WEIGHTS.get(anomaly_type, 0.5)
+            else:
+                weights = np.array([ANOMALY_WEIGHTS[t] for t in ANOMALY_TYPES])
+                anomaly_score = np.asarray(anomaly_severities, dtype=np.float64) @ weights
+            anomaly_score = np.minimum(anomaly_score, 1.0)
+        
+        # Flow component: lookup table indexed by pattern code
+        flow_table = np.array([0.0, 0.1] + [FLOW_PATTERN_RISK[p][0] for p in
+                                            ('CHAOTIC', 'COUNTER_FLOW', 'BOTTLENECK')])
+        if flow_codes is None:
+            flow_score = np.zeros(n)
+        else:
+            flow_score = flow_table[np.asarray(flow_codes, dtype=np.int64) + 1]
+        
+        history_score = np.zeros(n) if history is None else np.asarray(history, dtype=np.float64)
+        environmental_score = np.broadcast_to(np.asarray(environmental, dtype=np.float64), (n,))
+        
+        # Forecast component: density risk escalation expected at the forecast horizon
+        forecast_score = np.zeros(n)
+        if predicted_density is not None:
+            predicted_density = np.asarray(predicted_density, dtype=np.float64)
+            has_forecast = ~np.isnan(predicted_density)
+            escalation = _density_step(np.where(has_forecast, predicted_density, 0.0) / capacity) - density_score
+            forecast_score = np.where(has_forecast, np.maximum(escalation, 0.0), 0.0)
+        
+        overall = np.minimum(density_score * self.weights['density'] +
+                             anomaly_score * self.weights['anomaly'] +
+                             flow_score * self.weights['flow'] +
+                             history_score * self.weights['history'] +
+                             environmental_score * self.weights['environmental'] +
+                             forecast_score * self.weights['forecast'], 1.0)
+        
+        level_index = self._level_indices(overall)
+        levels = np.array(RISK_LEVELS)[level_index]
+        
+        result = {
+            'overall_score': overall,
+            'risk_level': levels,
+            'level_index': level_index,
+            'density_score': density_score,
+            'anomaly_score': anomaly_score,
+            'flow_score': flow_score,
+            'history_score': history_score,
+            'environmental_score': environmental_score,
+            'forecast_score': forecast_score,
+            'alert_required': level_index >= 2
+        }
+        
+        if return_reports:
+            zone_ids = list(range(n)) if zone_ids is None else list(zone_ids)
+            timestamp = datetime.now().isoformat()
+            result['reports'] = [{
+                'zone': zone_ids[i],
+                'timestamp': timestamp,
+                'overall_score': round(float(overall[i]), 3),
+                'risk_level': str(levels[i]),
+                'color_code': RISK_COLORS[levels[i]],
+                'components': {
+                    'density': float(density_score[i]),
+                    'anomalies': float(anomaly_score[i]),
+                    'flow': float(flow_score[i]),
+                    'historical': float(history_score[i]),
+                    'environmental': float(environmental_score[i]),
+                    'forecast': float(forecast_score[i])
+                },
+                'alert_required': bool(level_index[i] >= 2),
+                'evacuation_recommended': bool(level_index[i] == 3)
+            } for i in range(n)]
+        
+        return result
+    
+    def rescore_history(self, arrays, capacity=1.0, environmental=0.0):
+        """
+        Re-score a whole stored history (history_to_arrays output) with the current weights.
+        The history component depends on earlier scores, so the series is scored twice:
+        once without it, then with the history component derived from the first pass.
+        :param environmental: Extra static environmental risk (night time is derived from timestamps)
+        :return: score_batch result arrays, in record order
+        """
+        night = (arrays['hour'] >= 21) | (arrays['hour'] <= 5)
+        environmental = np.minimum(environmental + 0.2 * night, 1.0)
+        columns = dict(density=arrays['density'], anomaly_severities=arrays['anomaly_severities'],
+                       flow_codes=arrays['flow_codes'], capacity=capacity, environmental=environmental)
+        
+        first_pass = self.score_batch(**columns)
+        history = np.zeros(len(arrays['density']))
+        for zone_code in range(len(arrays['zones'])):
+            index = np.flatnonzero(arrays['zone_codes'] == zone_code)
+            history[index] = _historical_component(first_pass['overall_score'][index])
+        
+        return self.score_batch(history=history, **columns)
+    
+    def _level_indices(self, scores):
+        """Index into RISK_LEVELS for an array of overall scores"""
+        return np.select(
+            [scores >= self.thresholds['CRITICAL'],
+             scores >= self.thresholds['HIGH'],
+             scores >= self.thresholds['MEDIUM']],
+            [3, 2, 1], default=0)
+    
     def generate_recommendations(self, risk_level, density_risk, anomaly_risk, flow_risk):
         """
-        Generate actionable recommendations based on risk assessment
+        Generate actionable recommendations based on risk assessment.
+        The output only depends on the risk signature, so results are memoized and
+        shared between calls as immutable tuples.
         """
+        anomaly_types = ()
+        if anomaly_risk['anomaly_count'] > 0:
+            anomaly_types = tuple(dict.fromkeys(a['type'] for a in anomaly_risk['anomalies']))
+        signature = (risk_level, density_risk['density_ratio'] > 0.7, anomaly_types,
+                     flow_risk.get('pattern'))
+        
+        cached = self.recommendation_cache.get(signature)
+        if cached is not None:
+            self.recommendation_cache.move_to_end(signature)
+            self.recommendation_cache_stats['hits'] += 1
+            return cached
+        
+        self.recommendation_cache_stats['misses'] += 1
+        recommendations = self._build_recommendations(*signature)
+        self.recommendation_cache[signature] = recommendations
+        if len(self.recommendation_cache) > self.recommendation_cache_size:
+            self.recommendation_cache.popitem(last=False)
+        return recommendations
+    
+    def _build_recommendations(self, risk_level, density_critical, anomaly_types, flow_pattern):
+        """Build the recommendation tuple for one risk signature"""
         recommendations = []
         
         if risk_level == "CRITICAL":
@@ -318,29 +682,45 @@ class RiskScorer:
             recommendations.append("Prepare for possible evacuation")
         
         # Density-specific recommendations
-        if density_risk['density_ratio'] > 0.7:
+        if density_critical:
             recommendations.append("🔴 Crowd density critical - stop entry to this zone")
             recommendations.append("Direct people to alternate routes/areas")
         
         # Anomaly-specific recommendations
-        if anomaly_risk['anomaly_count'] > 0:
-            for anomaly in anomaly_risk['anomalies']:
-                if anomaly['type'] == 'PANIC_MOVEMENT':
-                    recommendations.append("⚡ Panic detected - calm crowd via PA system")
-                elif anomaly['type'] == 'FIGHTING':
-                    recommendations.append("👮 Fighting detected - dispatch security immediately")
-                elif anomaly['type'] == 'DENSITY_SPIKE':
-                    recommendations.append("📊 Rapid crowd growth - implement entry control")
+        for anomaly_type in anomaly_types:
+            if anomaly_type == 'PANIC_MOVEMENT':
+                recommendations.append("⚡ Panic detected - calm crowd via PA system")
+            elif anomaly_type == 'FIGHTING':
+                recommendations.append("👮 Fighting detected - dispatch security immediately")
+            elif anomaly_type == 'DENSITY_SPIKE':
+                recommendations.append("📊 Rapid crowd growth - implement entry control")
+            elif anomaly_type == 'CROWD_PRESSURE':
+                recommendations.append("🔶 Crowd pressure building - relieve density at hotspot cells now")
         
         # Flow-specific recommendations
-        if flow_risk.get('pattern') == 'CHAOTIC':
+        if flow_pattern == 'CHAOTIC':
             recommendations.append("🌀 Chaotic movement - establish clear pathways")
             recommendations.append("Use barriers to guide crowd flow")
+        elif flow_pattern == 'COUNTER_FLOW':
+            recommendations.append("↔️ Opposing crowd streams - separate inbound and outbound lanes")
+        elif flow_pattern == 'BOTTLENECK':
+            recommendations.append("🚧 Bottleneck forming - hold inflow and open additional exits")
         
         if not recommendations:
             recommendations.append("✅ Situation normal - continue monitoring")
         
-        return recommendations
+        return tuple(recommendations)
+    
+    def get_recommendation_cache_stats(self):
+        """Hit rate of the recommendation memo cache"""
+        hits = self.recommendation_cache_stats['hits']
+        total = hits + self.recommendation_cache_stats['misses']
+        return {
+            'hits': hits,
+            'misses': self.recommendation_cache_stats['misses'],
+            'size': len(self.recommendation_cache),
+            'hit_rate': round(hits / total, 4) if total else 0.0
+        }
     
     def log_alert(self, risk_report):
         """
@@ -353,13 +733,61 @@ class RiskScorer:
             'person_count': risk_report['person_count'],
             'components': risk_report['components']
         }
+        
+        # The oldest in-memory alert is about to be evicted: spill it to disk
+        if len(self.alert_history) == self.alert_history.maxlen:
+            self._spill_buffer.append(self.alert_history[0])
+            if (len(self._spill_buffer) >= self.spill_batch_size or
+                    time.time() - self._last_spill >= self.spill_interval):
+                self.flush_alert_log()
+        
         self.alert_history.append(alert_entry)
+        self.alert_counts['total'] += 1
+        if alert_entry['risk_level'] in self.alert_counts:
+            self.alert_counts[alert_entry['risk_level']] += 1
+    
+    def flush_alert_log(self):
+        """
+        Append evicted alerts to the on-disk log (batched to keep file I/O off the hot path)
+        :return: Number of alerts written
+        """
+        self._last_spill = time.time()
+        if not self._spill_buffer:
+            return 0
+        
+        pending = self._spill_buffer
+        self._spill_buffer = []
+        self.spilled_alerts += len(pending)
+        if not self.alert_log_path:
+            return 0
+        
+        try:
+            os.makedirs(os.path.dirname(self.alert_log_path) or '.', exist_ok=True)
+            with open(self.alert_log_path, 'a', encoding='utf-8') as log_file:
+                for entry in pending:
+                    log_file.write(json.dumps(entry, default=_json_default) + '\n')
+            return len(pending)
+        except Exception as e:
+            print(f"❌ Failed to spill alert history: {str(e)}")
+            return 0
+    
+    def flush(self):
+        """Write spilled alerts that are still buffered (pipeline shutdown, interpreter exit)"""
+        return self.flush_alert_log()
+    
+    def close(self):
+        """Flush the alert log; the scorer is no longer flushed at exit"""
+        written = self.flush()
+        _open_scorers.discard(self)
+        return written
     
     def get_alert_history(self, limit=50):
         """
         Retrieve recent alerts for dashboard display
         """
-        return self.alert_history[-limit:]
+        recent = list(islice(reversed(self.alert_history), limit))
+        recent.reverse()
+        return recent
     
     def export_analytics(self):
         """
@@ -382,9 +810,10 @@ class RiskScorer:
                 'std_deviation': round(np.std(risk_scores), 3)
             },
             'alerts': {
-                'total_alerts': len(self.alert_history),
-                'critical_alerts': sum(1 for a in self.alert_history if a['risk_level'] == 'CRITICAL'),
-                'high_alerts': sum(1 for a in self.alert_history if a['risk_level'] == 'HIGH')
+                'total_alerts': self.alert_counts['total'],
+                'critical_alerts': self.alert_counts['CRITICAL'],
+                'high_alerts': self.alert_counts['HIGH'],
+                'spilled_alerts': self.spilled_alerts + len(self._spill_buffer)
             },
             'trend': 'IMPROVING' if risk_scores[-1] < risk_scores[0] else 'WORSENING'
         }
@@ -393,8 +822,11 @@ class RiskScorer:
     
     def reset(self):
         """Reset all scoring history"""
+        self.flush_alert_log()
         self.risk_history.clear()
         self.alert_history.clear()
+        self.spilled_alerts = 0
+        self.alert_counts = {'total': 0, 'CRITICAL': 0, 'HIGH': 0}
 
 
 # Example usage and testing
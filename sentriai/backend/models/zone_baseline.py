@@ -0,0 +1,209 @@
+import atexit
+import json
+import math
+import os
+import threading
+from datetime import datetime
+from functools import lru_cache
+
+# Learned baselines shared by all cameras of a process (settings.ZONE_BASELINE_PATH /
+# settings.ZONE_BASELINE_SAVE_INTERVAL)
+DEFAULT_BASELINE_PATH = os.getenv("ZONE_BASELINE_PATH", "models/zone_baselines.json")
+BASELINE_SAVE_INTERVAL = float(os.getenv("ZONE_BASELINE_SAVE_INTERVAL", "300"))
+
+
+class ZoneBaseline:
+    """
+    Learned per-zone baselines for anomaly metrics:
+    - EWMA mean/variance per (zone, time-of-day bucket, metric)
+    - O(1) update per sample, no offline training
+    - Z-scores against the baseline replace fixed thresholds once warm
+    """
+    
+    def __init__(self, alpha=0.002, bucket_hours=1, min_samples=300, z_threshold=3.0,
+                 outlier_weight=0.1):
+        """
+        :param alpha: EWMA smoothing factor (0.002 ~ memory of a few minutes at 10 samples/s)
+        :param bucket_hours: Width of the time-of-day buckets
+        :param min_samples: Samples needed before z-scores are reported
+        :param z_threshold: Z-score above which a sample counts as anomalous
+        :param outlier_weight: Relative weight of anomalous samples in the update, so an
+                               incident does not immediately become the new normal
+        """
+        self.alpha = alpha
+        self.bucket_hours = bucket_hours
+        self.min_samples = min_samples
+        self.z_threshold = z_threshold
+        self.outlier_weight = outlier_weight
+        
+        # (zone, bucket, metric) -> [mean, variance, count]
+        self.stats = {}
+        self.lock = threading.Lock()  # Cameras on different threads share one baseline
+        self.autosave_thread = None
+        self.stop_event = threading.Event()
+    
+    def time_bucket(self, timestamp=None):
+        """Time-of-day bucket for a unix timestamp (now if None)"""
+        moment = datetime.fromtimestamp(timestamp) if timestamp is not None else datetime.now()
+        return moment.hour // self.bucket_hours
+    
+    def z_score(self, zone, metric, value, timestamp=None):
+        """
+        Score a value against the baseline without updating it
+        :return: z-score or None while the baseline is still warming up
+        """
+        state = self.stats.get((zone, self.time_bucket(timestamp), metric))
+        if state is None or state[2] < self.min_samples:
+            return None
+        return self._z(value, state[0], state[1])
+    
+    def update(self, zone, metric, value, timestamp=None):
+        """
+        Score a value against the baseline, then fold it into the EWMA
+        :return: z-score or None while the baseline is still warming up
+        """
+        key = (zone, self.time_bucket(timestamp), metric)
+        with self.lock:
+            state = self.stats.get(key)
+            if state is None:
+                self.stats[key] = [float(value), 0.0, 1]
+                return None
+            
+            mean, variance, count = state
+            z = self._z(value, mean, variance) if count >= self.min_samples else None
+            
+            # Cumulative average while warming up, then a fixed EWMA rate
+            alpha = max(self.alpha, 1.0 / (count + 1))
+            if z is not None and abs(z) > self.z_threshold:
+                alpha *= self.outlier_weight
+            
+            diff = value - mean
+            increment = alpha * diff
+            state[0] = mean + increment
+            state[1] = (1 - alpha) * (variance + diff * increment)
+            state[2] = count + 1
+        return z
+    
+    def is_warm(self, zone, metric, timestamp=None):
+        """Whether z-scores are available for this zone/metric in the current bucket"""
+        state = self.stats.get((zone, self.time_bucket(timestamp), metric))
+        return state is not None and state[2] >= self.min_samples
+    
+    def get_baseline(self, zone, metric, timestamp=None):
+        """Current baseline for dashboard display"""
+        state = self.stats.get((zone, self.time_bucket(timestamp), metric))
+        if state is None:
+            return None
+        return {
+            'mean': state[0],
+            'std': math.sqrt(state[1]),
+            'samples': state[2],
+            'warm': state[2] >= self.min_samples
+        }
+    
+    def to_dict(self):
+        """Serialize learned baselines so they survive restarts"""
+        with self.lock:
+            stats = [[zone, bucket, metric] + state for (zone, bucket, metric), state in self.stats.items()]
+        return {
+            'alpha': self.alpha,
+            'bucket_hours': self.bucket_hours,
+            'stats': stats
+        }
+    
+    def load_dict(self, data, merge=False):
+        """
+        Restore baselines produced by to_dict
+        :param merge: Keep the current entry where it has seen more samples than the restored one
+        """
+        with self.lock:
+            for zone, bucket, metric, mean, variance, count in data.get('stats', []):
+                current = self.stats.get((zone, bucket, metric))
+                if not merge or current is None or current[2] < count:
+                    self.stats[(zone, bucket, metric)] = [mean, variance, count]
+    
+    def save(self, path=DEFAULT_BASELINE_PATH):
+        """
+        Write the baselines to path (atomically). Entries already in the file that have seen more
+        samples win, so worker processes owning different cameras can share one file.
+        """
+        merged = ZoneBaseline(alpha=self.alpha, bucket_hours=self.bucket_hours)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                merged.load_dict(json.load(f))
+        merged.load_dict(self.to_dict(), merge=True)
+        
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(merged.to_dict(), f)
+        os.replace(temp_path, path)
+        return len(merged.stats)
+    
+    @classmethod
+    def load(cls, path=DEFAULT_BASELINE_PATH, **kwargs):
+        """Baselines written by save() (empty when nothing has been saved yet)"""
+        baseline = cls(**kwargs)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                baseline.load_dict(json.load(f))
+        return baseline
+    
+    def start_autosave(self, path=DEFAULT_BASELINE_PATH, interval=BASELINE_SAVE_INTERVAL):
+        """Save every interval seconds on a background thread"""
+        if self.autosave_thread is not None:
+            return
+        
+        def autosave():
+            while not self.stop_event.wait(interval):
+                try:
+                    self.save(path)
+                except Exception as e:
+                    print(f"❌ Failed to save zone baselines: {str(e)}")
+        
+        self.autosave_thread = threading.Thread(target=autosave, daemon=True)
+        self.autosave_thread.start()
+    
+    def stop_autosave(self):
+        self.stop_event.set()
+        if self.autosave_thread:
+            self.autosave_thread.join(timeout=2)
+            self.autosave_thread = None
+    
+    def reset(self, zone=None):
+        """Forget baselines for one zone (or all zones)"""
+        with self.lock:
+            if zone is None:
+                self.stats.clear()
+            else:
+                for key in [k for k in self.stats if k[0] == zone]:
+                    del self.stats[key]
+    
+    @staticmethod
+    def _z(value, mean, variance):
+        # Floor the spread so a perfectly flat baseline does not explode the z-score
+        std = max(math.sqrt(max(variance, 0.0)), abs(mean) * 0.1, 1e-3)
+        return (value - mean) / std
+
+
+def save_default_baseline():
+    """Save the process-wide baseline, if this process loaded one (shutdown paths call this)"""
+    if load_default_baseline.cache_info().currsize:
+        try:
+            load_default_baseline().save(DEFAULT_BASELINE_PATH)
+        except Exception as e:
+            print(f"❌ Failed to save zone baselines: {str(e)}")
+
+
+@lru_cache()
+def load_default_baseline():
+    """
+    The baseline shared by every camera of this process: restored from DEFAULT_BASELINE_PATH,
+    saved every BASELINE_SAVE_INTERVAL seconds and at interpreter exit. Worker processes do not
+    run atexit handlers and call save_default_baseline() when they stop.
+    """
+    baseline = ZoneBaseline.load(DEFAULT_BASELINE_PATH)
+    baseline.start_autosave(DEFAULT_BASELINE_PATH, BASELINE_SAVE_INTERVAL)
+    atexit.register(save_default_baseline)
+    print(f"✅ Zone baselines loaded: {len(baseline.stats)} entries")
+    return baseline
@@ -0,0 +1,276 @@
+import argparse
+import json
+import math
+import multiprocessing as mp
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import cv2
+
+from models.zone_baseline import ZoneBaseline
+from utils.camera_workers import DETECTION_SIZE, analyze_frame, create_analyzers
+from utils.ffmpeg_capture import FFmpegCapture, ffmpeg_available
+
+
+def probe_video(path):
+    """Frame rate, frame count and duration (seconds) of a video file"""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video: {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return {'fps': fps, 'frame_count': frame_count, 'duration': frame_count / fps}
+
+
+def plan_segments(duration, segment_seconds, warmup_seconds=10.0):
+    """
+    Split [0, duration) into segments. Each segment starts decoding warmup_seconds early so the
+    stateful anomaly/flow/risk models are warm at its start; warmup results are discarded.
+    """
+    count = max(int(math.ceil(duration / segment_seconds)), 1)
+    return [{
+        'index': index,
+        'start': index * segment_seconds,
+        'end': min((index + 1) * segment_seconds, duration),
+        'warmup_start': max(index * segment_seconds - warmup_seconds, 0.0)
+    } for index in range(count)]
+
+
+def keyframe_times(path, start, end):
+    """Presentation times of the keyframes in [start, end) via ffprobe (decodes keyframes only)"""
+    output = subprocess.run(
+        ['ffprobe', '-v', 'error', '-skip_frame', 'nokey', '-select_streams', 'v:0',
+         '-read_intervals', f"{start}%{end}", '-show_entries', 'frame=pts_time,best_effort_timestamp_time',
+         '-of', 'json', path], capture_output=True, check=True).stdout
+    times = []
+    for frame in json.loads(output).get('frames', []):
+        value = frame.get('pts_time', frame.get('best_effort_timestamp_time'))
+        if value not in (None, 'N/A'):
+            times.append(float(value))
+    return [t for t in times if start <= t < end]
+
+
+def _stride_frames(path, segment, stride_seconds):
+    """(timestamp, frame) every stride_seconds; skipped frames are grabbed, not decoded"""
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    stride = max(int(round(stride_seconds * fps)), 1)
+    first = int(round(segment['warmup_start'] * fps))
+    last = int(math.ceil(segment['end'] * fps))
+    cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+    try:
+        for index in range(first, last):
+            if (index - first) % stride:
+                if not cap.grab():
+                    break
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield index / fps, frame
+    finally:
+        cap.release()
+
+
+def _keyframe_frames(path, segment):
+    """(timestamp, frame) for each keyframe, decoded by ffmpeg at detection size"""
+    times = keyframe_times(path, segment['warmup_start'], segment['end'])
+    if not times:
+        return
+    capture = FFmpegCapture(path, *DETECTION_SIZE, threads=1, keyframes_only=True,
+                            input_args=['-ss', str(times[0])])
+    try:
+        for timestamp in times:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            yield timestamp, frame
+    finally:
+        capture.release()
+
+
+def parse_start_time(value):
+    """Footage start time from unix seconds or an ISO 8601 string"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def analyze_segment(path, segment, stride_seconds=0.5, sampling='stride', capacity=1.0, zone='offline',
+                    start_time=None):
+    """
+    Worker process entry point: decode and analyze one segment
+    :param start_time: Unix time of the first frame; the models see start_time + footage timestamp
+                       (wall clock when None)
+    :return: {'segment', 'records', 'frames_analyzed', 'warmup_frames', 'elapsed'}
+    """
+    from models.crowd_detection import CrowdDetector
+    from models.occupancy_forecast import OccupancyForecaster
+    
+    cv2.setNumThreads(1)  # One process per core already
+    started = time.time()
+    detector = CrowdDetector()
+    # Score against the live zone baselines, but never write offline footage back into them
+    anomaly_detector, risk_scorer = create_analyzers(zone, baseline=ZoneBaseline.load())
+    forecaster = OccupancyForecaster()  # Warmed up on the segment's warmup footage
+    
+    frames = _keyframe_frames(path, segment) if sampling == 'keyframe' else \
+        _stride_frames(path, segment, stride_seconds)
+    records = []
+    warmup_frames = 0
+    for timestamp, frame in frames:
+        captured_at = None if start_time is None else start_time + timestamp
+        record = analyze_frame(frame, detector, anomaly_detector, risk_scorer, capacity, timestamp=captured_at,
+                               forecaster=forecaster)
+        if timestamp < segment['start']:
+            warmup_frames += 1
+            continue
+        records.append({'timestamp': round(timestamp, 3), **record})
+    
+    return {
+        'segment': segment,
+        'records': records,
+        'frames_analyzed': len(records) + warmup_frames,
+        'warmup_frames': warmup_frames,
+        'elapsed': round(time.time() - started, 3)
+    }
+
+
+def merge_alerts(records, max_gap):
+    """Collapse consecutive alert samples into incidents"""
+    alerts = []
+    levels = ['LOW', 'MEDIUM', 'HIGH', 'CRITICAL']
+    for record in records:
+        if not record['alert_required']:
+            continue
+        current = alerts[-1] if alerts else None
+        if current is None or record['timestamp'] - current['end'] > max_gap:
+            current = {'start': record['timestamp'], 'end': record['timestamp'], 'samples': 0,
+                       'peak_level': record['risk_level'], 'peak_score': record['risk_score'],
+                       'peak_timestamp': record['timestamp'], 'max_person_count': 0,
+                       'anomaly_types': [], 'recommendations': record['recommendations']}
+            alerts.append(current)
+        current['end'] = record['timestamp']
+        current['samples'] += 1
+        current['max_person_count'] = max(current['max_person_count'], record['person_count'])
+        if (levels.index(record['risk_level']), record['risk_score']) > \
+                (levels.index(current['peak_level']), current['peak_score']):
+            current['peak_level'] = record['risk_level']
+            current['peak_score'] = record['risk_score']
+            current['peak_timestamp'] = record['timestamp']
+            current['recommendations'] = record['recommendations']
+        for anomaly in record['anomalies']:
+            if anomaly['type'] not in current['anomaly_types']:
+                current['anomaly_types'].append(anomaly['type'])
+    return alerts
+
+
+def analyze_video(path, workers=None, segment_seconds=None, warmup_seconds=10.0, stride_seconds=0.5,
+                  sampling='stride', capacity=1.0, zone='offline', footage_start=None):
+    """
+    Headless, faster-than-real-time analysis of a video file
+    :param workers: Worker processes (default: CPU count)
+    :param segment_seconds: Segment length (default: duration split evenly over the workers)
+    :param warmup_seconds: Footage decoded before each segment start to warm up the models
+    :param stride_seconds: Sampling interval for 'stride' sampling
+    :param sampling: 'stride' (every stride_seconds) or 'keyframe' (keyframes only, needs ffmpeg)
+    :param footage_start: Unix time of the first frame, so time-of-day baselines and rules follow the
+                          footage (default: file modification time minus the duration)
+    :return: Merged per-timestamp series, alerts and a summary
+    """
+    if sampling not in ('stride', 'keyframe'):
+        raise ValueError(f"Unknown sampling mode: {sampling}")
+    if sampling == 'keyframe' and not (ffmpeg_available() and shutil.which('ffprobe')):
+        print("⚠️ ffmpeg/ffprobe not found - falling back to stride sampling")
+        sampling = 'stride'
+    
+    start_time = time.time()
+    info = probe_video(path)
+    workers = workers or os.cpu_count() or 1
+    segment_seconds = segment_seconds or max(info['duration'] / workers, 30.0)
+    segments = plan_segments(info['duration'], segment_seconds, warmup_seconds)
+    if footage_start is None:
+        footage_start = os.path.getmtime(path) - info['duration']
+    
+    with ProcessPoolExecutor(max_workers=min(workers, len(segments)),
+                             mp_context=mp.get_context('spawn')) as executor:
+        results = list(executor.map(analyze_segment, [path] * len(segments), segments,
+                                    [stride_seconds] * len(segments), [sampling] * len(segments),
+                                    [capacity] * len(segments), [zone] * len(segments),
+                                    [footage_start] * len(segments)))
+    
+    records = sorted((record for result in results for record in result['records']),
+                     key=lambda record: record['timestamp'])
+    alerts = merge_alerts(records, max_gap=max(2 * stride_seconds, 5.0))
+    elapsed = time.time() - start_time
+    
+    level_distribution = {level: 0 for level in ['LOW', 'MEDIUM', 'HIGH', 'CRITICAL']}
+    for record in records:
+        level_distribution[record['risk_level']] += 1
+    
+    return {
+        'video': path,
+        'summary': {
+            'duration_seconds': round(info['duration'], 2),
+            'footage_start': datetime.fromtimestamp(footage_start).isoformat(),
+            'elapsed_seconds': round(elapsed, 2),
+            'speedup': round(info['duration'] / elapsed, 2) if elapsed else None,
+            'sampling': sampling,
+            'stride_seconds': stride_seconds if sampling == 'stride' else None,
+            'segments': len(segments),
+            'workers': min(workers, len(segments)),
+            'samples': len(records),
+            'warmup_frames': sum(result['warmup_frames'] for result in results),
+            'max_person_count': max((record['person_count'] for record in records), default=0),
+            'level_distribution': level_distribution,
+            'alerts': len(alerts)
+        },
+        'segments': [{**result['segment'], 'samples': len(result['records']), 'elapsed': result['elapsed']}
+                     for result in results],
+        'series': records,
+        'alerts': alerts
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Analyze a recorded video headless, in parallel segments")
+    parser.add_argument("video", help="Video file")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--segment", type=float, default=None, help="Segment length in seconds")
+    parser.add_argument("--warmup", type=float, default=10.0, help="Model warmup before each segment (seconds)")
+    parser.add_argument("--stride", type=float, default=0.5, help="Seconds between analyzed frames")
+    parser.add_argument("--sampling", choices=['stride', 'keyframe'], default='stride',
+                        help="Analyze every --stride seconds or keyframes only")
+    parser.add_argument("--capacity", type=float, default=1.0, help="Area capacity used for density ratios")
+    parser.add_argument("--zone", default="offline", help="Zone id for the anomaly baseline")
+    parser.add_argument("--start-time", type=parse_start_time, default=None,
+                        help="When the first frame was filmed (ISO 8601 or unix seconds); time-of-day "
+                             "baselines and the night-time risk rule use it (default: file modification "
+                             "time minus the duration)")
+    parser.add_argument("--output", help="Write the full result (series + alerts) as JSON")
+    args = parser.parse_args()
+    
+    result = analyze_video(args.video, workers=args.workers, segment_seconds=args.segment,
+                           warmup_seconds=args.warmup, stride_seconds=args.stride, sampling=args.sampling,
+                           capacity=args.capacity, zone=args.zone, footage_start=args.start_time)
+    
+    summary = result['summary']
+    print(f"🎬 {args.video}: {summary['duration_seconds']}s analyzed in {summary['elapsed_seconds']}s "
+          f"({summary['speedup']}x real time, {summary['segments']} segments, {summary['workers']} workers)")
+    print(f"📊 {summary['samples']} samples, max {summary['max_person_count']} people")
+    for level in ['LOW', 'MEDIUM', 'HIGH', 'CRITICAL']:
+        print(f"  {level:<8} {summary['level_distribution'][level]:>8}")
+    for alert in result['alerts']:
+        print(f"🚨 {alert['start']:>8.1f}s - {alert['end']:>8.1f}s  {alert['peak_level']:<8} "
+              f"score {alert['peak_score']:.2f}  {', '.join(alert['anomaly_types'])}")
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, default=str)
+        print(f"💾 Results saved to {args.output}")
@@ -0,0 +1,53 @@
+import argparse
+import json
+
+from models.risk_scoring import recalibrate_history
+
+
+def load_history(path):
+    """
+    Load stored crowd history: the JSON from /api/analytics/export, a plain JSON list,
+    or JSON lines (one entry per line)
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            return [json.loads(line) for line in f if line.strip()]
+        data = json.load(f)
+    return data['data'] if isinstance(data, dict) else data
+
+
+def parse_overrides(pairs):
+    """Turn ["density=0.4", "HIGH=0.65"] into {"density": 0.4, "HIGH": 0.65}"""
+    overrides = {}
+    for pair in pairs or []:
+        key, _, value = pair.partition('=')
+        overrides[key.strip()] = float(value)
+    return overrides
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Re-score stored crowd history with candidate risk weights")
+    parser.add_argument("history", help="History export (.json) or JSON lines file (.jsonl)")
+    parser.add_argument("--weight", action="append", metavar="NAME=VALUE",
+                        help="Override a RiskScorer weight (density, anomaly, flow, history, environmental, "
+                             "forecast)")
+    parser.add_argument("--threshold", action="append", metavar="LEVEL=VALUE",
+                        help="Override a RiskScorer threshold (LOW, MEDIUM, HIGH, CRITICAL)")
+    parser.add_argument("--capacity", type=float, default=1.0, help="Area capacity used for density ratios")
+    parser.add_argument("--environmental", type=float, default=0.0, help="Extra static environmental risk")
+    args = parser.parse_args()
+    
+    records = load_history(args.history)
+    print(f"📂 Loaded {len(records)} history entries")
+    
+    result = recalibrate_history(records, weights=parse_overrides(args.weight),
+                                 thresholds=parse_overrides(args.threshold),
+                                 capacity=args.capacity, environmental=args.environmental)
+    
+    print(f"⏱️ Re-scored in {result['elapsed_ms']} ms")
+    print(f"Alerts: {result['stored_alerts']} -> {result['alerts']} "
+          f"({result['changed_levels']} samples changed level)")
+    for level in ['LOW', 'MEDIUM', 'HIGH', 'CRITICAL']:
+        print(f"  {level:<8} {result['stored_level_distribution'][level]:>8} -> "
+              f"{result['level_distribution'][level]:>8}")
+    print(json.dumps(result, indent=2))
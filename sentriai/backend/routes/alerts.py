@@ -3,6 +3,8 @@ from datetime import datetime, timedelta
 import json
 from collections import deque
 
+from utils.latency_tracing import tracer
+
 # Create Blueprint for alerts routes
 alerts_bp = Blueprint('alerts', __name__, url_prefix='/api/alerts')
 
@@ -23,8 +25,13 @@ class AlertManager:
             'DENSITY_SPIKE', 'FLOW_ANOMALY', 'SYSTEM_WARNING'
         ]
     
-    def create_alert(self, alert_data):
-        """Create and store a new alert"""
+    def create_alert(self, alert_data, trace=None):
+        """
+        Create and store a new alert
+        :param trace: Optional latency Trace of the frame that raised the alert. Only the 'alert' stage
+                      is marked; the trace's owner (DetectionScheduler, CameraWorkerPool or the
+                      POST handler) finishes it once notification is done
+        """
         alert = {
             'id': self.alert_id_counter,
             'timestamp': datetime.now().isoformat(),
@@ -51,6 +58,9 @@ class AlertManager:
         if alert['severity'] in ['HIGH', 'CRITICAL']:
             active_alerts.append(alert)
         
+        if trace is not None:
+            trace.mark('alert')
+        
         return alert
     
     def get_alerts(self, filters=None):
@@ -280,7 +290,8 @@ def create_new_alert():
     """
     POST /api/alerts/create
     Create a new alert
-    Body: {type, severity, title, description, location, person_count, risk_score, camera_id, recommendations}
+    Body: {type, severity, title, description, location, person_count, risk_score, camera_id, recommendations,
+           trace (optional, latency trace of the frame)}
     """
     try:
         data = request.get_json()
@@ -298,8 +309,12 @@ def create_new_alert():
                 'error': 'Missing required fields: type, severity'
             }), 400
         
-        # Create alert
-        alert = alert_manager.create_alert(data)
+        # Create alert (a 'trace' from Trace.to_dict() continues the frame's latency trace)
+        trace_data = data.pop('trace', None)
+        trace = tracer.resume(trace_data) if isinstance(trace_data, dict) else None
+        alert = alert_manager.create_alert(data, trace=trace)
+        if trace is not None:
+            trace.finish()
         
         return jsonify({
             'success': True,
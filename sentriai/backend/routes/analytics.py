@@ -3,6 +3,11 @@ from datetime import datetime, timedelta
 import numpy as np
 from collections import defaultdict, deque
 import json
+import time
+
+from models.occupancy_forecast import OccupancyForecaster
+from models.risk_scoring import recalibrate_history
+from utils.latency_tracing import tracer
 
 # Create Blueprint for analytics routes
 analytics_bp = Blueprint('analytics', __name__, url_prefix='/api/analytics')
@@ -24,6 +29,7 @@ class AnalyticsEngine:
             'ZONE_D': 'Exit Area',
             'ZONE_E': 'VIP Section'
         }
+        self.forecaster = OccupancyForecaster()
     
     def store_crowd_data(self, data):
         """Store crowd monitoring data for analysis"""
@@ -35,7 +41,8 @@ class AnalyticsEngine:
             'risk_score': data.get('risk_score', 0),
             'zone': data.get('zone', 'ZONE_A'),
             'camera_id': data.get('camera_id', 'CAM-001'),
-            'anomalies': data.get('anomalies', [])
+            'anomalies': data.get('anomalies', []),
+            'flow_pattern': data.get('flow_pattern')
         }
         crowd_data_history.append(entry)
         
@@ -44,6 +51,9 @@ class AnalyticsEngine:
         heatmap_data[zone]['density'].append(entry['density'])
         heatmap_data[zone]['timestamps'].append(entry['timestamp'])
         
+        # Incremental per-zone density forecast
+        self.forecaster.update(zone, entry['density'], time.time())
+        
         return entry
     
     def get_real_time_metrics(self):
@@ -301,6 +311,18 @@ class AnalyticsEngine:
             'generated_at': datetime.now().isoformat()
         }
     
+    def get_forecast(self, zone=None, horizons=(5, 10, 15)):
+        """Short-horizon density forecasts with confidence bands"""
+        zones = [zone] if zone else list(self.forecaster.zones.keys())
+        forecasts = []
+        for zone_id in zones:
+            forecast = self.forecaster.forecast(zone_id, horizons)
+            if forecast:
+                forecast['zone_name'] = self.zone_names.get(zone_id, 'Unknown')
+                forecast['risk_level'] = self._density_to_risk(max(p['density'] for p in forecast['forecast']))
+                forecasts.append(forecast)
+        return forecasts
+    
     def _density_to_risk(self, density):
         """Convert density to risk level"""
         if density >= 0.8:
@@ -506,6 +528,74 @@ def store_data():
         }), 500
 
 
+@analytics_bp.route('/forecast', methods=['GET'])
+def get_forecast():
+    """
+    GET /api/analytics/forecast
+    Predicted density per zone with confidence bands
+    Query params: zone (optional), horizons (minutes, default: 5,10,15)
+    """
+    try:
+        zone = request.args.get('zone')
+        try:
+            horizons = tuple(int(h) for h in request.args.get('horizons', '5,10,15').split(','))
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'horizons must be comma-separated whole minutes'
+            }), 400
+        forecasts = analytics_engine.get_forecast(zone, horizons)
+        
+        if zone and not forecasts:
+            return jsonify({
+                'success': False,
+                'error': f'No data for zone {zone}'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'data': forecasts
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@analytics_bp.route('/recalibrate', methods=['POST'])
+def recalibrate_risk():
+    """
+    POST /api/analytics/recalibrate
+    Re-score the stored history with candidate risk weights/thresholds (nothing is changed)
+    Body: {weights, thresholds, capacity, environmental} - all optional
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        result = recalibrate_history(
+            list(crowd_data_history),
+            weights=data.get('weights'),
+            thresholds=data.get('thresholds'),
+            capacity=float(data.get('capacity', 1.0)),
+            environmental=float(data.get('environmental', 0.0))
+        )
+        
+        return jsonify({
+            'success': True,
+            'recalibration': result
+        }), 200
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @analytics_bp.route('/export', methods=['GET'])
 def export_data():
     """
@@ -567,6 +657,33 @@ def get_dashboard_stats():
         }), 500
 
 
+@analytics_bp.route('/latency', methods=['GET'])
+def get_latency():
+    """
+    GET /api/analytics/latency?camera_id=CAM-001
+    Per-stage and end-to-end latency histograms (capture -> detect -> anomaly -> risk -> alert -> notify)
+    """
+    try:
+        camera_id = request.args.get('camera_id')
+        report = tracer.get_report(camera_id)
+        if camera_id is not None and not report:
+            return jsonify({
+                'success': False,
+                'error': f'No latency data for camera: {camera_id}'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'cameras': report,
+            'timestamp': datetime.now().isoformat()
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @analytics_bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
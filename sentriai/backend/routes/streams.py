@@ -0,0 +1,100 @@
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from datetime import datetime
+
+from utils.streaming import MJPEGBroadcaster, MIMETYPE
+
+# Create Blueprint for live video streams
+streams_bp = Blueprint('streams', __name__, url_prefix='/api/streams')
+
+# camera_id -> MJPEGBroadcaster (one per camera, shared by all viewers)
+broadcasters = {}
+
+
+def register_camera(camera_id, source, **options):
+    """
+    Make a camera available as a stream
+    :param source: VideoProcessor (its shared broadcaster is used) or an MJPEGBroadcaster
+    :param options: MJPEGBroadcaster options (quality, width, max_fps)
+    """
+    if isinstance(source, MJPEGBroadcaster):
+        broadcaster = source
+    else:
+        broadcaster = source.get_broadcaster(**options)
+    broadcasters[str(camera_id)] = broadcaster
+    return broadcaster
+
+
+def register_cameras(multi_processor, **options):
+    """
+    Register every camera of a MultiCameraProcessor ('threads' mode) plus its
+    composite wall view as camera id 'grid'
+    """
+    for camera_id, processor in multi_processor.cameras.items():
+        if hasattr(processor, 'get_broadcaster'):
+            register_camera(camera_id, processor, **options)
+    register_camera('grid', multi_processor.get_grid_broadcaster(**options))
+    return list(broadcasters.keys())
+
+
+def unregister_camera(camera_id):
+    broadcaster = broadcasters.pop(str(camera_id), None)
+    if broadcaster:
+        broadcaster.stop()
+
+
+@streams_bp.route('/<camera_id>/mjpeg', methods=['GET'])
+def stream_camera(camera_id):
+    """
+    GET /api/streams/<camera_id>/mjpeg?fps=5
+    Live multipart MJPEG stream; each frame is encoded once for all viewers
+    """
+    broadcaster = broadcasters.get(camera_id)
+    if broadcaster is None:
+        return jsonify({
+            'success': False,
+            'error': f'Unknown camera: {camera_id}'
+        }), 404
+    
+    max_fps = request.args.get('fps', type=float)
+    response = Response(stream_with_context(broadcaster.stream(max_fps=max_fps)), mimetype=MIMETYPE)
+    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    return response
+
+
+@streams_bp.route('/<camera_id>/snapshot', methods=['GET'])
+def camera_snapshot(camera_id):
+    """
+    GET /api/streams/<camera_id>/snapshot
+    Latest frame as JPEG (the stream's already encoded frame, no extra encode)
+    """
+    broadcaster = broadcasters.get(camera_id)
+    if broadcaster is None:
+        return jsonify({
+            'success': False,
+            'error': f'Unknown camera: {camera_id}'
+        }), 404
+    
+    jpeg = broadcaster.snapshot()
+    if jpeg is None:
+        return jsonify({
+            'success': False,
+            'error': 'No frame available'
+        }), 503
+    return Response(jpeg, mimetype='image/jpeg', headers={'Cache-Control': 'no-cache'})
+
+
+@streams_bp.route('/stats', methods=['GET'])
+def stream_stats():
+    """
+    GET /api/streams/stats
+    Viewers, encode cost and bytes sent per camera stream
+    """
+    return jsonify({
+        'success': True,
+        'streams': {camera_id: broadcaster.get_stats() for camera_id, broadcaster in broadcasters.items()},
+        'timestamp': datetime.now().isoformat()
+    }), 200
+
+
+# Export the blueprint
+__all__ = ['streams_bp', 'register_camera', 'register_cameras']
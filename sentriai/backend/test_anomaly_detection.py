@@ -0,0 +1,221 @@
+import time
+
+import cv2
+import numpy as np
+import pytest
+from models.anomaly_detection import AnomalyDetector
+from models.zone_baseline import ZoneBaseline
+
+
+def write_test_clip(path, frames=60, fps=15, size=(320, 240)):
+    """Write a short clip with a square that moves faster in the second half"""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    x = 10
+    for i in range(frames):
+        image = np.full((size[1], size[0], 3), 200, dtype=np.uint8)
+        x = (x + (4 if i < frames // 2 else 25)) % (size[0] - 60)
+        cv2.rectangle(image, (x, 80), (x + 60, 160), (30, 30, 30), -1)
+        writer.write(image)
+    writer.release()
+    return path
+
+
+def run_live_rules(motion, density, baseline=None):
+    """Feed a series through the frame-by-frame rules in comprehensive_analysis order"""
+    detector = AnomalyDetector(zone_id='gate', baseline=baseline)
+    detector.current_time = 0.0
+    detected = []
+    for t in range(len(density)):
+        if t > 0:
+            detector.motion_history.append(motion[t])
+            result = detector._analyze_motion_pattern()
+            if result["anomaly_detected"]:
+                detected.append((t, result["type"]))
+        if detector.detect_crowd_density_spike(density[t])["spike_detected"]:
+            detected.append((t, "DENSITY_SPIKE"))
+    return sorted(detected)
+
+
+def test_analyze_series_matches_live_rules():
+    rng = np.random.default_rng(7)
+    n = 300
+    # Calm, then panic-like motion, then a still and dense crowd
+    motion = np.concatenate([
+        rng.uniform(0.05, 0.15, 100),
+        rng.uniform(0.1, 0.8, 100),
+        rng.uniform(0.0, 0.04, 100)
+    ])
+    density = np.concatenate([
+        rng.uniform(0.2, 0.3, 150),
+        rng.uniform(0.7, 0.9, 150)
+    ])
+    
+    result = AnomalyDetector().analyze_series(motion, density)
+    batch = sorted((e['sample'], e['type']) for e in result['events'])
+    
+    assert batch == run_live_rules(motion, density)
+    assert result['summary']['PANIC_MOVEMENT'] > 0
+    assert result['summary']['OVERCROWDING_STATIC'] > 0
+    assert result['summary']['DENSITY_SPIKE'] > 0
+
+
+def test_analyze_series_uses_the_live_baseline_z_scores():
+    rng = np.random.default_rng(11)
+    # Busy zone: motion that would always trip the fixed panic threshold, then a real surge
+    motion = np.concatenate([rng.uniform(0.3, 0.6, 250), rng.uniform(1.5, 2.5, 30)])
+    density = np.concatenate([rng.uniform(0.55, 0.65, 250), rng.uniform(0.9, 1.0, 30)])
+    
+    live_baseline = ZoneBaseline(min_samples=50)
+    live = run_live_rules(motion, density, live_baseline)
+    batch_baseline = ZoneBaseline(min_samples=50)
+    result = AnomalyDetector(zone_id='gate', baseline=batch_baseline).analyze_series(
+        motion, density, np.zeros(len(density)), start_time=0.0)
+    
+    assert sorted((e['sample'], e['type']) for e in result['events']) == live
+    for metric in ('avg_motion', 'rate_of_change'):
+        live_state = live_baseline.get_baseline('gate', metric, timestamp=0)
+        assert batch_baseline.get_baseline('gate', metric, timestamp=0) == pytest.approx(live_state)
+    panic_samples = [sample for sample, kind in live if kind == 'PANIC_MOVEMENT']
+    # Fixed threshold while warming up, then only the surge stands out
+    assert not [sample for sample in panic_samples if 100 <= sample < 250]
+    assert [sample for sample in panic_samples if sample >= 250]
+    assert np.nanmax(result['series']['motion_z']) > batch_baseline.z_threshold
+
+
+def test_analyze_series_short_input():
+    result = AnomalyDetector().analyze_series([0.1] * 5, [0.2] * 5)
+    assert result['samples'] == 5
+    assert result['events'] == []
+
+
+def test_analyze_clip_parallel_matches_serial(tmp_path):
+    clip = write_test_clip(tmp_path / "clip.mp4")
+    detector = AnomalyDetector()
+    
+    serial = detector.analyze_clip(str(clip), frame_step=2, workers=1)
+    parallel = detector.analyze_clip(str(clip), frame_step=2, workers=4,
+                                     density_fn=lambda frame: 0.5)
+    
+    assert parallel['samples'] == serial['samples'] == 30
+    assert list(parallel['frame_indices']) == list(range(0, 60, 2))
+    np.testing.assert_allclose(parallel['series']['motion'][1:], serial['series']['motion'][1:])
+    assert np.all(parallel['series']['density'] == 0.5)
+    # Faster movement in the second half shows up in the motion series
+    assert np.nanmean(serial['series']['motion'][16:]) > np.nanmean(serial['series']['motion'][1:15])
+
+
+def test_analyze_clip_skips_frames_that_fail_to_decode(tmp_path, monkeypatch):
+    clip = write_test_clip(tmp_path / "clip.mp4")
+    real_capture = cv2.VideoCapture
+    
+    class FlakyCapture:
+        """Real capture that fails to decode frame 20"""
+        def __init__(self, path):
+            self.cap = real_capture(path)
+            self.position = 0
+        
+        def set(self, prop, value):
+            if prop == cv2.CAP_PROP_POS_FRAMES:
+                self.position = int(value)
+            return self.cap.set(prop, value)
+        
+        def grab(self):
+            self.position += 1
+            return self.cap.grab()
+        
+        def read(self):
+            ret, frame = self.cap.read()
+            self.position += 1
+            return (False, None) if self.position - 1 == 20 else (ret, frame)
+        
+        def __getattr__(self, name):
+            return getattr(self.cap, name)
+    
+    monkeypatch.setattr(cv2, 'VideoCapture', FlakyCapture)
+    result = AnomalyDetector().analyze_clip(str(clip), frame_step=2, workers=1,
+                                            density_fn=lambda frame: 0.5)
+    
+    # The bad frame becomes a NaN sample and the rest of the clip is still read
+    assert result['failed_reads'] == 1
+    assert result['samples'] == 30
+    assert list(result['frame_indices']) == list(range(0, 60, 2))
+    assert np.isnan(result['series']['density'][10])
+    assert np.isnan(result['series']['motion'][11])
+    assert not np.isnan(result['series']['motion'][12:]).any()
+    assert np.isnan(result['series']['density']).sum() == 1
+
+
+def test_analyze_clip_missing_file():
+    with pytest.raises(ValueError):
+        AnomalyDetector().analyze_clip("does_not_exist.mp4")
+
+
+def test_zone_baseline_learns_per_zone_norms():
+    baseline = ZoneBaseline(min_samples=50)
+    rng = np.random.default_rng(1)
+    for value in rng.normal(0.4, 0.02, 200):
+        baseline.update('busy_gate', 'avg_motion', value, timestamp=0)
+    for value in rng.normal(0.05, 0.01, 200):
+        baseline.update('quiet_hall', 'avg_motion', value, timestamp=0)
+    
+    # The same motion level is normal at the busy gate but far out of range in the hall
+    assert abs(baseline.z_score('busy_gate', 'avg_motion', 0.4, timestamp=0)) < 1
+    assert baseline.z_score('quiet_hall', 'avg_motion', 0.4, timestamp=0) > 10
+    assert baseline.z_score('quiet_hall', 'avg_motion', 0.4, timestamp=6 * 3600) is None
+    
+    restored = ZoneBaseline(min_samples=50)
+    restored.load_dict(baseline.to_dict())
+    assert restored.get_baseline('busy_gate', 'avg_motion', timestamp=0) == \
+        baseline.get_baseline('busy_gate', 'avg_motion', timestamp=0)
+
+
+def test_baselines_persist_and_are_shared_by_pipelines(tmp_path, monkeypatch):
+    import models.zone_baseline as zone_baseline
+    from utils.camera_workers import create_analyzers
+    
+    path = str(tmp_path / "baselines.json")
+    gate, hall = ZoneBaseline(), ZoneBaseline()
+    for value in range(10):
+        gate.update('gate', 'avg_motion', value, timestamp=0)
+        hall.update('hall', 'avg_motion', value, timestamp=0)
+    gate.save(path)
+    hall.update('gate', 'avg_motion', 1.0, timestamp=0)  # Stale view of the other process' zone
+    hall.save(path)
+    
+    # Worker processes owning different zones merge into one file
+    restored = ZoneBaseline.load(path)
+    assert restored.get_baseline('gate', 'avg_motion', timestamp=0)['samples'] == 10
+    assert restored.get_baseline('hall', 'avg_motion', timestamp=0)['samples'] == 10
+    
+    monkeypatch.setattr(zone_baseline, 'DEFAULT_BASELINE_PATH', path)
+    monkeypatch.setattr(zone_baseline, 'BASELINE_SAVE_INTERVAL', 0.05)
+    zone_baseline.load_default_baseline.cache_clear()
+    try:
+        first, second = create_analyzers('gate')[0], create_analyzers('hall')[0]
+        assert first.baseline is second.baseline
+        assert first.baseline.get_baseline('hall', 'avg_motion', timestamp=0)['samples'] == 10
+        first.baseline.update('lobby', 'avg_motion', 0.2, timestamp=0)
+        time.sleep(0.2)  # Autosaved
+        assert ZoneBaseline.load(path).get_baseline('lobby', 'avg_motion', timestamp=0) is not None
+    finally:
+        zone_baseline.load_default_baseline().stop_autosave()
+        zone_baseline.load_default_baseline.cache_clear()
+
+
+def test_detector_uses_baseline_instead_of_fixed_threshold():
+    baseline = ZoneBaseline(min_samples=20)
+    detector = AnomalyDetector(zone_id='busy_gate', baseline=baseline)
+    rng = np.random.default_rng(3)
+    
+    # Constant high motion would trip the fixed 0.3 panic threshold on every frame
+    results = []
+    for value in rng.uniform(0.3, 0.6, 200):
+        detector.motion_history.append(value)
+        results.append(detector._analyze_motion_pattern())
+    assert not any(r["anomaly_detected"] for r in results[-100:])
+    
+    for value in [1.5, 2.0, 1.8, 2.5, 2.2, 1.9, 2.4, 2.1, 1.7, 2.3]:
+        detector.motion_history.append(value)
+        result = detector._analyze_motion_pattern()
+    assert result["type"] == "PANIC_MOVEMENT"
+    assert result["z_score"] > baseline.z_threshold
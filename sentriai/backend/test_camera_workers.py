@@ -0,0 +1,73 @@
+import os
+import time
+
+import utils.camera_workers as camera_workers
+from models.risk_scoring import RiskScorer
+from utils.camera_workers import CameraPipeline, CameraWorkerPool
+from utils.video_processing import MultiCameraProcessor
+
+VIDEO = os.path.join(os.path.dirname(__file__), 'crowd_detection_20251026_191404.mp4')
+
+
+def test_cameras_are_sharded_across_worker_processes():
+    pool = CameraWorkerPool(num_workers=2, thumbnail_interval=0.0)
+    pool.add_camera('cam1', VIDEO, zone='ZONE_A')
+    pool.add_camera('cam2', VIDEO, zone='ZONE_B')
+    pool.add_camera('cam3', 'missing_source.mp4')
+    try:
+        assert pool.start() == 2
+        deadline = time.time() + 60
+        while time.time() < deadline and (len(pool.get_metrics()) < 2 or 'cam3' not in pool.errors):
+            time.sleep(0.2)
+        
+        metrics = pool.get_metrics()
+        assert set(metrics) == {'cam1', 'cam2'}
+        assert metrics['cam1']['pid'] != metrics['cam2']['pid'] != os.getpid()
+        assert metrics['cam2']['zone'] == 'ZONE_B'
+        assert 'thumbnail' not in metrics['cam1']
+        assert pool.get_thumbnail('cam1')[:2] == b'\xff\xd8'
+        assert pool.errors['cam3'] == 'connect_failed'
+    finally:
+        pool.stop()
+    assert not pool.is_running
+
+
+def test_pipeline_analyzes_frames_at_their_capture_time(monkeypatch):
+    calls = []
+    
+    def fake_analyze_frame(frame, *args, timestamp=None, **kwargs):
+        calls.append(timestamp)
+        return {'alert_required': False, 'risk_level': 'LOW'}
+    
+    monkeypatch.setattr(camera_workers, 'create_analyzers',
+                        lambda zone, alert_log_path=None: (None, RiskScorer(alert_log_path=None)))
+    monkeypatch.setattr(camera_workers, 'analyze_frame', fake_analyze_frame)
+    pipeline = CameraPipeline({'camera_id': 'cam1', 'source': VIDEO}, detector=None, thumbnail_width=0)
+    try:
+        assert pipeline.start()
+        deadline = time.time() + 10
+        metrics = None
+        while metrics is None and time.time() < deadline:
+            metrics = pipeline.poll()
+            time.sleep(0.01)
+    finally:
+        pipeline.stop()
+    
+    # Rules and baselines see the ring's capture time, as in offline analysis
+    assert calls == [metrics['timestamp']]
+
+
+def test_multi_camera_processor_process_mode_returns_thumbnails():
+    multi = MultiCameraProcessor(mode='processes', num_workers=1)
+    multi.add_camera('cam1', VIDEO, 'Entrance')
+    try:
+        multi.start_all()
+        deadline = time.time() + 60
+        while time.time() < deadline and not multi.get_all_frames():
+            time.sleep(0.2)
+        assert multi.get_camera('cam1') is None
+        assert multi.get_all_stats()['cam1']['camera_id'] == 'cam1'
+        grid = multi.create_grid_view()
+        assert grid is not None and grid.shape[:2] == (480, 640)  # one 640x480 tile
+    finally:
+        multi.stop_all()
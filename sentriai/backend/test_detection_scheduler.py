@@ -0,0 +1,115 @@
+import threading
+import time
+
+import numpy as np
+from utils.detection_scheduler import DetectionScheduler
+from utils.video_processing import VideoProcessor
+
+
+def make_cameras(scheduler, count):
+    processors = {}
+    for i in range(count):
+        processor = VideoProcessor(source=None, name=f"cam{i}")
+        processor.frame_ring.write(np.zeros((24, 32, 3), dtype=np.uint8))
+        scheduler.add_camera(f"cam{i}", processor)
+        processors[f"cam{i}"] = processor
+    return processors
+
+
+def test_allocation_guarantees_minimums_and_favors_risk():
+    scheduler = DetectionScheduler(lambda *args: {}, pool_size=1, min_rate=0.5, base_rate=2.0, max_rate=15.0)
+    make_cameras(scheduler, 4)
+    scheduler.update_risk('cam0', 'CRITICAL')
+    scheduler.update_risk('cam1', 'HIGH')
+    
+    rates = scheduler.allocate_rates(capacity=6.0)
+    assert abs(sum(rates.values()) - 6.0) < 1e-6
+    assert all(rate >= 0.5 for rate in rates.values())
+    assert rates['cam0'] > rates['cam1'] > rates['cam2'] == rates['cam3']
+    
+    # Plenty of capacity: everyone gets its wanted rate, capped at max_rate
+    rates = scheduler.allocate_rates(capacity=100.0)
+    assert rates == {'cam0': 15.0, 'cam1': 8.0, 'cam2': 2.0, 'cam3': 2.0}
+    
+    # Overload: minimums are scaled down evenly
+    rates = scheduler.allocate_rates(capacity=1.0)
+    assert all(abs(rate - 0.25) < 1e-9 for rate in rates.values())
+
+
+def test_rising_motion_boosts_a_camera():
+    scheduler = DetectionScheduler(lambda *args: {}, pool_size=1, motion_interval=0)
+    processors = make_cameras(scheduler, 2)
+    scheduler.tick(now=1.0)
+    processors['cam1'].frame_ring.write(np.full((24, 32, 3), 120, dtype=np.uint8))
+    scheduler.tick(now=2.0)
+    stats = scheduler.get_stats()['cameras']
+    assert stats['cam1']['motion_rising'] and not stats['cam0']['motion_rising']
+    assert stats['cam1']['target_rate'] > stats['cam0']['target_rate']
+
+
+def test_torn_motion_probe_is_discarded():
+    scheduler = DetectionScheduler(lambda *args: {}, pool_size=1, motion_interval=0)
+    processors = make_cameras(scheduler, 1)
+    camera = scheduler.cameras['cam0']
+    ring = processors['cam0'].frame_ring
+    
+    # The capture thread overwrote the slot while the probe was resizing it
+    ring.is_valid = lambda seq: False
+    scheduler._probe_motion(camera, now=1.0)
+    assert camera['motion_probe'] is None
+    
+    del ring.is_valid
+    scheduler._probe_motion(camera, now=2.0)
+    assert camera['motion_probe'] is not None and camera['last_probe'] == 2.0
+
+
+def test_parallel_latency_does_not_throttle_the_decode_rate():
+    scheduler = DetectionScheduler(lambda *args: {}, pool_size=8, max_rate=15.0)
+    processor = make_cameras(scheduler, 1)['cam0']
+    processor.fps = 60
+    scheduler.update_risk('cam0', 'CRITICAL')
+    scheduler.latency = 0.3
+    scheduler.tick(now=1.0)
+    for _ in range(20):
+        processor.report_detection_latency(0.3)
+    
+    # 300 ms per analysis on 8 workers still fits 15 analyses per second at 60 fps
+    assert scheduler.get_stats()['cameras']['cam0']['target_rate'] == 15.0
+    assert processor.skip_frames == 4
+    
+    scheduler.remove_camera('cam0')
+    processor.report_detection_latency(0.3)
+    assert processor.skip_frames == 23
+
+
+def test_scheduler_runs_risky_cameras_more_often():
+    counts = {}
+    lock = threading.Lock()
+    
+    def analyze(camera_id, frame, captured_at):
+        time.sleep(0.02)
+        with lock:
+            counts[camera_id] = counts.get(camera_id, 0) + 1
+        return {'risk_level': 'CRITICAL' if camera_id == 'cam0' else 'LOW'}
+    
+    scheduler = DetectionScheduler(analyze, pool_size=1, min_rate=1.0, base_rate=3.0, max_rate=50.0,
+                                   tick_interval=0.005)
+    processors = make_cameras(scheduler, 3)
+    running = True
+    
+    def produce():
+        while running:
+            for processor in processors.values():
+                processor.frame_ring.write(np.zeros((24, 32, 3), dtype=np.uint8))
+            time.sleep(0.01)
+    
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    scheduler.start()
+    time.sleep(1.5)
+    scheduler.stop()
+    running = False
+    
+    assert counts['cam0'] > 2 * max(counts['cam1'], counts['cam2'])
+    assert min(counts['cam1'], counts['cam2']) >= 1
+    assert scheduler.get_stats()['in_flight'] == 0
@@ -0,0 +1,55 @@
+import pytest
+from utils.ffmpeg_capture import FFmpegCapture, ffmpeg_available
+from utils.frame_ring import FrameRing
+from utils.video_processing import VideoProcessor
+
+VIDEO = "crowd_detection_20251026_191404.mp4"
+
+needs_ffmpeg = pytest.mark.skipif(not ffmpeg_available(), reason="ffmpeg not installed")
+
+
+def test_command_scales_and_configures_the_decoder():
+    capture = FFmpegCapture("rtsp://camera/stream", width=320, height=240, pixel_format='gray', threads=1,
+                            keyframes_only=True, fps=5, timeout=3, ffmpeg_path="ffmpeg-missing")
+    command = capture.build_command()
+    assert command[command.index('-threads') + 1] == '1'
+    assert command.index('-skip_frame') < command.index('-i')
+    assert command[command.index('-rtsp_transport') + 1] == 'tcp'
+    assert command[command.index('-timeout') + 1] == '3000000'
+    assert command[command.index('-vf') + 1] == 'fps=5,scale=320:240:flags=area'
+    assert command[command.index('-pix_fmt') + 1] == 'gray'
+    assert command[-2:] == ['rawvideo', 'pipe:1']
+    # Missing executable: reported as a closed capture, not an exception
+    assert not capture.isOpened() and capture.read() == (False, None)
+    assert capture.last_error
+
+
+@needs_ffmpeg
+def test_frames_are_read_into_the_ring_slot():
+    capture = FFmpegCapture(VIDEO, width=160, height=120, threads=1)
+    ring = FrameRing(num_slots=4, frame_shape=(120, 160, 3))
+    try:
+        slot = ring.begin_write()
+        ret, frame = capture.read(slot)
+        assert ret and frame is slot and frame.any()
+        ring.commit(frame)
+        assert capture.grab()
+        ret, gray = FFmpegCapture(VIDEO, width=80, height=60, pixel_format='gray').read()
+        assert ret and gray.shape == (60, 80)
+    finally:
+        capture.release()
+
+
+@needs_ffmpeg
+def test_video_processor_ffmpeg_backend():
+    processor = VideoProcessor(VIDEO, name="ffmpeg", backend='ffmpeg', adaptive_skip=False,
+                               ffmpeg_options={'threads': 1})
+    processor.resize_width, processor.resize_height = 320, 240
+    assert processor.connect()
+    processor.start_capture()
+    try:
+        frame = processor.get_frame(timeout=10)
+        assert frame is not None and frame.shape == (240, 320, 3)
+    finally:
+        processor.stop_capture()
+        processor.disconnect()
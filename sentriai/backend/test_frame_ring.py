@@ -0,0 +1,68 @@
+import numpy as np
+from utils.frame_ring import FrameRing
+
+
+def make_frame(value, shape=(48, 64, 3)):
+    return np.full(shape, value % 256, dtype=np.uint8)
+
+
+def test_cursors_read_independently():
+    ring = FrameRing(num_slots=4)
+    latest = ring.cursor('latest')
+    sequential = ring.cursor('sequential')
+    
+    for i in range(1, 4):
+        ring.write(make_frame(i))
+    
+    frame, _, seq = latest.next(timeout=0.1)
+    assert seq == 3 and frame[0, 0, 0] == 3
+    assert latest.next(timeout=0.01) is None
+    
+    seqs = [sequential.next(timeout=0.1)[2] for _ in range(3)]
+    assert seqs == [1, 2, 3]
+
+
+def test_overwritten_frames_are_detected_and_skipped():
+    ring = FrameRing(num_slots=4)
+    sequential = ring.cursor('sequential')
+    ring.write(make_frame(1))
+    view, _ = ring.read(1)
+    
+    for i in range(2, 11):
+        ring.write(make_frame(i))
+    
+    assert not ring.is_valid(1)
+    assert ring.read(1) is None
+    assert view[0, 0, 0] != 1
+    
+    frame, _, seq = sequential.next(timeout=0.1)
+    assert seq == 7 and frame[0, 0, 0] == 7
+    assert sequential.skipped == 6
+
+
+def test_producer_can_decode_into_slot_without_copy():
+    ring = FrameRing(num_slots=3, frame_shape=(48, 64, 3))
+    slot = ring.begin_write()
+    slot[:] = 42
+    seq = ring.commit(slot)
+    frame, _ = ring.read(seq)
+    assert np.shares_memory(frame, slot) and frame[0, 0, 0] == 42
+    
+    # A resolution change reallocates the ring but keeps sequence numbers increasing
+    assert ring.write(make_frame(5, (24, 32, 3))) == seq + 1
+    assert ring.frame_shape == (24, 32, 3)
+
+
+def test_shared_ring_can_be_attached_by_name():
+    ring = FrameRing(num_slots=4, shared=True)
+    ring.write(make_frame(9))
+    reader = FrameRing.attach(ring.name)
+    try:
+        frame, _, seq = reader.latest(copy=True)
+        assert seq == 1 and frame[0, 0, 0] == 9
+        ring.write(make_frame(10))
+        assert reader.cursor('sequential').next(timeout=0.1)[2] == 1
+        assert reader.latest_seq == 2
+    finally:
+        reader.close()
+        ring.close()
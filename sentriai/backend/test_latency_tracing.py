@@ -0,0 +1,110 @@
+import time
+
+import numpy as np
+from flask import Flask
+from routes.alerts import AlertManager, alerts_bp
+from routes.analytics import analytics_bp
+from utils.detection_scheduler import DetectionScheduler
+from utils.frame_ring import FrameRing
+from utils.latency_tracing import LatencyHistogram, LatencyTracer, tracer
+from utils.video_processing import VideoProcessor
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for ms in range(1, 101):
+        histogram.record(ms / 1000)
+    stats = histogram.to_dict()
+    assert stats['count'] == 100 and stats['max_ms'] == 100
+    assert 40 <= stats['p50_ms'] <= 60
+    assert 90 <= stats['p95_ms'] <= 100
+    assert stats['buckets']['le_50ms'] == 30 and stats['buckets']['inf'] == 0
+
+
+def test_trace_spans_from_capture_to_notification():
+    ring = FrameRing(num_slots=4)
+    seq = ring.write(np.zeros((8, 8, 3), dtype=np.uint8), capture_time=100.0)
+    assert ring.capture_time(seq) == 100.0
+    
+    local = LatencyTracer()
+    trace = local.start_trace('cam1', ring.capture_time(seq), seq)
+    for stage, now in (('queue', 100.05), ('detect', 100.25), ('anomaly', 100.3), ('risk', 100.31)):
+        trace.mark(stage, now=now)
+    # Handed to another process and continued there
+    trace = local.resume(trace.to_dict())
+    AlertManager().create_alert({'type': 'OVERCROWDING', 'severity': 'HIGH'}, trace=trace)
+    trace.mark('notify', now=trace.last + 0.5).finish().finish()
+    
+    report = local.get_report('cam1')['cam1']
+    assert list(report['stages']) == ['queue', 'detect', 'anomaly', 'risk', 'alert', 'notify']
+    assert report['stages']['detect']['count'] == 1
+    assert 195 <= report['stages']['detect']['mean_ms'] <= 205
+    assert report['end_to_end']['notify']['count'] == 1
+    assert report['end_to_end']['notify']['max_ms'] >= 810
+
+
+def test_scheduler_traces_and_latency_api():
+    tracer.reset()
+    processor = VideoProcessor(source=None, name="traced")
+    
+    def analyze(camera_id, frame, captured_at):
+        time.sleep(0.01)
+        tracer.current().mark('detect')
+        return {'risk_level': 'LOW'}
+    
+    scheduler = DetectionScheduler(analyze, pool_size=1, tick_interval=0.005)
+    scheduler.add_camera('CAM-9', processor)
+    processor.frame_ring.write(np.zeros((24, 32, 3), dtype=np.uint8))
+    scheduler.start()
+    deadline = time.time() + 5
+    while not tracer.get_report('CAM-9') and time.time() < deadline:
+        time.sleep(0.01)
+    scheduler.stop()
+    
+    app = Flask(__name__)
+    app.register_blueprint(analytics_bp)
+    client = app.test_client()
+    body = client.get('/api/analytics/latency?camera_id=CAM-9').get_json()
+    stages = body['cameras']['CAM-9']['stages']
+    assert set(stages) == {'queue', 'detect'} and stages['detect']['mean_ms'] >= 10
+    assert body['cameras']['CAM-9']['end_to_end']['detect']['count'] >= 1
+    assert client.get('/api/analytics/latency?camera_id=missing').status_code == 404
+    tracer.reset()
+
+
+def test_scheduler_results_carry_the_trace_to_alerts():
+    tracer.reset()
+    processor = VideoProcessor(source=None, name="alerting")
+    manager = AlertManager()
+    seen = []
+    
+    def on_result(camera_id, result):
+        seen.append(tracer.current() is result['trace'])
+        manager.create_alert({'type': 'OVERCROWDING', 'severity': 'HIGH', 'camera_id': camera_id},
+                             trace=result['trace'])
+        result['trace'].mark('notify')
+    
+    scheduler = DetectionScheduler(lambda *args: {'risk_level': 'HIGH'}, pool_size=1, tick_interval=0.005,
+                                   on_result=on_result)
+    scheduler.add_camera('CAM-7', processor)
+    processor.frame_ring.write(np.zeros((24, 32, 3), dtype=np.uint8))
+    scheduler.start()
+    deadline = time.time() + 5
+    while not tracer.get_report('CAM-7') and time.time() < deadline:
+        time.sleep(0.01)
+    scheduler.stop()
+    
+    report = tracer.get_report('CAM-7')['CAM-7']
+    assert seen and all(seen)
+    assert list(report['stages']) == ['queue', 'analysis', 'alert', 'notify']
+    assert set(report['end_to_end']) == {'notify'}
+    
+    # An alert posted with a serialized trace continues and finishes it
+    app = Flask(__name__)
+    app.register_blueprint(alerts_bp)
+    trace = tracer.start_trace('CAM-8').mark('risk')
+    response = app.test_client().post('/api/alerts/create', json={
+        'type': 'OVERCROWDING', 'severity': 'HIGH', 'camera_id': 'CAM-8', 'trace': trace.to_dict()})
+    assert response.status_code == 201 and 'trace' not in response.get_json()['alert']
+    assert set(tracer.get_report('CAM-8')['CAM-8']['end_to_end']) == {'alert'}
+    tracer.reset()
@@ -0,0 +1,87 @@
+import numpy as np
+from models.anomaly_detection import AnomalyDetector
+from models.motion_anomaly_model import MotionAnomalyModel, build_feature_vector
+
+
+def normal_features(n=500, seed=0):
+    """Calm crowd drifting mostly in one direction"""
+    rng = np.random.default_rng(seed)
+    histogram = rng.dirichlet([20, 5, 1, 1, 1, 1, 1, 5], size=n)
+    speed = rng.normal(1.5, 0.2, (n, 1))
+    motion = rng.normal(0.1, 0.02, (n, 1))
+    density = rng.normal(0.4, 0.05, (n, 1))
+    return np.hstack([histogram, speed, motion, density])
+
+
+def test_outliers_score_higher_than_normal_samples():
+    model = MotionAnomalyModel.train(normal_features(), n_estimators=50)
+    normal = model.score_batch(normal_features(50, seed=1))
+    panic = model.score_batch(np.hstack([
+        np.full((5, 8), 1 / 8), np.full((5, 1), 8.0), np.full((5, 1), 0.7), np.full((5, 1), 0.9)
+    ]))
+    
+    assert panic.min() > normal.max()
+    assert panic.min() > model.threshold
+
+
+def test_micro_batch_scores_all_cameras_in_one_call(tmp_path):
+    trained = MotionAnomalyModel.train(normal_features(), n_estimators=50)
+    path = trained.save(str(tmp_path / "motion.joblib"))
+    model = MotionAnomalyModel.load(path, max_batch=10)
+    model.is_running = True  # batching thread owns flushing; flush manually below
+    
+    features = normal_features(3, seed=2)
+    for i, vector in enumerate(features):
+        assert model.submit(f"cam{i}", vector, wait=0) is None
+    assert model.flush() == 3
+    assert model.stats == {'batches': 1, 'samples': 3}
+    np.testing.assert_allclose(
+        [model.latest_scores[f"cam{i}"]['score'] for i in range(3)],
+        trained.score_batch(features).round(4))
+
+
+def test_submit_returns_the_score_of_its_own_sample():
+    model = MotionAnomalyModel.train(normal_features(), n_estimators=50, batch_interval=0.01)
+    features = normal_features(2, seed=3)
+    expected = model.score_batch(features).round(4)
+    
+    # Offline (no batching thread): scored synchronously
+    first = model.submit("cam0", features[0])
+    assert first['score'] == expected[0] and first['seq'] == 1 and not first['lagged']
+    
+    model.start()
+    try:
+        second = model.submit("cam0", features[1])
+    finally:
+        model.stop()
+    assert second['score'] == expected[1] and second['seq'] == 2 and not second['lagged']
+    
+    # The batch did not run in time: the previous score comes back, marked as lagged
+    model.is_running = True
+    lagged = model.submit("cam0", features[0], wait=0)
+    assert lagged['seq'] == 2 and lagged['lagged']
+
+
+def test_comprehensive_analysis_includes_learned_score():
+    model = MotionAnomalyModel.train(normal_features(), n_estimators=50)
+    detector = AnomalyDetector(zone_id='gate', anomaly_model=model)
+    frame = np.full((240, 320, 3), 128, dtype=np.uint8)
+    
+    detector.comprehensive_analysis(frame, [], 0.4)
+    result = detector.comprehensive_analysis(frame, [], 0.4)
+    
+    assert set(result["learned_anomaly"]) >= {'score', 'anomalous', 'threshold'}
+    assert len(build_feature_vector(None, 0.1, 0.4)) == 11
+
+
+def test_pipelines_get_the_persisted_model(monkeypatch):
+    import models.motion_anomaly_model as motion_anomaly_model
+    from utils.camera_workers import create_analyzers
+    
+    model = MotionAnomalyModel.train(normal_features(), n_estimators=20)
+    monkeypatch.setattr(motion_anomaly_model, 'load_default_model', lambda: model)
+    anomaly_detector, risk_scorer = create_analyzers('gate')
+    assert anomaly_detector.anomaly_model is model and anomaly_detector.zone_id == 'gate'
+    
+    monkeypatch.setattr(motion_anomaly_model, 'load_default_model', lambda: None)
+    assert create_analyzers('gate')[0].anomaly_model is None
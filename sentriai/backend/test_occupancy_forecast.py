@@ -0,0 +1,73 @@
+import numpy as np
+from flask import Flask
+from models.anomaly_detection import AnomalyDetector
+from models.occupancy_forecast import OccupancyForecaster
+from models.risk_scoring import RiskScorer
+from routes.analytics import analytics_bp
+from utils.camera_workers import DETECTION_SIZE, analyze_frame
+
+
+def test_forecast_follows_linear_growth():
+    forecaster = OccupancyForecaster()
+    start = 1_700_000_000.0
+    rng = np.random.default_rng(0)
+    # Density rising 0.01 per minute, one noisy sample every 5 seconds for an hour
+    for i in range(720):
+        t = start + 5 * i
+        forecaster.update('ZONE_A', 0.2 + 0.01 * (t - start) / 60 + rng.normal(0, 0.005), t)
+    
+    result = forecaster.forecast('ZONE_A', (5, 15))
+    assert result['ready']
+    assert abs(result['trend_per_minute'] - 0.01) < 0.003
+    
+    last_ts = start + 5 * 719
+    for point in result['forecast']:
+        expected = 0.2 + 0.01 * (last_ts + point['horizon_minutes'] * 60 - start) / 60
+        assert abs(point['density'] - expected) < 0.05
+        assert point['lower'] <= point['density'] <= point['upper']
+    
+    five, fifteen = result['forecast']
+    assert fifteen['upper'] - fifteen['lower'] > five['upper'] - five['lower']
+
+
+def test_forecast_state_roundtrip_and_warmup():
+    forecaster = OccupancyForecaster(min_samples=10)
+    for i in range(5):
+        forecaster.update('ZONE_B', 0.5, 1000.0 + i)
+    assert forecaster.predicted_density('ZONE_B') is None
+    assert forecaster.forecast('ZONE_X') is None
+    
+    restored = OccupancyForecaster(min_samples=10)
+    restored.load_dict(forecaster.to_dict())
+    for i in range(5, 10):
+        restored.update('ZONE_B', 0.5, 1000.0 + i)
+    assert abs(restored.predicted_density('ZONE_B') - 0.5) < 1e-6
+
+
+def test_live_analysis_scores_the_forecast():
+    class GrowingCrowd:
+        density = 10.0
+        
+        def detect_crowd(self, frame):
+            self.density += 0.5
+            return {'detections': [], 'density': self.density, 'count': 0}
+    
+    forecaster = OccupancyForecaster(min_samples=10)
+    scene = GrowingCrowd()
+    anomaly_detector, risk_scorer = AnomalyDetector(zone_id='gate'), RiskScorer(alert_log_path=None)
+    frame = np.zeros((DETECTION_SIZE[1], DETECTION_SIZE[0], 3), dtype=np.uint8)
+    results = [analyze_frame(frame, scene, anomaly_detector, risk_scorer, timestamp=1000.0 + 10 * i,
+                             forecaster=forecaster) for i in range(40)]
+    
+    assert results[0]['predicted_density'] is None
+    # Still growing: ten minutes out the zone is denser than now
+    assert results[-1]['predicted_density'] > results[-1]['density'] + 0.05
+    assert 'gate' in forecaster.zones
+
+
+def test_forecast_route_rejects_bad_horizons():
+    app = Flask(__name__)
+    app.register_blueprint(analytics_bp)
+    response = app.test_client().get('/api/analytics/forecast?horizons=5,soon')
+    assert response.status_code == 400 and not response.get_json()['success']
+
@@ -0,0 +1,64 @@
+import os
+from datetime import datetime
+
+import numpy as np
+from models.anomaly_detection import AnomalyDetector
+from models.risk_scoring import RiskScorer
+from models.zone_baseline import ZoneBaseline
+from offline_analysis import analyze_video, merge_alerts, parse_start_time, plan_segments
+from utils.camera_workers import DETECTION_SIZE, analyze_frame
+
+VIDEO = os.path.join(os.path.dirname(__file__), 'crowd_detection_20251026_191404.mp4')
+
+
+def test_segments_overlap_by_warmup():
+    segments = plan_segments(35.8, 12.0, warmup_seconds=3.0)
+    assert [(s['start'], s['end'], s['warmup_start']) for s in segments] == [
+        (0.0, 12.0, 0.0), (12.0, 24.0, 9.0), (24.0, 35.8, 21.0)]
+
+
+def test_alert_samples_merge_into_incidents():
+    def record(timestamp, level, score, alert=True):
+        return {'timestamp': timestamp, 'risk_level': level, 'risk_score': score, 'alert_required': alert,
+                'person_count': 10, 'anomalies': [{'type': 'PANIC_MOVEMENT', 'severity': 0.9}],
+                'recommendations': [level]}
+    
+    alerts = merge_alerts([record(1, 'HIGH', 0.7), record(2, 'CRITICAL', 0.9), record(3, 'HIGH', 0.95),
+                           record(4, 'LOW', 0.1, alert=False), record(20, 'HIGH', 0.75)], max_gap=5)
+    assert len(alerts) == 2
+    assert alerts[0]['start'] == 1 and alerts[0]['end'] == 3 and alerts[0]['samples'] == 3
+    assert alerts[0]['peak_level'] == 'CRITICAL' and alerts[0]['peak_timestamp'] == 2
+    assert alerts[0]['anomaly_types'] == ['PANIC_MOVEMENT']
+
+
+def test_parallel_segments_cover_the_video_once():
+    result = analyze_video(VIDEO, workers=2, segment_seconds=12.0, warmup_seconds=2.0, stride_seconds=2.0,
+                           footage_start=parse_start_time('2025-10-26T19:14:04'))
+    timestamps = [record['timestamp'] for record in result['series']]
+    
+    assert timestamps == sorted(timestamps) and len(set(timestamps)) == len(timestamps)
+    assert timestamps[0] == 0.0 and timestamps[-1] >= 34.0
+    # Warmup frames are analyzed but not reported
+    assert result['summary']['warmup_frames'] >= 2
+    assert result['summary']['segments'] == 3 and result['summary']['samples'] == len(timestamps)
+    assert sum(result['summary']['level_distribution'].values()) == len(timestamps)
+    assert result['summary']['footage_start'] == '2025-10-26T19:14:04'
+
+
+def test_models_follow_the_footage_clock():
+    class EmptyScene:
+        def detect_crowd(self, frame):
+            return {'detections': [], 'density': 40, 'count': 0}
+    
+    night = datetime(2025, 1, 1, 23, 30).timestamp()
+    baseline = ZoneBaseline()
+    anomaly_detector = AnomalyDetector(zone_id='footage', baseline=baseline)
+    risk_scorer = RiskScorer()
+    frame = np.zeros((DETECTION_SIZE[1], DETECTION_SIZE[0], 3), dtype=np.uint8)
+    for index in range(12):
+        analyze_frame(frame, EmptyScene(), anomaly_detector, risk_scorer, timestamp=night + index)
+    
+    assert baseline.stats and {bucket for _, bucket, _ in baseline.stats} == {23}
+    report = risk_scorer.calculate_overall_risk({'density': 0.4}, {}, timestamp=night)
+    assert report['timestamp'].startswith('2025-01-01T23:30')
+    assert 'Night time event' in report['components']['environmental']['factors']
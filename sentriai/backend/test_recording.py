@@ -0,0 +1,170 @@
+import time
+
+import cv2
+import numpy as np
+from utils.frame_ring import FrameRing
+from utils.recording import AsyncVideoWriter, PreEventBuffer
+
+
+def frame(value):
+    return np.full((48, 64, 3), value, dtype=np.uint8)
+
+
+def test_incident_clip_contains_pre_and_post_roll(tmp_path):
+    clips = []
+    buffer = PreEventBuffer(pre_seconds=2.0, post_seconds=1.0, fps=10, output_dir=str(tmp_path),
+                            on_clip=clips.append)
+    # 5 seconds of frames at 30 fps; only 10 fps are kept, only the last 2 s in memory
+    for i in range(150):
+        buffer.add(frame(i % 200), timestamp=1000.0 + i / 30)
+    assert buffer.get_stats()['buffered_frames'] <= 21
+    
+    path = buffer.trigger("PANIC_MOVEMENT", timestamp=1005.0)
+    assert buffer.trigger("FIGHTING", timestamp=1005.5) == path
+    
+    for i in range(150, 250):
+        buffer.add(frame(i % 200), timestamp=1000.0 + i / 30)
+    # Post-roll complete: the clip is written in the background
+    deadline = time.time() + 5
+    while not clips and time.time() < deadline:
+        time.sleep(0.02)
+    
+    info = clips[0]
+    assert info['status'] == 'written' and info['reasons'] == ["PANIC_MOVEMENT", "FIGHTING"]
+    assert info['start'] <= 1003.1 and info['end'] >= 1006.4
+    
+    cap = cv2.VideoCapture(path)
+    assert int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) == info['frames']
+    cap.release()
+
+
+def test_buffer_respects_byte_budget():
+    buffer = PreEventBuffer(pre_seconds=60.0, fps=0, max_bytes=20000)
+    rng = np.random.default_rng(0)
+    for i in range(50):
+        buffer.add(rng.integers(0, 255, (48, 64, 3), dtype=np.uint8), timestamp=float(i))
+    stats = buffer.get_stats()
+    assert stats['buffered_bytes'] <= 20000
+    assert stats['frames_evicted'] > 0
+
+
+class SlowWriter:
+    def __init__(self, delay):
+        self.delay = delay
+        self.frames = []
+    
+    def write(self, image):
+        time.sleep(self.delay)
+        self.frames.append(int(image[0, 0, 0]))
+    
+    def release(self):
+        pass
+
+
+def test_async_writer_never_blocks_capture(tmp_path):
+    writer = AsyncVideoWriter(str(tmp_path / "slow.mp4"), cv2.VideoWriter_fourcc(*'mp4v'), 10, (64, 48),
+                              queue_size=5, policy='drop_oldest')
+    slow = writer.writer = SlowWriter(0.05)
+    start = time.time()
+    for i in range(50):
+        writer.write(frame(i))
+    # 50 frames at 50 ms each would take 2.5 s if written synchronously
+    assert time.time() - start < 0.5
+    writer.release()
+    
+    stats = writer.get_stats()
+    assert stats['frames_dropped'] > 0
+    assert stats['frames_written'] + stats['frames_dropped'] == 50
+    assert slow.frames[-1] == 49  # drop_oldest keeps the newest frames
+    assert stats['encode_ms_avg'] >= 40
+
+
+def test_async_writer_drop_newest_and_bytes_written(tmp_path):
+    path = tmp_path / "clip.mp4"
+    writer = AsyncVideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), 10, (64, 48),
+                              queue_size=100, policy='drop_newest')
+    for i in range(20):
+        assert writer.write(frame(i * 10))
+    writer.release()
+    stats = writer.get_stats()
+    assert stats['frames_written'] == 20 and stats['frames_dropped'] == 0
+    assert stats['bytes_written'] == path.stat().st_size > 0
+    assert cv2.VideoCapture(str(path)).get(cv2.CAP_PROP_FRAME_COUNT) == 20
+
+
+def test_async_writer_reads_its_own_ring_cursor(tmp_path):
+    ring = FrameRing(num_slots=8)
+    writer = AsyncVideoWriter(str(tmp_path / "ring.mp4"), cv2.VideoWriter_fourcc(*'mp4v'), 10, (64, 48),
+                              queue_size=100)
+    writer.writer = SlowWriter(0)
+    writer.start(ring.cursor('sequential'))
+    for i in range(20):
+        ring.write(frame(i))
+        time.sleep(0.005)
+    deadline = time.time() + 2
+    while writer.get_stats()['frames_written'] < 20 and time.time() < deadline:
+        time.sleep(0.01)
+    writer.release()
+    assert writer.writer.frames == list(range(20))
+
+
+def test_blocking_writer_does_not_stall_the_producer(tmp_path):
+    ring = FrameRing(num_slots=4)
+    writer = AsyncVideoWriter(str(tmp_path / "block.mp4"), cv2.VideoWriter_fourcc(*'mp4v'), 10, (64, 48),
+                              queue_size=2, policy='block', block_timeout=1.0)
+    slow = writer.writer = SlowWriter(0.05)
+    writer.start(ring.cursor('sequential'))
+    start = time.time()
+    for i in range(50):
+        ring.write(frame(i))
+        time.sleep(0.002)
+    # Backpressure holds the feed thread only; the producer keeps its pace and the ring overruns
+    assert time.time() - start < 0.5
+    writer.release()
+    stats = writer.get_stats()
+    assert stats['frames_skipped'] > 0
+    assert slow.frames == sorted(slow.frames)
+
+
+class FailingWriter(SlowWriter):
+    def write(self, image):
+        if int(image[0, 0, 0]) % 2:
+            raise RuntimeError("encoder error")
+        super().write(image)
+
+
+def test_async_writer_counts_encode_errors_as_drops(tmp_path):
+    writer = AsyncVideoWriter(str(tmp_path / "bad.mp4"), cv2.VideoWriter_fourcc(*'mp4v'), 10, (64, 48),
+                              queue_size=100)
+    writer.writer = FailingWriter(0)
+    for i in range(10):
+        writer.write(frame(i))
+    writer.release()
+    stats = writer.get_stats()
+    assert stats['frames_written'] == 5 and stats['frames_dropped'] == 5
+
+
+def test_long_incident_is_split_into_bounded_clips(tmp_path):
+    clips = []
+    buffer = PreEventBuffer(pre_seconds=1.0, post_seconds=1.0, fps=10, output_dir=str(tmp_path),
+                            on_clip=clips.append, max_clip_seconds=3.0)
+    # A 10 s incident re-triggered by every analysis, buffered at 5 fps (slower than configured)
+    for i in range(60):
+        timestamp = 1000.0 + i / 5
+        buffer.add(frame(i), timestamp=timestamp)
+        if 5 <= i < 55:
+            buffer.trigger("CRITICAL", timestamp=timestamp)
+        assert buffer.incident is None or len(buffer.incident['frames']) <= 16
+    buffer.flush()
+    deadline = time.time() + 5
+    while len(clips) < 4 and time.time() < deadline:
+        time.sleep(0.02)
+    
+    clips.sort(key=lambda info: info['part'])
+    assert [info['part'] for info in clips] == [1, 2, 3, 4]
+    assert len({info['path'] for info in clips}) == 4
+    assert all(info['end'] - info['start'] <= 3.0 for info in clips)
+    # Clips play at the rate the frames were buffered at, not the configured fps
+    cap = cv2.VideoCapture(clips[0]['path'])
+    assert round(cap.get(cv2.CAP_PROP_FPS)) == 5
+    cap.release()
@@ -0,0 +1,183 @@
+import numpy as np
+import pytest
+from datetime import datetime
+from models.risk_scoring import RiskScorer, ANOMALY_TYPES, FLOW_PATTERN_CODES, history_to_arrays, recalibrate_history
+
+
+def random_zones(n, seed=0):
+    rng = np.random.default_rng(seed)
+    density = rng.uniform(0, 1, n)
+    severities = rng.uniform(0, 1, (n, len(ANOMALY_TYPES))) * (rng.uniform(0, 1, (n, len(ANOMALY_TYPES))) > 0.7)
+    patterns = rng.choice(list(FLOW_PATTERN_CODES), n)
+    return density, severities, patterns
+
+
+def single_zone_report(density, severities, pattern):
+    """Score one zone through calculate_overall_risk with a fresh scorer"""
+    anomalies = [{'type': t, 'severity': s} for t, s in zip(ANOMALY_TYPES, severities) if s > 0]
+    if pattern == 'NO_DATA':
+        flow = None
+    else:
+        flow = {'flow_anomaly': pattern != 'NORMAL', 'pattern': pattern}
+    return RiskScorer().calculate_overall_risk({'density': density}, {'anomalies': anomalies}, flow)
+
+
+def test_score_batch_matches_single_zone_scoring():
+    density, severities, patterns = random_zones(200)
+    scorer = RiskScorer()
+    environmental = scorer.calculate_environmental_risk()['score']
+    codes = np.array([FLOW_PATTERN_CODES[p] for p in patterns])
+    
+    batch = scorer.score_batch(density, severities, codes, environmental=environmental,
+                               return_reports=True)
+    
+    for i in range(200):
+        expected = single_zone_report(density[i], severities[i], patterns[i])
+        assert batch['overall_score'][i] == pytest.approx(expected['overall_score'], abs=1e-3)
+        assert batch['risk_level'][i] == expected['risk_level']
+        assert batch['reports'][i]['color_code'] == expected['color_code']
+        assert batch['reports'][i]['alert_required'] == expected['alert_required']
+
+
+def test_score_batch_accepts_severity_columns_by_type():
+    scorer = RiskScorer()
+    result = scorer.score_batch(
+        [0.9, 0.2],
+        {'PANIC_MOVEMENT': [1.0, 0.0], 'FIGHTING': [0.5, 0.0]},
+        [FLOW_PATTERN_CODES['CHAOTIC'], FLOW_PATTERN_CODES['NORMAL']])
+    
+    assert list(result['anomaly_score']) == [1.0, 0.0]
+    assert list(result['flow_score']) == [0.75, 0.1]
+    assert 'reports' not in result
+    assert len(scorer.risk_history) == 0
+
+
+def test_alert_history_is_bounded_and_spills_to_disk(tmp_path):
+    log_path = tmp_path / "alerts.jsonl"
+    scorer = RiskScorer(alert_history_size=5, alert_log_path=str(log_path))
+    scorer.spill_batch_size = 3
+    critical = {'anomalies': [{'type': 'PANIC_MOVEMENT', 'severity': 1.0},
+                              {'type': 'CROWD_PRESSURE', 'severity': 1.0}]}
+    
+    for _ in range(12):
+        scorer.calculate_overall_risk({'density': 0.95}, critical,
+                                      {'flow_anomaly': True, 'pattern': 'CHAOTIC'})
+    
+    assert len(scorer.alert_history) == 5
+    assert len(scorer.get_alert_history(limit=2)) == 2
+    assert len(log_path.read_text().splitlines()) == 6
+    
+    analytics = scorer.export_analytics()
+    assert analytics['alerts']['total_alerts'] == 12
+    assert analytics['alerts']['spilled_alerts'] == 7
+    assert analytics['alerts']['critical_alerts'] + analytics['alerts']['high_alerts'] == 12
+    
+    scorer.reset()
+    assert len(log_path.read_text().splitlines()) == 7
+    assert scorer.export_analytics() == {"error": "No data available"}
+
+
+def test_buffered_spills_are_flushed_on_close_and_exit(tmp_path):
+    import models.risk_scoring as risk_scoring
+    critical = {'anomalies': [{'type': 'PANIC_MOVEMENT', 'severity': 1.0},
+                              {'type': 'CROWD_PRESSURE', 'severity': 1.0}]}
+    chaotic = {'flow_anomaly': True, 'pattern': 'CHAOTIC'}
+    
+    def spill(log_path, alerts=5):
+        scorer = RiskScorer(alert_history_size=2, alert_log_path=str(log_path))
+        for _ in range(alerts):
+            scorer.calculate_overall_risk({'density': 0.95}, critical, chaotic)
+        return scorer
+    
+    closed = spill(tmp_path / "closed.jsonl")
+    assert not (tmp_path / "closed.jsonl").exists()  # Batch of 100 not reached yet
+    assert closed.close() == 3
+    assert closed not in risk_scoring._open_scorers
+    
+    at_exit = spill(tmp_path / "exit.jsonl")
+    risk_scoring._flush_open_scorers()
+    assert len((tmp_path / "exit.jsonl").read_text().splitlines()) == 3
+    at_exit.close()
+    
+    # Spilled alerts are written at least every spill_interval, even when alerts are rare
+    timed = RiskScorer(alert_history_size=2, alert_log_path=str(tmp_path / "timed.jsonl"))
+    timed.spill_interval = 0.0
+    for _ in range(3):
+        timed.calculate_overall_risk({'density': 0.95}, critical, chaotic)
+    assert len((tmp_path / "timed.jsonl").read_text().splitlines()) == 1
+    timed.close()
+
+
+def test_recommendations_are_memoized_by_signature():
+    scorer = RiskScorer()
+    density = {'density_ratio': 0.9}
+    anomalies = {'anomaly_count': 2, 'anomalies': [{'type': 'PANIC_MOVEMENT'}, {'type': 'PANIC_MOVEMENT'}]}
+    flow = {'pattern': 'CHAOTIC'}
+    
+    first = scorer.generate_recommendations('CRITICAL', density, anomalies, flow)
+    second = scorer.generate_recommendations('CRITICAL', {'density_ratio': 0.8}, anomalies, flow)
+    
+    assert first is second
+    assert isinstance(first, tuple)
+    assert first.count("⚡ Panic detected - calm crowd via PA system") == 1
+    
+    normal = scorer.generate_recommendations('LOW', {'density_ratio': 0.1},
+                                             {'anomaly_count': 0, 'anomalies': []}, {})
+    assert normal == ("✅ Situation normal - continue monitoring",)
+    
+    stats = scorer.get_recommendation_cache_stats()
+    assert stats['hits'] == 1 and stats['misses'] == 2 and stats['size'] == 2
+
+
+def test_rescore_history_matches_live_scoring():
+    scorer = RiskScorer(alert_log_path=None)
+    records = []
+    for i in range(40):
+        density = 0.2 + 0.02 * i
+        anomalies = [{'type': 'PANIC_MOVEMENT', 'severity': 1.0}] if i % 3 == 0 else []
+        pattern = 'CHAOTIC' if i > 20 else None
+        flow = {'flow_anomaly': True, 'pattern': pattern} if pattern else None
+        report = scorer.calculate_overall_risk({'density': density}, {'anomalies': anomalies}, flow)
+        records.append({'timestamp': datetime.now().isoformat(), 'zone': 'ZONE_A', 'density': density,
+                        'anomalies': anomalies, 'flow_pattern': pattern, 'risk_level': report['risk_level'],
+                        'risk_score': report['overall_score']})
+    
+    arrays = history_to_arrays(records)
+    rescored = scorer.rescore_history(arrays)
+    assert list(rescored['risk_level']) == [r['risk_level'] for r in records]
+    
+    same = recalibrate_history(records)
+    assert same['changed_levels'] == 0
+    assert same['alerts'] == same['stored_alerts']
+    
+    stricter = recalibrate_history(arrays, thresholds={'HIGH': 0.9, 'CRITICAL': 0.95})
+    assert stricter['alerts'] < same['alerts']
+    assert stricter['samples'] == 40
+    
+    with pytest.raises(ValueError):
+        recalibrate_history(records, weights={'crowd': 0.5})
+
+
+def test_forecast_escalation_matches_batch_scoring():
+    scorer = RiskScorer(alert_log_path=None)
+    growing = scorer.calculate_overall_risk({'density': 0.3, 'predicted_density': 0.85}, {})
+    steady = scorer.calculate_overall_risk({'density': 0.3}, {})
+    
+    assert growing['components']['forecast']['score'] == pytest.approx(0.95 - 0.25)
+    assert growing['overall_score'] > steady['overall_score']
+    
+    batch = scorer.score_batch([0.3, 0.3, 0.9], predicted_density=[0.85, np.nan, 0.2])
+    assert batch['forecast_score'] == pytest.approx([0.7, 0.0, 0.0])
+
+
+def test_forecast_term_is_additive_and_capped():
+    scorer = RiskScorer(alert_log_path=None)
+    assert sum(w for name, w in scorer.weights.items() if name != 'forecast') == pytest.approx(1.0)
+    
+    scorer.weights['forecast'] = 2.0
+    critical = {'anomalies': [{'type': anomaly_type, 'severity': 1.0} for anomaly_type in ANOMALY_TYPES]}
+    report = scorer.calculate_overall_risk({'density': 0.1, 'predicted_density': 0.95}, critical)
+    assert report['overall_score'] == 1.0
+    batch = scorer.score_batch([0.1, 0.1], anomaly_severities=np.ones((2, len(ANOMALY_TYPES))),
+                               predicted_density=[0.95, np.nan])
+    assert batch['overall_score'][0] == 1.0 and batch['overall_score'][1] < 1.0
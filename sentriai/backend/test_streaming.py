@@ -0,0 +1,128 @@
+import threading
+import time
+
+import numpy as np
+from flask import Flask
+from routes.streams import streams_bp, register_camera, unregister_camera
+from utils.frame_ring import FrameRing
+from utils.streaming import GridCompositor, MJPEGBroadcaster
+
+
+def test_frames_are_encoded_once_for_all_viewers():
+    ring = FrameRing(num_slots=4)
+    running = True
+    
+    def produce():
+        value = 0
+        while running:
+            ring.write(np.full((48, 64, 3), value % 256, dtype=np.uint8))
+            value += 1
+            time.sleep(0.005)
+    
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    broadcaster = MJPEGBroadcaster(ring.cursor('latest'), quality=70, width=32, max_fps=20)
+    
+    received = [[] for _ in range(3)]
+    
+    def watch(index):
+        for chunk in broadcaster.stream():
+            received[index].append(chunk)
+            if len(received[index]) == 8:
+                break
+    
+    viewers = [threading.Thread(target=watch, args=(i,)) for i in range(3)]
+    for viewer in viewers:
+        viewer.start()
+    for viewer in viewers:
+        viewer.join(timeout=10)
+    running = False
+    broadcaster.stop()
+    
+    stats = broadcaster.get_stats()
+    assert all(len(chunks) == 8 for chunks in received)
+    assert stats['frames_sent'] == 24
+    # Three viewers, but each frame was encoded once
+    assert stats['frames_encoded'] < stats['frames_sent']
+    assert received[0][0].startswith(b"--frame\r\nContent-Type: image/jpeg\r\n")
+
+
+def test_viewer_rate_cap():
+    frames = iter(range(10 ** 6))
+    broadcaster = MJPEGBroadcaster(lambda: np.full((16, 16, 3), next(frames) % 256, dtype=np.uint8),
+                                   max_fps=50)
+    start = time.time()
+    stream = broadcaster.stream(max_fps=10)
+    for _ in range(6):
+        next(stream)
+    stream.close()
+    # 6 frames at 10 fps: at least 5 intervals of 100 ms
+    assert time.time() - start >= 0.45
+    assert broadcaster.get_stats()['viewers'] == 0
+    broadcaster.stop()
+
+
+def test_snapshot_after_idle_waits_for_a_fresh_frame():
+    ring = FrameRing(num_slots=4)
+    broadcaster = MJPEGBroadcaster(ring.cursor('latest'), max_fps=20, idle_timeout=0.1)
+    ring.write(np.full((48, 64, 3), 10, dtype=np.uint8))
+    first = broadcaster.snapshot()
+    assert first is not None
+    
+    deadline = time.time() + 5
+    while broadcaster.is_running and time.time() < deadline:
+        time.sleep(0.02)
+    assert not broadcaster.is_running
+    ring.write(np.full((48, 64, 3), 200, dtype=np.uint8))
+    
+    fresh = broadcaster.snapshot()
+    assert fresh != first and broadcaster.frame_id == 2
+    broadcaster.stop()
+
+
+def test_stream_routes():
+    app = Flask(__name__)
+    app.register_blueprint(streams_bp)
+    broadcaster = MJPEGBroadcaster(lambda: np.zeros((16, 16, 3), dtype=np.uint8), max_fps=20)
+    register_camera('cam1', broadcaster)
+    client = app.test_client()
+    
+    snapshot = client.get('/api/streams/cam1/snapshot')
+    assert snapshot.status_code == 200 and snapshot.data[:2] == b'\xff\xd8'
+    assert client.get('/api/streams/missing/mjpeg').status_code == 404
+    
+    response = client.get('/api/streams/cam1/mjpeg', buffered=False)
+    assert response.mimetype == 'multipart/x-mixed-replace'
+    assert next(response.response).startswith(b'--frame')
+    response.close()
+    assert client.get('/api/streams/stats').get_json()['streams']['cam1']['frames_encoded'] >= 1
+    unregister_camera('cam1')
+
+
+def test_grid_compositor_draws_into_preallocated_canvas():
+    ring_a, ring_b = FrameRing(num_slots=4), FrameRing(num_slots=4)
+    names = {'a': 'Entrance', 'b': 'Exit'}
+    compositor = GridCompositor({'a': ring_a.cursor('latest'), 'b': ring_b.cursor('latest')},
+                                labels=names.get, tile_size=(160, 120), max_cols=2, max_fps=0)
+    ring_a.write(np.full((240, 320, 3), 200, dtype=np.uint8))
+    ring_b.write(np.full((480, 640, 3), 50, dtype=np.uint8))
+    
+    canvas = compositor.render()
+    assert canvas.shape == (120, 320, 3)
+    assert (canvas[60, 80] == 200).all() and (canvas[60, 240] == 50).all()
+    assert compositor.poll() is canvas
+    
+    # Nothing new: same buffer, no tiles or labels redrawn, nothing to encode
+    assert compositor.poll() is None
+    ring_a.write(np.full((240, 320, 3), 90, dtype=np.uint8))
+    assert compositor.render() is canvas and (canvas[60, 80] == 90).all()
+    names['b'] = 'Exit (closed)'
+    compositor.render()
+    stats = compositor.get_stats()
+    assert stats['tiles_drawn'] == 3 and stats['labels_drawn'] == 3
+    
+    compositor.max_fps = 1
+    compositor.render()
+    ring_b.write(np.full((480, 640, 3), 10, dtype=np.uint8))
+    compositor.render()  # Rate-capped: the new frame waits for the next render slot
+    assert (canvas[60, 240] == 50).all()
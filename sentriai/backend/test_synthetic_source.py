@@ -0,0 +1,71 @@
+import time
+
+import numpy as np
+import pytest
+
+from load_test import run_ramp
+from utils.synthetic_source import SyntheticCapture, parse_synthetic_url
+from utils.video_processing import VideoProcessor
+
+
+def test_url_options_and_name_seed():
+    options = parse_synthetic_url("synthetic://lobby?width=320&height=240&fps=10&people=20&realtime=0")
+    assert options['width'] == 320 and options['height'] == 240 and options['fps'] == 10.0
+    assert options['people'] == 20 and options['realtime'] is False
+    assert options['seed'] != parse_synthetic_url("synthetic://gate")['seed']
+    assert parse_synthetic_url("synthetic://lobby?seed=7")['seed'] == 7
+    
+    with pytest.raises(ValueError):
+        parse_synthetic_url("synthetic://lobby?colour=red")
+
+
+def test_scenes_are_deterministic_and_figures_move():
+    first = SyntheticCapture(320, 240, people=12, seed=3, realtime=False)
+    second = SyntheticCapture(320, 240, people=12, seed=3, realtime=False)
+    other = SyntheticCapture(320, 240, people=12, seed=4, realtime=False)
+    empty = SyntheticCapture(320, 240, people=0, seed=3, realtime=False)
+    
+    frame = first.read()[1].copy()
+    assert frame.shape == (240, 320, 3)
+    assert np.array_equal(frame, second.read()[1])
+    assert not np.array_equal(frame, other.read()[1])
+    # Figures are darker than anything in the background
+    assert (frame.max(axis=2) < 100).sum() > 0
+    assert (empty.read()[1].max(axis=2) < 100).sum() == 0
+    
+    for _ in range(10):
+        first.grab()
+    assert not np.array_equal(frame, first.read()[1])
+
+
+def test_reads_into_buffer_paced_and_finite():
+    capture = SyntheticCapture(160, 120, fps=20, frames=5)
+    slot = np.empty((120, 160, 3), dtype=np.uint8)
+    start_time = time.monotonic()
+    ret, frame = capture.read(slot)
+    assert ret and frame is slot
+    for _ in range(4):
+        assert capture.read()[0]
+    assert time.monotonic() - start_time >= 0.18
+    assert capture.read() == (False, None)
+
+
+def test_video_processor_accepts_synthetic_url():
+    processor = VideoProcessor("synthetic://cam-1?width=320&height=240&fps=30&people=5", name="synthetic")
+    assert processor.start_capture()
+    try:
+        cursor = processor.create_cursor('latest')
+        result = cursor.next(timeout=2.0)
+        assert result is not None and result[0].shape == (240, 320, 3)
+        assert processor.fps == 30
+    finally:
+        processor.stop_capture()
+        processor.disconnect()
+
+
+def test_ramp_reports_cameras_per_core():
+    report = run_ramp([1, 2], stop_on_failure=False, mode='capture', fps=10, width=160, height=120,
+                      duration=1.0, warmup=0.5)
+    assert [step['cameras'] for step in report['steps']] == [1, 2]
+    assert report['steps'][-1]['capture_fps_mean'] > 0
+    assert report['cameras_per_core'] == round(report['max_sustained_cameras'] / report['cores'], 2)
@@ -0,0 +1,294 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+from utils.video_processing import (VideoProcessor, AnalysisRateController, MultiCameraProcessor, RateMeter,
+                                    SampleWindow)
+
+
+class FakeCapture:
+    """Counts decodes vs grabs and stops the processor after a fixed number of frames"""
+    
+    def __init__(self, processor, total_frames):
+        self.processor = processor
+        self.total_frames = total_frames
+        self.position = 0
+        self.decoded = 0
+    
+    def _advance(self):
+        self.position += 1
+        if self.position >= self.total_frames:
+            self.processor.is_running = False
+    
+    def grab(self):
+        self._advance()
+        return True
+    
+    def read(self, image=None):
+        self.decoded += 1
+        frame = np.full((24, 32, 3), self.position % 256, dtype=np.uint8)
+        if image is not None and image.shape == frame.shape:
+            image[:] = frame
+            frame = image
+        self._advance()
+        return True, frame
+    
+    def isOpened(self):
+        return True
+
+
+def test_skipped_frames_are_grabbed_not_decoded():
+    processor = VideoProcessor(source=None, name="fake", adaptive_skip=False)
+    processor.skip_frames = 3
+    processor.cap = FakeCapture(processor, 30)
+    processor.is_running = True
+    processor._capture_loop()
+    
+    assert processor.cap.decoded == 10
+    assert processor.frames_grabbed == 20
+    assert processor.frame_ring.latest_seq == 10
+    assert processor.get_latest_frame()[0, 0, 0] == 29
+
+
+def test_rate_controller_tracks_detection_latency():
+    controller = AnalysisRateController(min_skip=3, max_skip=30)
+    assert controller.update(30) == 3
+    
+    for _ in range(20):
+        controller.record_latency(0.2)
+    # 200 ms detection at 30 fps and 80% utilization needs every 8th frame
+    assert controller.update(30) == 8
+    
+    for _ in range(40):
+        controller.record_latency(0.01)
+    assert controller.update(30) == 3
+    assert controller.get_stats(30)['target_analysis_fps'] == 10.0
+    
+    processor = VideoProcessor(source=None, name="fake")
+    processor.fps = 25
+    processor.report_detection_latency(2.0)
+    assert processor.skip_frames == 30
+
+
+def test_meters_take_samples_from_many_threads():
+    window = SampleWindow(size=64)
+    meter = RateMeter(window=60.0)
+    
+    def consume():
+        for i in range(2000):
+            window.add(i / 1000)
+            meter.tick()
+    
+    threads = [threading.Thread(target=consume) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert window.count == 8000 and meter.count == 8000
+    assert window.percentiles()['p50'] is not None
+
+
+def test_zero_copy_snapshots_retry_when_the_ring_wraps(tmp_path):
+    processor = VideoProcessor(source=None, name="wrap", ring_slots=2)
+    processor.frame_ring.write(np.full((24, 32, 3), 10, dtype=np.uint8))
+    calls = []
+    
+    def use(frame):
+        if not calls:
+            # The capture thread laps the ring while the first view is being encoded
+            for _ in range(2):
+                processor.frame_ring.write(np.full((24, 32, 3), 200, dtype=np.uint8))
+        calls.append(int(frame.mean()))
+        return int(frame.mean())
+    
+    assert processor._use_latest_frame(use) == 200 and len(calls) == 2
+    
+    snapshot = processor.capture_snapshot(str(tmp_path / "snapshot.png"))
+    assert (cv2.imread(snapshot) == 200).all()
+    assert processor.get_frame_as_base64().startswith("data:image/jpeg;base64,")
+
+
+def test_stats_report_measured_rates_drops_and_dwell():
+    processor = VideoProcessor(source=None, name="fake", ring_slots=4, adaptive_skip=False)
+    processor.skip_frames = 2
+    processor.cap = FakeCapture(processor, 20)
+    recorder = processor.create_cursor('sequential')
+    processor.is_running = True
+    processor._capture_loop()
+    
+    for _ in range(4):
+        assert recorder.next(timeout=0.1) is not None
+    processor.report_detection_latency(0.05)
+    
+    stats = processor.get_stats()
+    assert stats['frames_captured'] == 20
+    assert stats['frames_dropped']['skip'] == 10
+    assert stats['frames_dropped']['read_failure'] == 0
+    # 10 frames published into 4 slots: the recorder lost the first 6
+    assert stats['frames_dropped']['overrun'] == 6
+    assert stats['queue_size'] == 4
+    assert stats['dwell_ms']['p50'] is not None
+    assert stats['fps'] > 0 and stats['analysis_fps'] >= 0
+
+
+def write_clip(path, frames=6, size=(64, 48)):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), 30, size)
+    for i in range(frames):
+        writer.write(np.full((size[1], size[0], 3), i * 20, dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+
+def wait_until(condition, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_capture_reconnects_after_stream_ends(tmp_path):
+    processor = VideoProcessor(write_clip(tmp_path / "clip.mp4"), name="clip", adaptive_skip=False)
+    processor.skip_frames = 1
+    processor.backoff_base = 0.01
+    try:
+        assert processor.start_capture()
+        # End of file looks like a dropped stream: the loop reconnects and keeps publishing
+        assert wait_until(lambda: processor.reconnects >= 2)
+        assert processor.frame_count > 6
+        assert processor.get_stats()['frames_dropped']['read_failure'] >= 2 * processor.max_read_failures
+    finally:
+        processor.stop_capture()
+        processor.disconnect()
+
+
+def test_capture_gives_up_after_reconnect_attempts(tmp_path):
+    path = write_clip(tmp_path / "clip.mp4")
+    processor = VideoProcessor(path, name="clip", adaptive_skip=False, reconnect_attempts=2)
+    processor.skip_frames = 1
+    processor.backoff_base = 0.01
+    assert processor.start_capture()
+    processor.source = str(tmp_path / "gone.mp4")
+    
+    assert wait_until(lambda: not processor.is_running)
+    assert processor.state == 'failed'
+    processor.stop_capture()
+
+
+def test_start_all_connects_in_parallel_and_supervisor_recovers(tmp_path, monkeypatch):
+    original_connect = VideoProcessor.connect
+    
+    def slow_connect(self):
+        time.sleep(0.5)
+        return original_connect(self)
+    
+    monkeypatch.setattr(VideoProcessor, 'connect', slow_connect)
+    clip = write_clip(tmp_path / "clip.mp4")
+    late = tmp_path / "late.mp4"
+    
+    multi = MultiCameraProcessor()
+    multi.supervisor_interval = 0.05
+    multi.retry_backoff_base = 0.1
+    for i in range(6):
+        multi.add_camera(f"cam{i}", clip)
+    multi.add_camera("late", str(late))
+    try:
+        start = time.time()
+        assert multi.start_all() == 6
+        assert time.time() - start < 2.0
+        assert multi.retry_state["late"]["attempts"] == 1
+        
+        write_clip(late)
+        assert wait_until(lambda: multi.get_camera("late").is_running)
+        assert "late" not in multi.retry_state
+    finally:
+        multi.stop_all()
+
+
+def test_supervisor_only_restarts_failed_cameras(tmp_path):
+    clip = write_clip(tmp_path / "clip.mp4")
+    multi = MultiCameraProcessor()
+    multi.supervisor_interval = 0.02
+    multi.retry_backoff_base = 0.01
+    multi.add_camera("stopped", clip)
+    multi.add_camera("failing", clip)
+    try:
+        assert multi.start_all() == 2
+        multi.get_camera("stopped").stop_capture()
+        multi.add_camera("added", clip)
+        failing = multi.get_camera("failing")
+        failing.is_running = False
+        failing.state = 'failed'  # As when capture gives up reconnecting
+        failing.capture_thread.join(timeout=2)
+        
+        assert wait_until(lambda: failing.is_running)
+        time.sleep(0.2)
+        assert not multi.get_camera("stopped").is_running and not multi.get_camera("added").is_running
+        assert multi.get_camera("added").state == 'disconnected'
+        assert not multi.retry_state
+    finally:
+        multi.stop_all()
+
+
+def test_denoise_tiers_reduce_noise_and_record_cost():
+    processor = VideoProcessor(source=None, name="night", ring_slots=6)
+    rng = np.random.default_rng(0)
+    clean = np.full((480, 640, 3), 100, dtype=np.uint8)
+    for _ in range(4):
+        noise = rng.normal(0, 12, clean.shape)
+        processor.frame_ring.write(np.clip(clean + noise, 0, 255).astype(np.uint8))
+    # A person moved into the newest frame: that region must not be averaged away
+    frame = processor.get_latest_frame()
+    frame[100:200, 100:200] = 250
+    
+    noisy_error = np.abs(frame[300:, 300:].astype(int) - 100).mean()
+    temporal = processor.preprocess_frame(frame, denoise='temporal')
+    assert np.abs(temporal[300:, 300:].astype(int) - 100).mean() < noisy_error * 0.7
+    assert (temporal[120:180, 120:180] == 250).all()
+    
+    for tier in ('median', 'bilateral'):
+        smoothed = processor.preprocess_frame(frame, denoise=tier)
+        assert np.abs(smoothed[300:, 300:].astype(int) - 100).mean() < noisy_error
+    
+    assert processor.preprocess_frame(frame, denoise=False).shape == frame.shape
+    processor.set_denoise_tier('median')
+    processor.preprocess_frame(frame, grayscale=True)
+    cost = processor.get_stats()['denoise']['cost_ms']
+    assert set(cost) == {'temporal', 'median', 'bilateral'}
+    assert cost['median']['p50'] < 100
+
+
+def test_live_consumers_lower_the_decode_skip(tmp_path):
+    processor = VideoProcessor(source=None, name="fake", adaptive_skip=False)
+    processor.fps = 30
+    processor.skip_frames = 6
+    assert processor.decode_skip() == 6
+    processor.require_decode_rate('grid', 10)
+    assert processor.decode_skip() == 3
+    processor.require_decode_rate('recording')
+    assert processor.decode_skip() == 1
+    processor.release_decode_rate('recording')
+    processor.release_decode_rate('grid')
+    assert processor.decode_skip() == 6
+    
+    # Recordings get every frame, so they play back at the camera's rate
+    camera = VideoProcessor("synthetic://rec?width=160&height=120&fps=15", name="rec")
+    camera.skip_frames = 5
+    path = str(tmp_path / "rec.mp4")
+    try:
+        assert camera.start_capture()
+        assert wait_until(lambda: camera.get_latest_frame() is not None)
+        assert camera.start_recording(path)
+        time.sleep(2.0)
+        camera.stop_recording()
+    finally:
+        camera.stop_capture()
+        camera.disconnect()
+    
+    written = camera.last_recording_stats['frames_written']
+    assert 24 <= written <= 33
+    clip = cv2.VideoCapture(path)
+    assert clip.get(cv2.CAP_PROP_FPS) == 15
+    clip.release()
@@ -0,0 +1,387 @@
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+from utils.latency_tracing import tracer
+
+# Default number of worker processes (settings.MAX_WORKERS)
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "4"))
+
+DETECTION_SIZE = (640, 480)
+
+
+def create_analyzers(zone, alert_log_path=None, baseline=None):
+    """
+    Stateful per-camera models: an AnomalyDetector (with the persisted motion anomaly model and
+    the learned zone baselines, both shared by every camera of the process) and a RiskScorer
+    :param baseline: ZoneBaseline to use instead of the persisted process-wide one
+    :return: (anomaly_detector, risk_scorer)
+    """
+    from models.anomaly_detection import AnomalyDetector
+    from models.motion_anomaly_model import load_default_model
+    from models.risk_scoring import RiskScorer
+    from models.zone_baseline import load_default_baseline
+    
+    return (AnomalyDetector(zone_id=zone, baseline=load_default_baseline() if baseline is None else baseline,
+                            anomaly_model=load_default_model()),
+            RiskScorer(alert_log_path=alert_log_path))
+
+
+def analyze_frame(frame, detector, anomaly_detector, risk_scorer, capacity=1.0, trace=None, timestamp=None,
+                  forecaster=None, zone=None):
+    """
+    Detection -> anomaly -> risk for one frame; the one analysis path shared by the live
+    pipelines, offline analysis and the load test
+    :param trace: Optional latency Trace ('detect', 'anomaly' and 'risk' are marked)
+    :param timestamp: Capture time in unix seconds for time-of-day baselines and rules (default: now)
+    :param forecaster: Optional OccupancyForecaster; the density is folded into it and its forecast for
+                       zone feeds the risk score's forecast term
+    :param zone: Forecaster zone key (the anomaly detector's zone by default)
+    :return: Compact result (counts, risk, anomaly types, recommendations when an alert is required)
+    """
+    if frame.shape[1::-1] != DETECTION_SIZE:
+        frame = cv2.resize(frame, DETECTION_SIZE)
+    crowd = detector.detect_crowd(frame)
+    detections = crowd['detections']
+    for detection in detections:
+        x1, y1, x2, y2 = detection['bbox']
+        detection['center'] = ((x1 + x2) / 2, (y1 + y2) / 2)
+    if trace is not None:
+        trace.mark('detect')
+    
+    density = crowd['density'] / 100.0
+    predicted_density = None
+    if forecaster is not None:
+        zone = anomaly_detector.zone_id if zone is None else zone
+        forecaster.update(zone, density, timestamp)
+        predicted_density = forecaster.predicted_density(zone)
+    anomalies = anomaly_detector.comprehensive_analysis(frame, detections, density, timestamp)
+    if trace is not None:
+        trace.mark('anomaly')
+    risk = risk_scorer.calculate_overall_risk(
+        {'density': density, 'capacity': capacity, 'person_count': crowd['count'],
+         'predicted_density': predicted_density},
+        anomalies, anomalies.get('flow'), timestamp=timestamp)
+    if trace is not None:
+        trace.mark('risk')
+    
+    return {
+        'person_count': crowd['count'],
+        'density': round(density, 4),
+        'predicted_density': predicted_density,
+        'risk_level': risk['risk_level'],
+        'risk_score': risk['overall_score'],
+        'alert_required': risk['alert_required'],
+        'anomalies': [{'type': a['type'], 'severity': round(float(a['severity']), 3)}
+                      for a in anomalies['anomalies']],
+        'flow_pattern': anomalies.get('flow', {}).get('pattern'),
+        'recommendations': risk.get('recommendations', []) if risk['alert_required'] else []
+    }
+
+
+class CameraPipeline:
+    """
+    Capture + detection + anomaly + risk for one camera, living inside a worker process.
+    Frames never leave the process; only compact metrics (and thumbnails) do.
+    """
+    
+    def __init__(self, config, detector, thumbnail_width=320, thumbnail_interval=1.0):
+        # Imported here so the API process never loads the analysis stack for this mode
+        from models.occupancy_forecast import default_forecaster
+        from utils.video_processing import VideoProcessor
+        
+        self.camera_id = config['camera_id']
+        self.zone = config.get('zone') or self.camera_id
+        self.capacity = config.get('capacity', 1.0)
+        self.processor = VideoProcessor(config['source'], config.get('name') or f"Camera-{self.camera_id}")
+        self.cursor = self.processor.create_cursor('latest')
+        self.detector = detector
+        self.anomaly_detector, self.risk_scorer = create_analyzers(self.zone, config.get('alert_log_path'))
+        self.forecaster = default_forecaster()  # Shared per process, keyed by zone
+        self.thumbnail_width = thumbnail_width
+        self.thumbnail_interval = thumbnail_interval
+        self.last_thumbnail = 0.0
+    
+    def start(self):
+        return self.processor.start_capture()
+    
+    def stop(self):
+        self.processor.stop_capture()
+        self.processor.disconnect()
+        self.risk_scorer.close()  # Spilled alerts still buffered would be lost with the process
+    
+    def poll(self):
+        """
+        Analyze the newest frame if there is one
+        :return: Compact result dict or None
+        """
+        result = self.cursor.next(timeout=0, copy=False)
+        if result is None:
+            return None
+        frame, captured_at, seq = result
+        trace = tracer.start_trace(self.camera_id, self.processor.frame_ring.capture_time(seq), seq)
+        trace.mark('queue')
+        
+        start_time = time.time()
+        # Take the frame out of the ring once (resize or copy) so analysis never races the capture thread
+        if frame.shape[1::-1] != DETECTION_SIZE:
+            frame = cv2.resize(frame, DETECTION_SIZE)
+        else:
+            frame = frame.copy()
+        if not self.processor.frame_ring.is_valid(seq):
+            return None  # Overwritten while we were reading it
+        
+        analysis = analyze_frame(frame, self.detector, self.anomaly_detector, self.risk_scorer,
+                                 self.capacity, trace, timestamp=captured_at, forecaster=self.forecaster,
+                                 zone=self.zone)
+        
+        latency = time.time() - start_time
+        self.processor.report_detection_latency(latency)
+        if analysis['alert_required'] and self.processor.pre_event_buffer:
+            self.processor.save_incident_clip(analysis['risk_level'])
+        
+        metrics = {
+            'camera_id': self.camera_id,
+            'zone': self.zone,
+            'timestamp': captured_at,
+            'seq': seq,
+            **analysis,
+            'latency_ms': round(latency * 1000, 1),
+            'skip_frames': self.processor.skip_frames,
+            'capture_fps': round(self.processor.capture_meter.get_rate(), 2),
+            'analysis_fps': round(self.processor.analysis_meter.get_rate(), 2),
+            'read_failures': self.processor.read_failures,
+            'pid': os.getpid(),
+            # Continued (alert, notify) and recorded by the API process
+            'trace': trace.to_dict()
+        }
+        
+        if self.thumbnail_width and time.time() - self.last_thumbnail >= self.thumbnail_interval:
+            metrics['thumbnail'] = self.encode_thumbnail(frame)
+            self.last_thumbnail = time.time()
+        return metrics
+    
+    def encode_thumbnail(self, frame):
+        """Small JPEG of the analyzed frame (bytes)"""
+        height = int(frame.shape[0] * self.thumbnail_width / frame.shape[1])
+        thumbnail = cv2.resize(frame, (self.thumbnail_width, height), interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode('.jpg', thumbnail, [cv2.IMWRITE_JPEG_QUALITY, 70])
+        return buffer.tobytes() if ok else None
+
+
+def camera_worker(worker_id, cameras, result_queue, command_queue, stop_event, options):
+    """
+    Worker process entry point: runs the pipelines of its camera shard round-robin
+    and ships compact results back over result_queue
+    """
+    from models.crowd_detection import CrowdDetector
+    
+    cv2.setNumThreads(1)  # One process per core already; avoid oversubscription
+    detector = CrowdDetector()
+    pipelines = {}
+    dropped = 0
+    
+    def add(config):
+        pipeline = CameraPipeline(config, detector, options.get('thumbnail_width', 320),
+                                  options.get('thumbnail_interval', 1.0))
+        if pipeline.start():
+            pipelines[config['camera_id']] = pipeline
+        else:
+            result_queue.put({'camera_id': config['camera_id'], 'error': 'connect_failed', 'pid': os.getpid()})
+    
+    for config in cameras:
+        add(config)
+    
+    while not stop_event.is_set():
+        try:
+            command, payload = command_queue.get_nowait()
+            if command == 'add':
+                add(payload)
+            elif command == 'remove' and payload in pipelines:
+                pipelines.pop(payload).stop()
+        except queue.Empty:
+            pass
+        
+        analyzed = 0
+        for pipeline in list(pipelines.values()):
+            try:
+                metrics = pipeline.poll()
+            except Exception as e:
+                metrics = {'camera_id': pipeline.camera_id, 'error': str(e), 'pid': os.getpid()}
+            if metrics is None:
+                continue
+            analyzed += 1
+            metrics['worker_id'] = worker_id
+            metrics['dropped_results'] = dropped
+            try:
+                result_queue.put_nowait(metrics)
+            except queue.Full:
+                dropped += 1
+        
+        if not analyzed:
+            time.sleep(0.005)
+    
+    for pipeline in pipelines.values():
+        pipeline.stop()
+    
+    # Worker processes skip atexit handlers: persist what this shard learned
+    from models.zone_baseline import save_default_baseline
+    save_default_baseline()
+
+
+class CameraWorkerPool:
+    """
+    Shards cameras across worker processes so capture, detection and the Python-side
+    analysis of different cameras run on different cores (no shared GIL).
+    The API process only receives compact metrics and optional JPEG thumbnails.
+    """
+    
+    def __init__(self, num_workers=MAX_WORKERS, thumbnail_width=320, thumbnail_interval=1.0,
+                 result_queue_size=1000, on_result=None):
+        """
+        :param num_workers: Worker processes (cameras are distributed round-robin)
+        :param thumbnail_width: Width of JPEG thumbnails sent back (0 = none)
+        :param thumbnail_interval: Seconds between thumbnails per camera
+        :param result_queue_size: Bound of the result queue (workers drop results when full)
+        :param on_result: Optional callback(metrics) run in the collector thread
+        """
+        self.num_workers = max(int(num_workers), 1)
+        self.options = {'thumbnail_width': thumbnail_width, 'thumbnail_interval': thumbnail_interval}
+        self.on_result = on_result
+        self.context = mp.get_context('spawn')
+        self.result_queue = self.context.Queue(maxsize=result_queue_size)
+        self.stop_event = self.context.Event()
+        
+        self.cameras = {}         # camera_id -> config
+        self.assignment = {}      # camera_id -> worker index
+        self.workers = []         # (process, command_queue)
+        self.latest_metrics = {}
+        self.thumbnails = {}
+        self.errors = {}
+        self.results_received = 0
+        self.is_running = False
+        self.collector_thread = None
+    
+    def add_camera(self, camera_id, source, name=None, zone=None, capacity=1.0):
+        """Register a camera (also works while running)"""
+        config = {'camera_id': camera_id, 'source': source, 'name': name, 'zone': zone, 'capacity': capacity}
+        self.cameras[camera_id] = config
+        if self.is_running:
+            worker_index = self._least_loaded_worker()
+            self.assignment[camera_id] = worker_index
+            self.workers[worker_index][1].put(('add', config))
+        return config
+    
+    def remove_camera(self, camera_id):
+        """Stop and forget a camera"""
+        self.cameras.pop(camera_id, None)
+        worker_index = self.assignment.pop(camera_id, None)
+        if self.is_running and worker_index is not None:
+            self.workers[worker_index][1].put(('remove', camera_id))
+        self.latest_metrics.pop(camera_id, None)
+        self.thumbnails.pop(camera_id, None)
+    
+    def start(self):
+        """Spawn the worker processes and the result collector"""
+        if self.is_running:
+            return len(self.workers)
+        
+        camera_ids = list(self.cameras.keys())
+        worker_count = max(min(self.num_workers, len(camera_ids)), 1)
+        shards = [[] for _ in range(worker_count)]
+        for index, camera_id in enumerate(camera_ids):
+            shards[index % worker_count].append(self.cameras[camera_id])
+            self.assignment[camera_id] = index % worker_count
+        
+        self.stop_event.clear()
+        for worker_id, shard in enumerate(shards):
+            command_queue = self.context.Queue()
+            process = self.context.Process(
+                target=camera_worker,
+                args=(worker_id, shard, self.result_queue, command_queue, self.stop_event, self.options),
+                daemon=True)
+            process.start()
+            self.workers.append((process, command_queue))
+        
+        self.is_running = True
+        self.collector_thread = threading.Thread(target=self._collect_loop, daemon=True)
+        self.collector_thread.start()
+        print(f"▶️ Started {worker_count} camera worker processes for {len(camera_ids)} cameras")
+        return worker_count
+    
+    def stop(self, timeout=5.0):
+        """Stop all workers"""
+        if not self.is_running:
+            return
+        self.stop_event.set()
+        for process, _ in self.workers:
+            process.join(timeout=timeout)
+            if process.is_alive():
+                process.terminate()
+        self.is_running = False
+        if self.collector_thread:
+            self.collector_thread.join(timeout=2)
+        self.workers = []
+        print("⏹️ Camera workers stopped")
+    
+    def _collect_loop(self):
+        while self.is_running:
+            try:
+                metrics = self.result_queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            
+            camera_id = metrics['camera_id']
+            if 'error' in metrics:
+                self.errors[camera_id] = metrics['error']
+                continue
+            
+            thumbnail = metrics.pop('thumbnail', None)
+            if thumbnail is not None:
+                self.thumbnails[camera_id] = thumbnail
+            trace = tracer.resume(metrics.pop('trace')) if 'trace' in metrics else None
+            self.latest_metrics[camera_id] = metrics
+            self.results_received += 1
+            
+            if self.on_result:
+                try:
+                    # The callback may continue the trace through alert creation and notification
+                    self.on_result(dict(metrics, trace=trace) if trace else metrics)
+                except Exception as e:
+                    print(f"❌ Camera result callback error: {str(e)}")
+            if trace is not None:
+                trace.finish()
+                metrics['latency'] = trace.summary()
+    
+    def _least_loaded_worker(self):
+        loads = [0] * len(self.workers)
+        for worker_index in self.assignment.values():
+            loads[worker_index] += 1
+        return loads.index(min(loads))
+    
+    def get_metrics(self, camera_id=None):
+        """Latest metrics of one camera (or all cameras)"""
+        if camera_id is not None:
+            return self.latest_metrics.get(camera_id)
+        return dict(self.latest_metrics)
+    
+    def get_thumbnail(self, camera_id):
+        """Latest JPEG thumbnail bytes of a camera (None if none yet)"""
+        return self.thumbnails.get(camera_id)
+    
+    def get_stats(self):
+        return {
+            'workers': [{'pid': process.pid, 'alive': process.is_alive(),
+                         'cameras': [c for c, w in self.assignment.items() if w == index]}
+                        for index, (process, _) in enumerate(self.workers)],
+            'cameras': len(self.cameras),
+            'results_received': self.results_received,
+            'errors': dict(self.errors),
+            'is_running': self.is_running
+        }
@@ -0,0 +1,318 @@
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from utils.latency_tracing import tracer
+from utils.video_processing import RateMeter
+
+# Detection worker threads shared by all cameras (settings.THREAD_POOL_SIZE)
+THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", "10"))
+
+# How much more often a camera is analyzed per risk level
+RISK_LEVEL_WEIGHTS = {'LOW': 1.0, 'MEDIUM': 2.0, 'HIGH': 4.0, 'CRITICAL': 8.0}
+
+
+class DetectionScheduler:
+    """
+    Shares a fixed pool of detection workers across all cameras:
+    - Each camera gets a target analysis rate from its weight (risk level, rising motion, priority)
+    - Every camera keeps a guaranteed minimum rate; the remaining capacity goes to the riskiest
+      cameras first (water-filling), so calm cameras degrade gracefully under load
+    - Due cameras are dispatched earliest-deadline-first whenever a worker is free
+    """
+    
+    def __init__(self, analyze, pool_size=THREAD_POOL_SIZE, min_rate=0.5, base_rate=2.0, max_rate=15.0,
+                 motion_boost=2.0, motion_interval=0.5, tick_interval=0.02, on_result=None):
+        """
+        :param analyze: callable(camera_id, frame, captured_at) -> result dict; a 'risk_level' key
+                        in the result feeds back into the camera's weight. The frame's latency trace
+                        is available as latency_tracing.tracer.current() while it runs
+        :param pool_size: Detection worker threads
+        :param min_rate: Guaranteed analyses per second per camera (unless a camera overrides it)
+        :param base_rate: Target rate of a calm (LOW, weight 1) camera when capacity allows
+        :param max_rate: Rate cap per camera
+        :param motion_boost: Weight multiplier while a camera's motion is rising
+        :param motion_interval: Seconds between cheap motion probes per camera
+        :param tick_interval: Scheduler loop period
+        :param on_result: Optional callback(camera_id, result) run on the worker thread; a dict result
+                          carries the frame's trace under 'trace' (also tracer.current()), which
+                          is finished once the callback returns
+        """
+        self.analyze = analyze
+        self.pool_size = max(int(pool_size), 1)
+        self.min_rate = min_rate
+        self.base_rate = base_rate
+        self.max_rate = max_rate
+        self.motion_boost = motion_boost
+        self.motion_interval = motion_interval
+        self.tick_interval = tick_interval
+        self.on_result = on_result
+        
+        self.cameras = {}  # camera_id -> state dict
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.latency = 0.1  # EWMA seconds per analysis, seeds the capacity estimate
+        self.completed = 0
+        self.errors = 0
+        
+        self.executor = None
+        self.is_running = False
+        self.scheduler_thread = None
+    
+    def add_camera(self, camera_id, processor, priority=1.0, min_rate=None):
+        """
+        Schedule a VideoProcessor
+        :param priority: Static weight multiplier (e.g. 2.0 for an entrance camera)
+        :param min_rate: Guaranteed analyses per second for this camera
+        """
+        with self.lock:
+            self.cameras[camera_id] = {
+                'processor': processor,
+                'cursor': processor.create_cursor('latest'),
+                'priority': priority,
+                'min_rate': self.min_rate if min_rate is None else min_rate,
+                'risk_level': 'LOW',
+                'motion': 0.0,  # Fast EWMA of frame difference
+                'motion_baseline': 0.0,  # Slow EWMA of frame difference
+                'motion_probe': None,
+                'last_probe': 0.0,
+                'target_rate': 0.0,
+                'next_due': 0.0,
+                'busy': False,
+                'analyses': 0,
+                'no_frame': 0,
+                'meter': RateMeter(window=5.0)
+            }
+    
+    def remove_camera(self, camera_id):
+        with self.lock:
+            camera = self.cameras.pop(camera_id, None)
+        if camera is not None:
+            camera['processor'].set_target_analysis_rate(None)
+    
+    def update_risk(self, camera_id, risk_level):
+        """Feed a camera's latest RiskScorer level (also done automatically from results)"""
+        camera = self.cameras.get(camera_id)
+        if camera is not None and risk_level in RISK_LEVEL_WEIGHTS:
+            camera['risk_level'] = risk_level
+    
+    def motion_rising(self, camera):
+        return camera['motion'] > 1.5 * camera['motion_baseline'] + 1.0
+    
+    def weight(self, camera):
+        weight = RISK_LEVEL_WEIGHTS.get(camera['risk_level'], 1.0) * camera['priority']
+        if self.motion_rising(camera):
+            weight *= self.motion_boost
+        return weight
+    
+    def capacity(self):
+        """Analyses per second the pool can sustain at the measured latency"""
+        return self.pool_size / max(self.latency, 1e-3)
+    
+    def allocate_rates(self, capacity=None):
+        """
+        Split the capacity into per-camera target rates
+        :return: {camera_id: analyses per second}
+        """
+        capacity = self.capacity() if capacity is None else capacity
+        cameras = list(self.cameras.items())
+        if not cameras:
+            return {}
+        
+        weights = {camera_id: self.weight(camera) for camera_id, camera in cameras}
+        wanted = {camera_id: min(max(self.base_rate * weights[camera_id], camera['min_rate']), self.max_rate)
+                  for camera_id, camera in cameras}
+        
+        # Guaranteed minimums first (scaled down only if even they don't fit)
+        floor = {camera_id: min(camera['min_rate'], wanted[camera_id]) for camera_id, camera in cameras}
+        floor_total = sum(floor.values())
+        if floor_total >= capacity:
+            scale = capacity / floor_total if floor_total else 0.0
+            return {camera_id: rate * scale for camera_id, rate in floor.items()}
+        
+        # Water-fill the rest proportionally to weight, up to each camera's wanted rate
+        rates = dict(floor)
+        remaining = capacity - floor_total
+        open_ids = [camera_id for camera_id in rates if rates[camera_id] < wanted[camera_id]]
+        while remaining > 1e-9 and open_ids:
+            total_weight = sum(weights[camera_id] for camera_id in open_ids)
+            granted = 0.0
+            for camera_id in open_ids:
+                share = remaining * weights[camera_id] / total_weight
+                grant = min(share, wanted[camera_id] - rates[camera_id])
+                rates[camera_id] += grant
+                granted += grant
+            remaining -= granted
+            open_ids = [camera_id for camera_id in open_ids if rates[camera_id] < wanted[camera_id] - 1e-9]
+            if granted <= 1e-9:
+                break
+        return rates
+    
+    def _probe_motion(self, camera, now):
+        """Mean absolute difference of tiny grayscale thumbnails (a few microseconds per camera)"""
+        ring = camera['processor'].frame_ring
+        result = ring.latest()
+        if result is None:
+            return
+        frame, _, seq = result
+        small = cv2.resize(frame, (32, 24), interpolation=cv2.INTER_AREA)
+        if not ring.is_valid(seq):
+            return  # Zero-copy view overwritten during the resize: the thumbnail may be torn
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        small = small.astype(np.int16)
+        if camera['motion_probe'] is not None:
+            motion = float(np.abs(small - camera['motion_probe']).mean())
+            camera['motion'] += 0.5 * (motion - camera['motion'])
+            camera['motion_baseline'] += 0.05 * (motion - camera['motion_baseline'])
+        camera['motion_probe'] = small
+        camera['last_probe'] = now
+    
+    def start(self):
+        if self.is_running:
+            return
+        self.is_running = True
+        self.executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="detect")
+        self.scheduler_thread = threading.Thread(target=self._schedule_loop, daemon=True)
+        self.scheduler_thread.start()
+        print(f"🗓️ Detection scheduler started ({self.pool_size} workers, {len(self.cameras)} cameras)")
+    
+    def stop(self):
+        self.is_running = False
+        if self.scheduler_thread:
+            self.scheduler_thread.join(timeout=2)
+        if self.executor:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        print("⏹️ Detection scheduler stopped")
+    
+    def _schedule_loop(self):
+        while self.is_running:
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"❌ Detection scheduler error: {str(e)}")
+            time.sleep(self.tick_interval)
+    
+    def tick(self, now=None):
+        """Re-allocate rates and dispatch due cameras to free workers"""
+        now = time.time() if now is None else now
+        with self.lock:
+            for camera in self.cameras.values():
+                if now - camera['last_probe'] >= self.motion_interval:
+                    self._probe_motion(camera, now)
+            
+            rates = self.allocate_rates()
+            for camera_id, rate in rates.items():
+                camera = self.cameras[camera_id]
+                if rate != camera['target_rate'] and rate > 0:
+                    # Pull the deadline in when a camera's rate goes up
+                    camera['next_due'] = min(camera['next_due'], now + 1.0 / rate)
+                camera['target_rate'] = rate
+                # Analyses run in parallel, so the decode rate follows the target rate (plus the
+                # motion probes), not the serial latency model of the processor's rate controller
+                probe_rate = 1.0 / self.motion_interval if self.motion_interval else math.inf
+                camera['processor'].set_target_analysis_rate(max(rate, probe_rate))
+            
+            dispatched = []
+            if self.executor is None:
+                return 0  # Not started: only rates and motion are updated
+            due = sorted((camera['next_due'], camera_id) for camera_id, camera in self.cameras.items()
+                         if not camera['busy'] and camera['target_rate'] > 0 and camera['next_due'] <= now)
+            for _, camera_id in due:
+                if self.in_flight >= self.pool_size:
+                    break
+                camera = self.cameras[camera_id]
+                result = camera['cursor'].next(timeout=0, copy=True)
+                if result is None:
+                    camera['no_frame'] += 1
+                    continue
+                camera['busy'] = True
+                # Late cameras don't accumulate debt: the next slot is one period from now
+                camera['next_due'] = max(camera['next_due'] + 1.0 / camera['target_rate'], now)
+                self.in_flight += 1
+                dispatched.append((camera_id, result))
+        
+        for camera_id, (frame, captured_at, seq) in dispatched:
+            ring = self.cameras[camera_id]['processor'].frame_ring
+            trace = tracer.start_trace(camera_id, ring.capture_time(seq), seq)
+            self.executor.submit(self._run, camera_id, frame, captured_at, trace)
+        return len(dispatched)
+    
+    def _run(self, camera_id, frame, captured_at, trace=None):
+        start_time = time.time()
+        result = None
+        camera = None
+        if trace is not None:
+            trace.mark('queue')
+            tracer.activate(trace)
+        try:
+            try:
+                result = self.analyze(camera_id, frame, captured_at)
+            except Exception as e:
+                with self.lock:
+                    self.errors += 1
+                print(f"❌ Detection failed for {camera_id}: {str(e)}")
+            elapsed = time.time() - start_time
+            if trace is not None and trace.last_stage == 'queue':
+                trace.mark('analysis')  # analyze did not mark its own stages
+            
+            with self.lock:
+                self.in_flight -= 1
+                self.latency += 0.1 * (elapsed - self.latency)
+                self.completed += 1
+                camera = self.cameras.get(camera_id)
+                if camera is not None:
+                    camera['busy'] = False
+                    camera['analyses'] += 1
+                    camera['meter'].tick()
+                    if isinstance(result, dict):
+                        self.update_risk(camera_id, result.get('risk_level'))
+            
+            if camera is not None:
+                processor = camera['processor']
+                processor.report_detection_latency(elapsed)
+                if isinstance(result, dict) and result.get('alert_required') and processor.pre_event_buffer:
+                    processor.save_incident_clip(result.get('risk_level') or 'alert')
+            if result is not None and self.on_result:
+                try:
+                    # The callback may continue the trace through alert creation and notification
+                    self.on_result(camera_id, dict(result, trace=trace)
+                                   if trace is not None and isinstance(result, dict) else result)
+                except Exception as e:
+                    print(f"❌ Detection result callback error: {str(e)}")
+        finally:
+            tracer.activate(None)
+            if trace is not None:
+                trace.finish()
+    
+    def get_stats(self):
+        capacity = self.capacity()
+        return {
+            'pool_size': self.pool_size,
+            'in_flight': self.in_flight,
+            'latency_ms': round(self.latency * 1000, 1),
+            'capacity_per_second': round(capacity, 2),
+            'allocated_per_second': round(sum(c['target_rate'] for c in self.cameras.values()), 2),
+            'completed': self.completed,
+            'errors': self.errors,
+            'cameras': {
+                camera_id: {
+                    'risk_level': camera['risk_level'],
+                    'priority': camera['priority'],
+                    'weight': round(self.weight(camera), 2),
+                    'motion_rising': self.motion_rising(camera),
+                    'min_rate': camera['min_rate'],
+                    'target_rate': round(camera['target_rate'], 2),
+                    'measured_rate': round(camera['meter'].get_rate(), 2),
+                    'analyses': camera['analyses'],
+                    'no_frame': camera['no_frame']
+                }
+                for camera_id, camera in list(self.cameras.items())
+            }
+        }
@@ -0,0 +1,190 @@
+import json
+import os
+import shutil
+import subprocess
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+# Decoder defaults (settings.FFMPEG_PATH / settings.FFMPEG_THREADS)
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+FFMPEG_THREADS = int(os.getenv("FFMPEG_THREADS", "2"))
+
+PIXEL_FORMATS = {'bgr24': 3, 'gray': 1}
+
+
+def ffmpeg_available(ffmpeg_path=FFMPEG_PATH):
+    return shutil.which(ffmpeg_path) is not None
+
+
+class FFmpegCapture:
+    """
+    cv2.VideoCapture-compatible capture that decodes in an ffmpeg subprocess:
+    - ffmpeg scales to the analysis resolution and converts to BGR/gray inside the decoder
+    - Raw frames come over a pipe and are read straight into preallocated (or caller-provided
+      ring slot) buffers with readinto, no intermediate copies
+    - Decode threads, keyframe-only decoding and output frame rate are configurable per camera
+    """
+    
+    def __init__(self, source, width=640, height=480, pixel_format='bgr24', threads=FFMPEG_THREADS,
+                 keyframes_only=False, fps=None, timeout=10.0, rtsp_transport='tcp',
+                 ffmpeg_path=FFMPEG_PATH, input_args=None):
+        """
+        :param source: File path, URL (rtsp/http...) or device path
+        :param width: Output width (scaled inside ffmpeg)
+        :param height: Output height
+        :param pixel_format: 'bgr24' or 'gray'
+        :param threads: Decoder threads for this camera
+        :param keyframes_only: Decode only keyframes (very cheap, ~1 frame per GOP)
+        :param fps: Output frame rate (frames are dropped inside ffmpeg), None = source rate
+        :param timeout: Network open/read timeout in seconds
+        :param rtsp_transport: 'tcp' or 'udp' for rtsp sources
+        :param ffmpeg_path: ffmpeg executable
+        :param input_args: Extra ffmpeg arguments placed before -i
+        """
+        if pixel_format not in PIXEL_FORMATS:
+            raise ValueError(f"Unknown pixel format: {pixel_format}")
+        self.source = str(source)
+        self.width = int(width)
+        self.height = int(height)
+        self.pixel_format = pixel_format
+        self.channels = PIXEL_FORMATS[pixel_format]
+        self.threads = threads
+        self.keyframes_only = keyframes_only
+        self.output_fps = fps
+        self.timeout = timeout
+        self.rtsp_transport = rtsp_transport
+        self.ffmpeg_path = ffmpeg_path
+        self.input_args = list(input_args or [])
+        
+        shape = (self.height, self.width) if self.channels == 1 else (self.height, self.width, self.channels)
+        self.frame_bytes = self.width * self.height * self.channels
+        self.buffer = np.empty(shape, dtype=np.uint8)  # Used when the caller passes no buffer
+        self.scratch = np.empty(self.frame_bytes, dtype=np.uint8)  # Discarded frames (grab)
+        self.source_fps = self._probe_fps()
+        self.frames_read = 0
+        self.stderr_lines = deque(maxlen=20)
+        self.process = None
+        self._start()
+    
+    def build_command(self):
+        command = [self.ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-nostdin']
+        timeout_us = str(int(self.timeout * 1_000_000))
+        if self.source.startswith('rtsp://'):
+            command += ['-rtsp_transport', self.rtsp_transport, '-timeout', timeout_us]
+        elif '://' in self.source:
+            command += ['-rw_timeout', timeout_us]
+        if self.keyframes_only:
+            command += ['-skip_frame', 'nokey']
+        command += ['-threads', str(self.threads)] + self.input_args + ['-i', self.source, '-an', '-sn', '-dn']
+        
+        filters = []
+        if self.output_fps:
+            filters.append(f"fps={self.output_fps}")
+        filters.append(f"scale={self.width}:{self.height}:flags=area")
+        command += ['-vf', ','.join(filters), '-pix_fmt', self.pixel_format]
+        if self.keyframes_only:
+            command += ['-fps_mode', 'passthrough']
+        command += ['-f', 'rawvideo', 'pipe:1']
+        return command
+    
+    def _start(self):
+        try:
+            self.process = subprocess.Popen(self.build_command(), stdout=subprocess.PIPE,
+                                            stderr=subprocess.PIPE, stdin=subprocess.DEVNULL, bufsize=0)
+        except OSError as e:
+            self.stderr_lines.append(str(e))
+            self.process = None
+            return
+        threading.Thread(target=self._drain_stderr, daemon=True).start()
+    
+    def _drain_stderr(self):
+        process = self.process
+        for line in iter(process.stderr.readline, b''):
+            self.stderr_lines.append(line.decode(errors='replace').strip())
+    
+    def _probe_fps(self):
+        """Nominal source frame rate via ffprobe (0 when unknown)"""
+        if self.output_fps:
+            return float(self.output_fps)
+        ffprobe = shutil.which('ffprobe')
+        if ffprobe is None:
+            return 0.0
+        try:
+            output = subprocess.run(
+                [ffprobe, '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'stream=avg_frame_rate',
+                 '-of', 'json', self.source], capture_output=True, timeout=self.timeout, check=True).stdout
+            numerator, _, denominator = json.loads(output)['streams'][0]['avg_frame_rate'].partition('/')
+            return float(numerator) / float(denominator or 1) if float(denominator or 1) else 0.0
+        except (subprocess.SubprocessError, KeyError, IndexError, ValueError):
+            return 0.0
+    
+    def _read_into(self, target):
+        """Fill target (bytes view) from the pipe; False at end of stream"""
+        view = memoryview(target).cast('B')
+        filled = 0
+        while filled < self.frame_bytes:
+            count = self.process.stdout.readinto(view[filled:])
+            if not count:
+                return False
+            filled += count
+        return True
+    
+    def isOpened(self):
+        return self.process is not None and (self.process.poll() is None or self.frames_read > 0)
+    
+    def read(self, image=None):
+        """
+        Next frame
+        :param image: Optional preallocated buffer of the output shape (e.g. a ring slot) to read into
+        :return: (ret, frame)
+        """
+        if self.process is None:
+            return False, None
+        target = image if (image is not None and image.shape == self.buffer.shape and
+                           image.dtype == np.uint8 and image.flags.c_contiguous) else self.buffer
+        if not self._read_into(target):
+            return False, None
+        self.frames_read += 1
+        return True, target
+    
+    def grab(self):
+        """Consume a frame without using it (ffmpeg already decoded it; see fps / keyframes_only)"""
+        if self.process is None or not self._read_into(self.scratch):
+            return False
+        self.frames_read += 1
+        return True
+    
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.source_fps
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.frames_read)
+        return 0.0
+    
+    def set(self, prop, value):
+        return False  # Size, rate and threads are fixed when ffmpeg starts
+    
+    def release(self):
+        if self.process is None:
+            return
+        process, self.process = self.process, None
+        if process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        process.stdout.close()
+        process.stderr.close()
+    
+    @property
+    def last_error(self):
+        return self.stderr_lines[-1] if self.stderr_lines else None
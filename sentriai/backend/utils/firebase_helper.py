@@ -414,15 +414,18 @@ class FirebaseHelper:
     
     # ==================== UTILITY METHODS ====================
     
-    def create_alert_with_notification(self, alert_data, send_notification=True):
+    def create_alert_with_notification(self, alert_data, send_notification=True, trace=None):
         """
         Create alert and send notification in one operation
         :param alert_data: Alert information
         :param send_notification: Whether to send push notification
+        :param trace: Optional latency Trace of the frame that raised the alert (finished here)
         :return: Alert document reference
         """
         # Save to Firestore
         doc_ref = self.save_alert_to_firestore(alert_data)
+        if trace is not None:
+            trace.mark('alert')
         
         # Send notification if requested
         if send_notification and doc_ref:
@@ -440,7 +443,11 @@ class FirebaseHelper:
                 body=alert_data.get('description', 'New alert detected'),
                 data={'alert_id': doc_ref.id, 'severity': severity}
             )
+            if trace is not None:
+                trace.mark('notify')
         
+        if trace is not None:
+            trace.finish()
         return doc_ref
     
     def batch_save_analytics(self, analytics_list):
@@ -0,0 +1,289 @@
+import threading
+import time
+
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+
+# Header layout (int64): write_seq, height, width, channels, num_slots, then one sequence number per slot
+_HEADER_FIELDS = 5
+
+
+class FrameRing:
+    """
+    Preallocated ring of frame slots shared by all consumers of a camera:
+    - Every frame is written once into a slot and tagged with a monotonically increasing sequence number,
+      its wall-clock timestamp and its monotonic capture time (for latency tracing)
+    - Readers get zero-copy views and validate them against the slot sequence (seqlock style)
+    - Optionally backed by multiprocessing.shared_memory so other processes can attach by name
+    """
+    
+    def __init__(self, num_slots=8, frame_shape=None, dtype=np.uint8, shared=False):
+        """
+        :param num_slots: Number of frames kept (a view stays valid until num_slots newer frames arrive)
+        :param frame_shape: (height, width, channels); allocated on the first write when None
+        :param dtype: Frame pixel type
+        :param shared: Allocate the ring in shared memory
+        """
+        self.num_slots = num_slots
+        self.dtype = np.dtype(dtype)
+        self.shared = shared
+        self.shm = None
+        self.owner = True
+        self.header = None
+        self.timestamps = None
+        self.capture_times = None
+        self.frames = None
+        self.pending_seq = None
+        self.released_seq = 0  # keeps sequence numbers monotonic across reallocation
+        self.condition = threading.Condition()
+        
+        if frame_shape is not None:
+            self._allocate(tuple(frame_shape))
+    
+    def _allocate(self, frame_shape, shm=None):
+        """Allocate (or map) the header, timestamp, capture time and frame arrays"""
+        self.close()
+        frame_shape = frame_shape if len(frame_shape) == 3 else frame_shape + (1,)
+        header_bytes = 8 * (_HEADER_FIELDS + self.num_slots)
+        timestamp_bytes = 2 * 8 * self.num_slots  # wall clock + monotonic
+        frame_bytes = self.num_slots * int(np.prod(frame_shape)) * self.dtype.itemsize
+        
+        if self.shared and shm is None:
+            shm = shared_memory.SharedMemory(create=True, size=header_bytes + timestamp_bytes + frame_bytes)
+        if shm is not None:
+            self.shm = shm
+            buffer = shm.buf
+        else:
+            buffer = bytearray(header_bytes + timestamp_bytes + frame_bytes)
+        
+        self.header = np.ndarray((_HEADER_FIELDS + self.num_slots,), dtype=np.int64, buffer=buffer)
+        self.timestamps = np.ndarray((self.num_slots,), dtype=np.float64, buffer=buffer, offset=header_bytes)
+        self.capture_times = np.ndarray((self.num_slots,), dtype=np.float64, buffer=buffer,
+                                        offset=header_bytes + 8 * self.num_slots)
+        self.frames = np.ndarray((self.num_slots,) + frame_shape, dtype=self.dtype, buffer=buffer,
+                                 offset=header_bytes + timestamp_bytes)
+        if self.owner:
+            self.header[:] = 0
+            self.header[0] = self.released_seq
+            self.header[1:4] = frame_shape
+            self.header[4] = self.num_slots
+            self.header[_HEADER_FIELDS:] = -1
+    
+    @classmethod
+    def attach(cls, name, dtype=np.uint8):
+        """Map a shared ring created by another process (read-only use)"""
+        shm = shared_memory.SharedMemory(name=name)
+        # Only the creating process may unlink the block; stop this process's tracker from doing it
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        height, width, channels, num_slots = (int(v) for v in header[1:5])
+        del header
+        
+        ring = cls(num_slots=num_slots, dtype=dtype, shared=True)
+        ring.owner = False
+        ring._allocate((height, width, channels), shm=shm)
+        return ring
+    
+    @property
+    def name(self):
+        """Shared memory name to pass to FrameRing.attach (None for a private ring)"""
+        return self.shm.name if self.shm is not None else None
+    
+    @property
+    def latest_seq(self):
+        """Sequence number of the newest complete frame (0 = nothing written yet)"""
+        return int(self.header[0]) if self.header is not None else 0
+    
+    @property
+    def frame_shape(self):
+        return None if self.frames is None else self.frames.shape[1:]
+    
+    def begin_write(self, frame_shape=None):
+        """
+        Reserve the next slot for the producer
+        :param frame_shape: Expected frame shape (allocates/reallocates the ring if it differs)
+        :return: Writable slot view, or None while the frame shape is still unknown
+        """
+        if frame_shape is not None and tuple(frame_shape) != self._stored_shape(frame_shape):
+            self._allocate(tuple(frame_shape))
+        if self.frames is None:
+            return None
+        
+        seq = self.latest_seq + 1
+        slot = seq % self.num_slots
+        # Invalidate the slot first so readers of the old frame notice the overwrite
+        self.header[_HEADER_FIELDS + slot] = -1
+        self.pending_seq = seq
+        return self._slot_view(slot)
+    
+    def commit(self, frame=None, timestamp=None, capture_time=None):
+        """
+        Publish the reserved slot. If the producer decoded into a different buffer
+        (e.g. first frame or size change) the frame is copied in.
+        :param capture_time: time.monotonic() of the capture (defaults to now)
+        :return: Sequence number of the published frame
+        """
+        if frame is not None:
+            if self.pending_seq is None or self._stored_shape(frame.shape) != frame.shape:
+                view = self.begin_write(frame.shape)
+            else:
+                view = self._slot_view(self.pending_seq % self.num_slots)
+            if not np.may_share_memory(view, frame):
+                np.copyto(view, frame)
+        
+        seq = self.pending_seq
+        if seq is None:
+            raise RuntimeError("commit() without begin_write()")
+        slot = seq % self.num_slots
+        self.timestamps[slot] = time.time() if timestamp is None else timestamp
+        self.capture_times[slot] = time.monotonic() if capture_time is None else capture_time
+        self.header[_HEADER_FIELDS + slot] = seq
+        self.header[0] = seq
+        self.pending_seq = None
+        
+        with self.condition:
+            self.condition.notify_all()
+        return seq
+    
+    def abort(self):
+        """Give up a reserved slot (e.g. the capture read failed)"""
+        self.pending_seq = None
+    
+    def write(self, frame, timestamp=None, capture_time=None):
+        """Copy a frame into the next slot and publish it"""
+        view = self.begin_write(frame.shape)
+        np.copyto(view, frame)
+        return self.commit(timestamp=timestamp, capture_time=capture_time)
+    
+    def read(self, seq, copy=False):
+        """
+        Frame with the given sequence number
+        :param copy: Return a private copy (validated after copying)
+        :return: (frame, timestamp) or None if the frame was never written or already overwritten
+        """
+        if self.frames is None or seq <= 0:
+            return None
+        slot = seq % self.num_slots
+        if self.header[_HEADER_FIELDS + slot] != seq:
+            return None
+        timestamp = float(self.timestamps[slot])
+        frame = self._slot_view(slot)
+        if copy:
+            frame = frame.copy()
+            if not self.is_valid(seq):
+                return None
+        return frame, timestamp
+    
+    def capture_time(self, seq):
+        """Monotonic capture time of frame seq (comparable across processes), or None if overwritten"""
+        if not self.is_valid(seq):
+            return None
+        capture_time = float(self.capture_times[seq % self.num_slots])
+        return capture_time if self.is_valid(seq) else None
+    
+    def is_valid(self, seq):
+        """Whether a previously read view still holds frame seq (check after using a zero-copy view)"""
+        return self.frames is not None and seq > 0 and \
+            self.header[_HEADER_FIELDS + seq % self.num_slots] == seq
+    
+    def latest(self, copy=False):
+        """(frame, timestamp, seq) of the newest frame, or None"""
+        seq = self.latest_seq
+        result = self.read(seq, copy=copy)
+        return None if result is None else result + (seq,)
+    
+    def wait_for(self, seq, timeout=1.0):
+        """Block until frame seq (or newer) is published; returns the latest seq or None on timeout"""
+        deadline = time.time() + timeout
+        while self.latest_seq < seq:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            if self.owner:
+                with self.condition:
+                    if self.latest_seq < seq:
+                        self.condition.wait(remaining)
+            else:
+                # Attached from another process: no shared condition, poll
+                time.sleep(min(0.002, remaining))
+        return self.latest_seq
+    
+    def cursor(self, policy='latest', on_read=None):
+        """New independent reader position on this ring"""
+        return FrameCursor(self, policy, on_read)
+    
+    def close(self):
+        """Release the buffers (the owner also unlinks the shared memory block)"""
+        self.released_seq = self.latest_seq
+        self.header = self.timestamps = self.capture_times = self.frames = None
+        self.pending_seq = None
+        if self.shm is not None:
+            try:
+                self.shm.close()
+            except BufferError:
+                pass  # Views still held by consumers; the mapping goes away with them
+            if self.owner:
+                self.shm.unlink()
+            self.shm = None
+    
+    def _slot_view(self, slot):
+        frame = self.frames[slot]
+        return frame[:, :, 0] if frame.shape[2] == 1 else frame
+    
+    def _stored_shape(self, like_shape):
+        """Shape of the slot views in the layout of like_shape (2D for grayscale frames)"""
+        if self.frames is None:
+            return None
+        shape = self.frames.shape[1:]
+        return shape[:2] if len(like_shape) == 2 and shape[2] == 1 else shape
+
+
+class FrameCursor:
+    """
+    One consumer's position in a FrameRing:
+    - 'latest': always jump to the newest frame (detection, streaming, grid view)
+    - 'sequential': every frame in order while the ring still holds it (recording)
+    """
+    
+    def __init__(self, ring, policy='latest', on_read=None):
+        """
+        :param on_read: Optional callback(dwell_seconds) with the time each returned frame spent in the ring
+        """
+        if policy not in ('latest', 'sequential'):
+            raise ValueError(f"Unknown cursor policy: {policy}")
+        self.ring = ring
+        self.policy = policy
+        self.on_read = on_read
+        self.last_seq = ring.latest_seq if policy == 'latest' else 0
+        self.skipped = 0
+    
+    def pending(self):
+        """Frames published since this cursor's last read (capped at what the ring still holds)"""
+        return min(self.ring.latest_seq - self.last_seq, self.ring.num_slots)
+    
+    def next(self, timeout=1.0, copy=False):
+        """
+        Next frame for this consumer
+        :return: (frame, timestamp, seq) or None on timeout
+        """
+        deadline = time.time() + timeout
+        while True:
+            latest = self.ring.wait_for(self.last_seq + 1, max(deadline - time.time(), 0))
+            if latest is None:
+                return None
+            
+            if self.policy == 'latest':
+                seq = latest
+            else:
+                # Frames older than the ring's capacity are gone: resume at the oldest one kept
+                seq = max(self.last_seq + 1, latest - self.ring.num_slots + 1)
+            
+            result = self.ring.read(seq, copy=copy)
+            self.skipped += max(seq - self.last_seq - 1, 0)
+            self.last_seq = seq
+            if result is not None:
+                if self.on_read is not None:
+                    self.on_read(time.time() - result[1])
+                return result + (seq,)
+            if time.time() >= deadline:
+                return None
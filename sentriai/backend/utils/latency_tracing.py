@@ -0,0 +1,191 @@
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+# Pipeline stages in order; a trace may stop at any of them ('analysis' covers untraced analyze callables)
+STAGES = ('queue', 'detect', 'anomaly', 'risk', 'analysis', 'alert', 'notify')
+
+# Histogram bucket upper bounds in milliseconds (the last bucket is open-ended)
+BUCKET_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (O(1) record, percentiles interpolated within buckets)"""
+    
+    def __init__(self, bounds_ms=BUCKET_BOUNDS_MS):
+        self.bounds = np.asarray(bounds_ms, dtype=np.float64)
+        self.counts = np.zeros(len(self.bounds) + 1, dtype=np.int64)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+    
+    def record(self, seconds):
+        value = max(seconds, 0.0) * 1000
+        self.counts[int(np.searchsorted(self.bounds, value))] += 1
+        self.count += 1
+        self.total_ms += value
+        self.max_ms = max(self.max_ms, value)
+    
+    def percentile(self, point):
+        if not self.count:
+            return None
+        rank = point / 100.0 * self.count
+        cumulative = np.cumsum(self.counts)
+        bucket = int(np.searchsorted(cumulative, rank))
+        lower = self.bounds[bucket - 1] if bucket > 0 else 0.0
+        upper = self.bounds[bucket] if bucket < len(self.bounds) else self.max_ms
+        before = cumulative[bucket - 1] if bucket > 0 else 0
+        fraction = (rank - before) / self.counts[bucket] if self.counts[bucket] else 1.0
+        return round(float(min(lower + fraction * (upper - lower), self.max_ms)), 2)
+    
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total_ms / self.count, 2) if self.count else None,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': round(self.max_ms, 2),
+            'buckets': {f"le_{int(bound)}ms": int(count) for bound, count in zip(self.bounds, self.counts)}
+                       | {'inf': int(self.counts[-1])}
+        }
+
+
+class Trace:
+    """
+    Timing of one frame through the pipeline. Stages are marked in order; each span is the
+    time since the previous mark, starting at the frame's monotonic capture time.
+    """
+    
+    def __init__(self, tracer, camera_id, capture_time=None, seq=None, spans=None, last=None):
+        self.tracer = tracer
+        self.camera_id = camera_id
+        self.seq = seq
+        self.capture_time = time.monotonic() if capture_time is None else capture_time
+        self.spans = dict(spans or {})
+        self.last = self.capture_time if last is None else last
+        self.last_stage = next(reversed(self.spans), None)
+        self.finished = False
+    
+    def mark(self, stage, now=None):
+        """End the current span as stage"""
+        now = time.monotonic() if now is None else now
+        self.spans[stage] = self.spans.get(stage, 0.0) + max(now - self.last, 0.0)
+        self.last = now
+        self.last_stage = stage
+        return self
+    
+    def finish(self):
+        """Record the spans and the end-to-end latency (capture -> last stage) once"""
+        if not self.finished:
+            self.finished = True
+            self.tracer.record_trace(self)
+        return self
+    
+    def to_dict(self):
+        """Serializable form (e.g. to hand a trace from a worker process to the API process)"""
+        return {'camera_id': self.camera_id, 'seq': self.seq, 'capture_time': self.capture_time,
+                'last': self.last, 'spans': self.spans}
+    
+    def summary(self):
+        return {
+            'seq': self.seq,
+            'spans_ms': {stage: round(seconds * 1000, 2) for stage, seconds in self.spans.items()},
+            'end_to_end_ms': round((self.last - self.capture_time) * 1000, 2)
+        }
+
+
+class LatencyTracer:
+    """
+    Per-camera latency histograms:
+    - One histogram per pipeline stage
+    - End-to-end (capture -> last stage reached) per final stage, e.g. 'risk' for frames
+      without an alert and 'notify' for frames that ended in a push notification
+    """
+    
+    def __init__(self, bounds_ms=BUCKET_BOUNDS_MS, recent_size=20):
+        self.bounds_ms = bounds_ms
+        self.lock = threading.Lock()
+        self.stages = defaultdict(dict)       # camera_id -> stage -> histogram
+        self.end_to_end = defaultdict(dict)   # camera_id -> final stage -> histogram
+        self.recent = defaultdict(list)       # camera_id -> latest trace summaries
+        self.recent_size = recent_size
+        self.local = threading.local()
+    
+    def start_trace(self, camera_id, capture_time=None, seq=None):
+        """
+        :param capture_time: time.monotonic() when the frame was captured (FrameRing.capture_time)
+        """
+        return Trace(self, camera_id, capture_time, seq)
+    
+    def current(self):
+        """Trace of the frame being analyzed on this thread (set by the detection scheduler), or None"""
+        return getattr(self.local, 'trace', None)
+    
+    def activate(self, trace):
+        """Make trace the current trace of this thread (None clears it)"""
+        self.local.trace = trace
+    
+    def resume(self, data):
+        """Trace from Trace.to_dict() (monotonic time is system-wide, so spans continue across processes)"""
+        return Trace(self, data['camera_id'], data['capture_time'], data.get('seq'),
+                     data.get('spans'), data.get('last'))
+    
+    def _histogram(self, table, camera_id, key):
+        histogram = table[camera_id].get(key)
+        if histogram is None:
+            histogram = table[camera_id][key] = LatencyHistogram(self.bounds_ms)
+        return histogram
+    
+    def record(self, camera_id, stage, seconds):
+        """Record a single stage duration outside of a trace"""
+        with self.lock:
+            self._histogram(self.stages, camera_id, stage).record(seconds)
+    
+    def record_trace(self, trace):
+        with self.lock:
+            for stage, seconds in trace.spans.items():
+                self._histogram(self.stages, trace.camera_id, stage).record(seconds)
+            final_stage = trace.last_stage or 'capture'
+            self._histogram(self.end_to_end, trace.camera_id, final_stage).record(
+                trace.last - trace.capture_time)
+            recent = self.recent[trace.camera_id]
+            recent.append(trace.summary())
+            del recent[:-self.recent_size]
+    
+    def get_report(self, camera_id=None):
+        """
+        Histograms per camera (or one camera)
+        :return: {camera_id: {'stages': {...}, 'end_to_end': {...}, 'recent': [...]}}
+        """
+        with self.lock:
+            camera_ids = [cid for cid in set(self.stages) | set(self.end_to_end)
+                          if camera_id is None or str(cid) == str(camera_id)]
+            return {
+                cid: {
+                    'stages': {stage: histogram.to_dict() for stage, histogram in
+                               sorted(self.stages[cid].items(), key=lambda item: _stage_order(item[0]))},
+                    'end_to_end': {stage: histogram.to_dict() for stage, histogram in
+                                   sorted(self.end_to_end[cid].items(), key=lambda item: _stage_order(item[0]))},
+                    'recent': list(self.recent[cid])
+                }
+                for cid in camera_ids
+            }
+    
+    def reset(self, camera_id=None):
+        with self.lock:
+            for table in (self.stages, self.end_to_end, self.recent):
+                if camera_id is None:
+                    table.clear()
+                else:
+                    table.pop(camera_id, None)
+
+
+def _stage_order(stage):
+    return STAGES.index(stage) if stage in STAGES else len(STAGES)
+
+
+# Process-wide tracer shared by the pipeline, alerting and the API
+tracer = LatencyTracer()
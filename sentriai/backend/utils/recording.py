@@ -0,0 +1,400 @@
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+WRITER_POLICIES = ('drop_oldest', 'drop_newest', 'block')
+
+
+class AsyncVideoWriter:
+    """
+    cv2.VideoWriter on a dedicated thread:
+    - write() only enqueues, so encoder hiccups or slow disks never stall the caller
+    - start(cursor) feeds it from a 'sequential' FrameRing cursor on its own thread,
+      so the capture thread does no recording work at all
+    - Bounded queue with an explicit policy when it is full:
+      drop_oldest / drop_newest / block (backpressure, bounded by block_timeout).
+      'block' stalls whoever calls write(): fed from a cursor that is the feed thread
+      (frames the ring overwrites meanwhile are skipped), otherwise the caller itself
+    - Encode latency, drops and bytes written are tracked for monitoring
+    """
+    
+    def __init__(self, filename, fourcc, fps, frame_size, queue_size=60, policy='drop_oldest',
+                 block_timeout=0.1):
+        """
+        :param filename: Output file
+        :param fourcc: cv2.VideoWriter_fourcc code
+        :param fps: Output frame rate
+        :param frame_size: (width, height)
+        :param queue_size: Frames that may wait for the encoder
+        :param policy: What write() does when the queue is full (see WRITER_POLICIES)
+        :param block_timeout: Longest time write() blocks with the 'block' policy before dropping
+        """
+        if policy not in WRITER_POLICIES:
+            raise ValueError(f"Unknown writer policy: {policy}")
+        self.filename = filename
+        self.writer = cv2.VideoWriter(filename, fourcc, fps, frame_size)
+        self.queue = deque()
+        self.queue_size = queue_size
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.condition = threading.Condition()
+        
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.encode_ms_avg = 0.0
+        self.encode_ms_max = 0.0
+        self.blocked_ms_total = 0.0
+        
+        self.is_running = self.writer.isOpened()
+        self.cursor = None
+        self.feed_thread = None
+        self.writer_thread = None
+        if self.is_running:
+            self.writer_thread = threading.Thread(target=self._write_loop, daemon=True)
+            self.writer_thread.start()
+    
+    def isOpened(self):
+        return self.is_running
+    
+    def write(self, frame, still_valid=None):
+        """
+        Queue a frame for encoding (copied once the queue policy has let it in, so ring views may be passed)
+        :param still_valid: Optional callable checked after copying a zero-copy ring view;
+                            the frame is dropped if the slot was overwritten meanwhile
+        :return: True if queued, False if dropped
+        """
+        if not self.is_running:
+            return False
+        with self.condition:
+            if len(self.queue) >= self.queue_size:
+                if self.policy == 'drop_newest':
+                    self.frames_dropped += 1
+                    return False
+                if self.policy == 'block':
+                    start_time = time.time()
+                    self.condition.wait_for(lambda: len(self.queue) < self.queue_size or not self.is_running,
+                                            self.block_timeout)
+                    self.blocked_ms_total += (time.time() - start_time) * 1000
+                    if len(self.queue) >= self.queue_size:
+                        self.frames_dropped += 1
+                        return False
+        
+        frame = frame.copy()
+        if still_valid is not None and not still_valid():
+            with self.condition:
+                self.frames_dropped += 1
+            return False
+        with self.condition:
+            if len(self.queue) >= self.queue_size:
+                # Only reached with drop_oldest, or if another writer filled the queue meanwhile
+                self.queue.popleft()
+                self.frames_dropped += 1
+            self.queue.append(frame)
+            self.condition.notify_all()
+        return True
+    
+    def start(self, cursor):
+        """Feed the writer from a FrameRing cursor ('sequential' to keep every frame) in a background thread"""
+        if not self.is_running or self.feed_thread is not None:
+            return
+        self.cursor = cursor
+        self.feed_thread = threading.Thread(target=self._feed_loop, args=(cursor,), daemon=True)
+        self.feed_thread.start()
+    
+    def _feed_loop(self, cursor):
+        while self.is_running:
+            result = cursor.next(timeout=0.5)
+            if result is None:
+                continue
+            frame, _, seq = result
+            try:
+                self.write(frame, still_valid=lambda: cursor.ring.is_valid(seq))
+            except Exception as e:
+                print(f"❌ Recording feed error: {str(e)}")
+    
+    def _write_loop(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.queue or not self.is_running)
+                if not self.queue:
+                    return
+                frame = self.queue.popleft()
+                self.condition.notify_all()
+            
+            start_time = time.time()
+            try:
+                self.writer.write(frame)
+            except Exception as e:
+                with self.condition:
+                    self.frames_dropped += 1  # Queued but never written
+                print(f"❌ Recording encode error: {str(e)}")
+                continue
+            encode_ms = (time.time() - start_time) * 1000
+            self.encode_ms_avg += 0.1 * (encode_ms - self.encode_ms_avg) if self.frames_written else encode_ms
+            self.encode_ms_max = max(self.encode_ms_max, encode_ms)
+            self.frames_written += 1
+    
+    def release(self, timeout=10.0):
+        """Encode what is still queued, then close the file"""
+        with self.condition:
+            self.is_running = False
+            self.condition.notify_all()
+        if self.feed_thread:
+            self.feed_thread.join(timeout=2)
+        if self.writer_thread:
+            self.writer_thread.join(timeout=timeout)
+        self.writer.release()
+    
+    def get_stats(self):
+        bytes_written = os.path.getsize(self.filename) if os.path.exists(self.filename) else 0
+        return {
+            'filename': self.filename,
+            'policy': self.policy,
+            'queue_depth': len(self.queue),
+            'frames_written': self.frames_written,
+            'frames_dropped': self.frames_dropped,
+            'frames_skipped': self.cursor.skipped if self.cursor else 0,
+            'encode_ms_avg': round(self.encode_ms_avg, 2),
+            'encode_ms_max': round(self.encode_ms_max, 2),
+            'blocked_ms_total': round(self.blocked_ms_total, 1),
+            'bytes_written': bytes_written
+        }
+
+
+class PreEventBuffer:
+    """
+    Incident recording without continuous disk writes:
+    - Keeps the last pre_seconds of frames as JPEG in a bounded in-memory buffer
+    - trigger() turns the buffer into a clip: pre-roll + post_seconds of post-roll
+    - Clips are written to disk in a background thread once the post-roll is complete
+    - A long incident (re-triggered over and over) is split into clips of at most
+      max_clip_seconds / max_bytes, so memory stays bounded
+    """
+    
+    def __init__(self, pre_seconds=10.0, post_seconds=5.0, fps=10.0, quality=80,
+                 max_bytes=64 * 1024 * 1024, output_dir="recordings", name="camera", on_clip=None,
+                 max_clip_seconds=120.0):
+        """
+        :param pre_seconds: Footage kept before a trigger
+        :param post_seconds: Footage recorded after the (last) trigger
+        :param fps: Buffered frame rate (frames arriving faster are dropped)
+        :param quality: JPEG quality of buffered frames
+        :param max_bytes: Hard bound on buffered JPEG bytes (oldest frames evicted first)
+        :param output_dir: Directory for finished clips
+        :param name: Camera name used in clip filenames
+        :param on_clip: Optional callback(clip_info) when a clip has been written
+        :param max_clip_seconds: Longest clip; a longer incident continues in a new clip
+        """
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.frame_interval = 1.0 / fps if fps else 0.0
+        self.fps = fps
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.output_dir = output_dir
+        self.name = name
+        self.on_clip = on_clip
+        self.max_clip_seconds = max_clip_seconds
+        
+        self.frames = deque()  # (timestamp, jpeg bytes)
+        self.buffered_bytes = 0
+        self.last_added = 0.0
+        self.incident = None
+        self.clips = deque(maxlen=50)
+        self.lock = threading.Lock()
+        self.stats = {'frames_buffered': 0, 'frames_evicted': 0, 'clips_written': 0, 'encode_ms_total': 0.0}
+        
+        self.is_running = False
+        self.feed_thread = None
+    
+    def add(self, frame, timestamp=None, still_valid=None):
+        """
+        Buffer one frame (rate-limited to fps)
+        :param still_valid: Optional callable checked after encoding a zero-copy ring view;
+                            the frame is discarded if the slot was overwritten meanwhile
+        :return: True if the frame was stored
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        if timestamp - self.last_added < self.frame_interval:
+            self._finish_incident_if_due(timestamp)
+            return False
+        
+        start_time = time.time()
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok or (still_valid is not None and not still_valid()):
+            return False
+        jpeg = buffer.tobytes()
+        self.stats['encode_ms_total'] += (time.time() - start_time) * 1000
+        self.last_added = timestamp
+        
+        with self.lock:
+            self.frames.append((timestamp, jpeg))
+            self.buffered_bytes += len(jpeg)
+            self.stats['frames_buffered'] += 1
+            full = None
+            if self.incident is not None:
+                self.incident['frames'].append((timestamp, jpeg))
+                self.incident['bytes'] += len(jpeg)
+                full = self._split_incident_if_full(timestamp)
+            self._evict(timestamp)
+        if full is not None:
+            threading.Thread(target=self._write_clip, args=(full,), daemon=True).start()
+        self._finish_incident_if_due(timestamp)
+        return True
+    
+    def trigger(self, reason="alert", timestamp=None):
+        """
+        Start (or extend) an incident clip
+        :return: Path the clip will be written to
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            if self.incident is not None:
+                # Re-triggered during the post-roll: keep one clip, extend it
+                self.incident['until'] = timestamp + self.post_seconds
+                self.incident['reasons'].append(reason)
+                return self.incident['path']
+            
+            frames = [f for f in self.frames if f[0] >= timestamp - self.pre_seconds]
+            self.incident = self._new_incident([reason], timestamp, timestamp + self.post_seconds, frames)
+            path = self.incident['path']
+        print(f"🔴 {self.name}: incident clip started ({reason})")
+        return path
+    
+    def _new_incident(self, reasons, triggered_at, until, frames, part=1):
+        stamp = datetime.fromtimestamp(triggered_at).strftime("%Y%m%d_%H%M%S")
+        suffix = f"_part{part}" if part > 1 else ""
+        return {
+            'path': os.path.join(self.output_dir, f"incident_{self.name}_{stamp}{suffix}.mp4"),
+            'reasons': reasons,
+            'triggered_at': triggered_at,
+            'until': until,
+            'frames': frames,
+            'bytes': sum(len(jpeg) for _, jpeg in frames),
+            'part': part
+        }
+    
+    def _split_incident_if_full(self, now):
+        """
+        Close the current clip once it reaches max_clip_seconds or max_bytes; the incident
+        continues in a new part (lock held)
+        :return: The closed incident to write, or None
+        """
+        incident = self.incident
+        frames = incident['frames']
+        too_long = self.max_clip_seconds and now - frames[0][0] >= self.max_clip_seconds
+        if not too_long and incident['bytes'] <= self.max_bytes:
+            return None
+        self.incident = self._new_incident(list(incident['reasons']), incident['triggered_at'], incident['until'],
+                                           [], incident['part'] + 1)
+        return incident
+    
+    def _evict(self, now):
+        """Drop frames older than the pre-roll window or beyond the byte budget (lock held)"""
+        while self.frames and (self.frames[0][0] < now - self.pre_seconds or
+                               self.buffered_bytes > self.max_bytes):
+            _, jpeg = self.frames.popleft()
+            self.buffered_bytes -= len(jpeg)
+            self.stats['frames_evicted'] += 1
+    
+    def _finish_incident_if_due(self, now):
+        with self.lock:
+            if self.incident is None or now < self.incident['until']:
+                return
+            incident = self.incident
+            self.incident = None
+        threading.Thread(target=self._write_clip, args=(incident,), daemon=True).start()
+    
+    def flush(self):
+        """Write the current incident immediately (e.g. on shutdown)"""
+        with self.lock:
+            incident = self.incident
+            self.incident = None
+        if incident is not None:
+            self._write_clip(incident)
+    
+    def _write_clip(self, incident):
+        """Decode the buffered JPEGs and write them as one video file"""
+        frames = incident['frames']
+        info = {
+            'path': incident['path'],
+            'reasons': incident['reasons'],
+            'part': incident['part'],
+            'triggered_at': incident['triggered_at'],
+            'frames': len(frames),
+            'start': frames[0][0] if frames else None,
+            'end': frames[-1][0] if frames else None,
+            'status': 'empty'
+        }
+        if frames:
+            try:
+                os.makedirs(os.path.dirname(incident['path']) or '.', exist_ok=True)
+                first = cv2.imdecode(np.frombuffer(frames[0][1], np.uint8), cv2.IMREAD_COLOR)
+                height, width = first.shape[:2]
+                writer = cv2.VideoWriter(incident['path'], cv2.VideoWriter_fourcc(*'mp4v'),
+                                         self._clip_fps(frames), (width, height))
+                for _, jpeg in frames:
+                    writer.write(cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR))
+                writer.release()
+                info['status'] = 'written'
+                self.stats['clips_written'] += 1
+                print(f"💾 {self.name}: incident clip saved {incident['path']} ({len(frames)} frames)")
+            except Exception as e:
+                info['status'] = f"error: {str(e)}"
+                print(f"❌ {self.name}: failed to write incident clip: {str(e)}")
+        
+        self.clips.append(info)
+        if self.on_clip:
+            self.on_clip(info)
+        return info
+    
+    def _clip_fps(self, frames):
+        """Frame rate the frames were actually buffered at (the configured fps is only an upper bound)"""
+        span = frames[-1][0] - frames[0][0]
+        if len(frames) > 1 and span > 0:
+            return (len(frames) - 1) / span
+        return self.fps or 10
+    
+    def start(self, cursor):
+        """Feed the buffer from a FrameRing cursor in a background thread"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self.feed_thread = threading.Thread(target=self._feed_loop, args=(cursor,), daemon=True)
+        self.feed_thread.start()
+    
+    def stop(self):
+        self.is_running = False
+        if self.feed_thread:
+            self.feed_thread.join(timeout=2)
+        self.flush()
+    
+    def _feed_loop(self, cursor):
+        while self.is_running:
+            result = cursor.next(timeout=0.5)
+            if result is None:
+                self._finish_incident_if_due(time.time())
+                continue
+            frame, timestamp, seq = result
+            try:
+                self.add(frame, timestamp, still_valid=lambda: cursor.ring.is_valid(seq))
+            except Exception as e:
+                print(f"❌ {self.name}: pre-event buffer error: {str(e)}")
+    
+    def get_stats(self):
+        buffered = self.stats['frames_buffered']
+        return {
+            'buffered_frames': len(self.frames),
+            'buffered_bytes': self.buffered_bytes,
+            'buffered_seconds': round(self.frames[-1][0] - self.frames[0][0], 2) if self.frames else 0.0,
+            'incident_active': self.incident is not None,
+            'clips_written': self.stats['clips_written'],
+            'frames_evicted': self.stats['frames_evicted'],
+            'avg_encode_ms': round(self.stats['encode_ms_total'] / buffered, 2) if buffered else 0.0,
+            'recent_clips': list(self.clips)[-5:]
+        }
@@ -0,0 +1,340 @@
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Stream defaults (settings.STREAM_JPEG_QUALITY / STREAM_MAX_FPS / STREAM_WIDTH)
+STREAM_JPEG_QUALITY = int(os.getenv("STREAM_JPEG_QUALITY", "75"))
+STREAM_MAX_FPS = float(os.getenv("STREAM_MAX_FPS", "10"))
+STREAM_WIDTH = int(os.getenv("STREAM_WIDTH", "0"))  # 0 = native width
+
+BOUNDARY = "frame"
+MIMETYPE = f"multipart/x-mixed-replace; boundary={BOUNDARY}"
+
+
+class MJPEGBroadcaster:
+    """
+    Encode-once MJPEG fan-out for one camera:
+    - One encoder thread turns new frames into JPEG at a fixed quality/size and max_fps
+    - Every viewer gets the same pre-built multipart chunk (no per-viewer encode or copy)
+    - Viewers are rate-capped individually and always skip to the newest frame
+    - The encoder only runs while someone is watching
+    """
+    
+    def __init__(self, source, quality=STREAM_JPEG_QUALITY, width=STREAM_WIDTH, max_fps=STREAM_MAX_FPS,
+                 name="camera", idle_timeout=5.0):
+        """
+        :param source: FrameCursor ('latest' policy) of the camera ring, or a callable returning a frame or None
+        :param quality: JPEG quality
+        :param width: Output width (aspect ratio kept, 0 = native)
+        :param max_fps: Highest encode rate (and highest rate any viewer can get)
+        :param name: Camera name for logging
+        :param idle_timeout: Seconds without viewers before the encoder thread stops
+        """
+        self.source = source
+        self.quality = quality
+        self.width = width
+        self.max_fps = max_fps
+        self.name = name
+        self.idle_timeout = idle_timeout
+        
+        self.condition = threading.Condition()
+        self.chunk = None       # multipart chunk of the newest frame
+        self.jpeg = None        # newest JPEG bytes
+        self.frame_id = 0
+        self.viewers = 0
+        self.last_activity = 0.0
+        
+        self.frames_encoded = 0
+        self.encode_ms_total = 0.0
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        
+        self.is_running = False
+        self.encoder_thread = None
+    
+    def _ensure_encoder(self):
+        with self.condition:
+            if self.is_running:
+                return
+            self.is_running = True
+        self.encoder_thread = threading.Thread(target=self._encode_loop, daemon=True)
+        self.encoder_thread.start()
+    
+    def _next_frame(self, timeout):
+        """Newest frame from the source, or None; the returned check tells if a ring view is still valid"""
+        if hasattr(self.source, 'next'):
+            result = self.source.next(timeout=timeout)
+            if result is None:
+                return None, None
+            frame, _, seq = result
+            return frame, lambda: self.source.ring.is_valid(seq)
+        
+        frame = self.source()
+        if frame is None:
+            time.sleep(min(timeout, 1.0 / self.max_fps) if self.max_fps else timeout)
+        return frame, None
+    
+    def _encode_loop(self):
+        interval = 1.0 / self.max_fps if self.max_fps else 0.0
+        last_encode = 0.0
+        while self.is_running:
+            with self.condition:
+                if self.viewers == 0 and time.time() - self.last_activity > self.idle_timeout:
+                    self.is_running = False
+                    self.condition.notify_all()
+                    break
+            
+            wait = last_encode + interval - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                frame, still_valid = self._next_frame(timeout=0.5)
+                if frame is None:
+                    continue
+                start_time = time.time()
+                jpeg = self.encode(frame)
+                if jpeg is None or (still_valid is not None and not still_valid()):
+                    continue  # Slot overwritten while encoding; take the next frame
+            except Exception as e:
+                print(f"❌ {self.name}: stream encode error: {str(e)}")
+                time.sleep(0.1)
+                continue
+            
+            last_encode = time.time()
+            self.encode_ms_total += (last_encode - start_time) * 1000
+            self.frames_encoded += 1
+            chunk = (f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                     f"Content-Length: {len(jpeg)}\r\n\r\n").encode() + jpeg + b"\r\n"
+            with self.condition:
+                self.jpeg = jpeg
+                self.chunk = chunk
+                self.frame_id += 1
+                self.condition.notify_all()
+    
+    def encode(self, frame):
+        """JPEG bytes of a frame at the stream size and quality"""
+        if self.width and frame.shape[1] != self.width:
+            height = int(round(frame.shape[0] * self.width / frame.shape[1]))
+            frame = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        return buffer.tobytes() if ok else None
+    
+    def stream(self, max_fps=None, timeout=10.0):
+        """
+        Multipart chunks for one viewer (use as the body of a streaming response)
+        :param max_fps: This viewer's rate cap (bounded by the broadcaster's max_fps)
+        :param timeout: Give up when no new frame arrives for this long
+        """
+        max_fps = min(max_fps or self.max_fps, self.max_fps) if self.max_fps else max_fps
+        interval = 1.0 / max_fps if max_fps else 0.0
+        
+        with self.condition:
+            self.viewers += 1
+        self._ensure_encoder()
+        try:
+            last_id = 0
+            while True:
+                with self.condition:
+                    if not self.condition.wait_for(lambda: self.frame_id != last_id or not self.is_running,
+                                                   timeout):
+                        return
+                    if self.frame_id == last_id:
+                        return
+                    last_id = self.frame_id
+                    chunk = self.chunk
+                    self.frames_sent += 1
+                    self.bytes_sent += len(chunk)
+                
+                sent_at = time.time()
+                yield chunk
+                # Per-viewer rate cap: frames published meanwhile are skipped, not queued
+                wait = sent_at + interval - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+        finally:
+            with self.condition:
+                self.viewers -= 1
+                self.last_activity = time.time()
+    
+    def snapshot(self, timeout=2.0):
+        """
+        Newest encoded JPEG (shared with the stream viewers), or None
+        :param timeout: Longest wait for a fresh frame when the encoder had idled out
+        """
+        with self.condition:
+            self.last_activity = time.time()  # Keeps the encoder warm for polling clients
+            restarted = not self.is_running
+            last_id = self.frame_id
+        self._ensure_encoder()
+        with self.condition:
+            if restarted:
+                # The cached JPEG dates from before the encoder stopped; wait for a new one
+                self.condition.wait_for(lambda: self.frame_id != last_id, timeout)
+            else:
+                self.condition.wait_for(lambda: self.jpeg is not None, timeout)
+            return self.jpeg
+    
+    def stop(self):
+        self.is_running = False
+        if self.encoder_thread:
+            self.encoder_thread.join(timeout=2)
+        with self.condition:
+            self.condition.notify_all()
+    
+    def get_stats(self):
+        return {
+            'viewers': self.viewers,
+            'encoding': self.is_running,
+            'frames_encoded': self.frames_encoded,
+            'avg_encode_ms': round(self.encode_ms_total / self.frames_encoded, 2) if self.frames_encoded else 0.0,
+            'frames_sent': self.frames_sent,
+            'bytes_sent': self.bytes_sent,
+            'jpeg_bytes': len(self.jpeg) if self.jpeg else 0,
+            'quality': self.quality,
+            'width': self.width,
+            'max_fps': self.max_fps
+        }
+
+
+class GridCompositor:
+    """
+    Long-lived wall view of several cameras:
+    - One preallocated canvas; frames are resized straight into their tile (cv2.resize dst)
+    - Only tiles with a new frame are redrawn, label bars only when their text changes
+    - Rendering is rate-capped; poll() returns None when nothing changed (nothing to encode)
+    """
+    
+    def __init__(self, sources=None, labels=None, tile_size=(640, 480), max_cols=2, max_fps=5.0,
+                 label_height=28):
+        """
+        :param sources: {camera_id: FrameCursor or callable returning a new frame or None (= unchanged)}
+        :param labels: Optional callable(camera_id) returning the tile label (defaults to the camera id)
+        :param tile_size: (width, height) of each tile including its label bar
+        :param max_cols: Maximum columns in grid
+        :param max_fps: Highest render rate
+        :param label_height: Height of the label bar above each tile's video
+        """
+        self.sources = dict(sources or {})
+        self.labels = labels
+        self.tile_size = tile_size
+        self.max_cols = max_cols
+        self.max_fps = max_fps
+        self.label_height = label_height
+        self.lock = threading.Lock()
+        
+        self.canvas = None
+        self.layout = None      # camera ids in tile order
+        self.tile_labels = {}   # camera_id -> label currently drawn
+        self.last_render = 0.0
+        self.changed = False
+        self.stats = {'renders': 0, 'tiles_drawn': 0, 'labels_drawn': 0, 'render_ms_total': 0.0}
+    
+    def add_source(self, camera_id, source):
+        with self.lock:
+            self.sources[camera_id] = source
+    
+    def remove_source(self, camera_id):
+        with self.lock:
+            self.sources.pop(camera_id, None)
+    
+    def _allocate(self, camera_ids):
+        """Canvas for the current camera set (only reallocated when cameras are added or removed)"""
+        cols = max(min(len(camera_ids), self.max_cols), 1)
+        rows = max((len(camera_ids) + cols - 1) // cols, 1)
+        width, height = self.tile_size
+        self.canvas = np.zeros((height * rows, width * cols, 3), dtype=np.uint8)
+        self.layout = camera_ids
+        self.tile_labels = {}
+        self.changed = True
+    
+    def _tile(self, index):
+        """(label bar view, video view) of a tile"""
+        cols = self.canvas.shape[1] // self.tile_size[0]
+        width, height = self.tile_size
+        y, x = (index // cols) * height, (index % cols) * width
+        return (self.canvas[y:y + self.label_height, x:x + width],
+                self.canvas[y + self.label_height:y + height, x:x + width])
+    
+    def _draw_label(self, bar, text):
+        bar[:] = (32, 32, 32)
+        cv2.putText(bar, text, (8, self.label_height - 9), cv2.FONT_HERSHEY_SIMPLEX, 0.6,
+                    (255, 255, 255), 1, cv2.LINE_AA)
+        self.stats['labels_drawn'] += 1
+    
+    def _draw_frame(self, video, source):
+        """Resize the source's new frame (if any) into its tile; returns whether it was drawn"""
+        if hasattr(source, 'next'):
+            result = source.next(timeout=0)
+            if result is None:
+                return False
+            frame, _, seq = result
+        else:
+            frame, seq = source(), None
+            if frame is None:
+                return False
+        
+        if frame.ndim == 2:
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        cv2.resize(frame, (video.shape[1], video.shape[0]), dst=video, interpolation=cv2.INTER_AREA)
+        if seq is not None and not source.ring.is_valid(seq):
+            # Overwritten while resizing: redraw from the newer frame next render
+            source.last_seq = seq - 1
+        return True
+    
+    def render(self, force=False):
+        """
+        Update the canvas (at most max_fps times per second)
+        :return: The shared canvas (do not modify), or None without cameras
+        """
+        if not force and self.max_fps and time.time() - self.last_render < 1.0 / self.max_fps:
+            return self.canvas
+        
+        start_time = time.time()
+        with self.lock:
+            camera_ids = list(self.sources.keys())
+            if not camera_ids:
+                return None
+            if camera_ids != self.layout:
+                self._allocate(camera_ids)
+            
+            for index, camera_id in enumerate(camera_ids):
+                bar, video = self._tile(index)
+                label = str(self.labels(camera_id) if self.labels else camera_id)
+                if self.tile_labels.get(camera_id) != label:
+                    self._draw_label(bar, label)
+                    self.tile_labels[camera_id] = label
+                    self.changed = True
+                try:
+                    if self._draw_frame(video, self.sources[camera_id]):
+                        self.stats['tiles_drawn'] += 1
+                        self.changed = True
+                except Exception as e:
+                    print(f"❌ Grid tile error for {camera_id}: {str(e)}")
+        
+        self.last_render = time.time()
+        self.stats['renders'] += 1
+        self.stats['render_ms_total'] += (self.last_render - start_time) * 1000
+        return self.canvas
+    
+    def poll(self):
+        """Canvas if it changed since the last poll, else None (use as a broadcaster source)"""
+        canvas = self.render()
+        if canvas is None or not self.changed:
+            return None
+        self.changed = False
+        return canvas
+    
+    def get_stats(self):
+        renders = self.stats['renders']
+        return {
+            'cameras': len(self.sources),
+            'canvas_shape': None if self.canvas is None else list(self.canvas.shape),
+            'renders': renders,
+            'tiles_drawn': self.stats['tiles_drawn'],
+            'labels_drawn': self.stats['labels_drawn'],
+            'avg_render_ms': round(self.stats['render_ms_total'] / renders, 2) if renders else 0.0,
+            'max_fps': self.max_fps
+        }
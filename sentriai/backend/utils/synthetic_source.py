@@ -0,0 +1,222 @@
+import time
+import zlib
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+
+SYNTHETIC_SCHEME = 'synthetic'
+
+
+def _parse_bool(value):
+    return value.lower() not in ('0', 'false', 'no', 'off')
+
+
+# Query options of a synthetic:// source and their types
+SYNTHETIC_OPTIONS = {
+    'width': int,
+    'height': int,
+    'fps': float,
+    'people': int,
+    'seed': int,
+    'speed': float,
+    'frames': int,
+    'noise': float,
+    'realtime': _parse_bool
+}
+
+
+def is_synthetic_source(source):
+    return isinstance(source, str) and source.startswith(f"{SYNTHETIC_SCHEME}://")
+
+
+def parse_synthetic_url(url):
+    """
+    synthetic://<name>?width=640&height=480&fps=15&people=20 -> SyntheticCapture options
+    Without a seed, the name picks one, so differently named cameras show different scenes.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme != SYNTHETIC_SCHEME:
+        raise ValueError(f"Not a synthetic source: {url}")
+    options = {'seed': zlib.crc32(parsed.netloc.encode())}
+    for key, values in parse_qs(parsed.query).items():
+        if key not in SYNTHETIC_OPTIONS:
+            raise ValueError(f"Unknown synthetic source option: {key}")
+        options[key] = SYNTHETIC_OPTIONS[key](values[-1])
+    return options
+
+
+class SyntheticCapture:
+    """
+    cv2.VideoCapture-compatible source that renders a scene procedurally, for load testing
+    without real cameras:
+    - Static background (ground, buildings) with person-like figures (body, head, legs)
+      walking around and bouncing off the edges, as in test_crowd_detector.create_test_scene
+    - Deterministic per seed; figures move in simulation time (1 / fps per frame)
+    - Paced to the frame rate like a live camera (realtime=False renders as fast as possible)
+    - Frames are drawn straight into the caller's buffer (e.g. a ring slot); grab() only
+      advances the simulation, like a skipped frame that is never decoded
+    """
+    
+    def __init__(self, width=640, height=480, fps=15.0, people=8, seed=0, speed=40.0, frames=0,
+                 noise=0.0, realtime=True):
+        """
+        :param width: Frame width
+        :param height: Frame height
+        :param fps: Frame rate
+        :param people: Number of moving figures
+        :param seed: Random seed for the scene layout and motion
+        :param speed: Mean walking speed in pixels per second (at 480 lines)
+        :param frames: Stream length in frames, 0 = endless
+        :param noise: Sensor noise standard deviation (0 = clean frames)
+        :param realtime: Pace reads to the frame rate
+        """
+        if width <= 0 or height <= 0 or fps <= 0 or people < 0:
+            raise ValueError("Synthetic source needs a positive size and frame rate")
+        self.width = int(width)
+        self.height = int(height)
+        self.fps = float(fps)
+        self.people = int(people)
+        self.frames = int(frames)
+        self.realtime = realtime
+        self.rng = np.random.default_rng(seed)
+        
+        scale = self.height / 480
+        self.body_size = (max(int(30 * scale), 3), max(int(60 * scale), 6))
+        self.head_radius = max(int(10 * scale), 2)
+        self.leg_length = max(int(20 * scale), 2)
+        self.background = self._render_background()
+        self.noise_frames = self._render_noise(noise) if noise > 0 else None
+        
+        # Figures walk on the lower part of the scene (top-left corner of the body)
+        body_w, body_h = self.body_size
+        self.bounds_low = np.array([0.0, 0.4 * self.height + self.head_radius])
+        self.bounds_high = np.array([self.width - body_w - 1.0, self.height - body_h - self.leg_length - 1.0])
+        self.bounds_high = np.maximum(self.bounds_high, self.bounds_low)
+        self.positions = self.rng.uniform(self.bounds_low, self.bounds_high, size=(self.people, 2))
+        headings = self.rng.uniform(0, 2 * np.pi, self.people)
+        speeds = self.rng.uniform(0.5, 1.5, self.people) * speed * scale
+        self.velocities = np.stack([np.cos(headings), np.sin(headings)], axis=1) * speeds[:, None]
+        self.shades = self.rng.integers(30, 90, self.people)
+        
+        self.buffer = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self.opened = True
+        self.frames_read = 0
+        self.next_frame_time = None
+        self.render_time = 0.0
+    
+    @classmethod
+    def from_url(cls, url, **defaults):
+        """SyntheticCapture for a synthetic:// URL (URL options override defaults)"""
+        return cls(**{**defaults, **parse_synthetic_url(url)})
+    
+    def _render_background(self):
+        sx, sy = self.width / 640, self.height / 480
+        
+        def point(x, y):
+            return int(x * sx), int(y * sy)
+        
+        background = np.full((self.height, self.width, 3), 255, dtype=np.uint8)
+        cv2.rectangle(background, point(0, 380), point(640, 480), (120, 120, 120), -1)  # Ground
+        for _ in range(int(self.rng.integers(2, 5))):
+            x = self.rng.uniform(0, 560)
+            top = self.rng.uniform(30, 150)
+            shade = int(self.rng.integers(170, 215))
+            cv2.rectangle(background, point(x, top), point(x + self.rng.uniform(60, 120), 300),
+                          (shade, shade, shade), -1)  # Building
+        return background
+    
+    def _render_noise(self, sigma):
+        """A few precomputed noise patterns (positive and negative parts), cycled per frame"""
+        patterns = []
+        for _ in range(4):
+            noise = self.rng.normal(0, sigma, (self.height, self.width, 3))
+            patterns.append((np.clip(noise, 0, 255).astype(np.uint8), np.clip(-noise, 0, 255).astype(np.uint8)))
+        return patterns
+    
+    def _pace(self):
+        """Sleep until the next frame is due; a late reader skips ahead instead of bursting"""
+        if not self.realtime:
+            return
+        period = 1.0 / self.fps
+        now = time.monotonic()
+        if self.next_frame_time is None or now - self.next_frame_time > period:
+            self.next_frame_time = now
+        elif self.next_frame_time > now:
+            time.sleep(self.next_frame_time - now)
+        self.next_frame_time += period
+    
+    def _step(self):
+        """Advance the figures by one frame, bouncing off the walkable area"""
+        if not self.people:
+            return
+        self.positions += self.velocities / self.fps
+        low, high = self.positions < self.bounds_low, self.positions > self.bounds_high
+        self.velocities[low | high] *= -1
+        np.clip(self.positions, self.bounds_low, self.bounds_high, out=self.positions)
+    
+    def _draw(self, target):
+        np.copyto(target, self.background)
+        body_w, body_h = self.body_size
+        # Draw back to front so nearer figures overlap farther ones
+        for index in np.argsort(self.positions[:, 1]):
+            x, y = int(self.positions[index, 0]), int(self.positions[index, 1])
+            shade = int(self.shades[index])
+            color = (shade, shade, shade)
+            cv2.rectangle(target, (x, y), (x + body_w, y + body_h), color, -1)  # Body
+            cv2.circle(target, (x + body_w // 2, y - self.head_radius // 2), self.head_radius, color, -1)  # Head
+            cv2.line(target, (x + body_w // 2, y + body_h), (x + body_w // 2, y + body_h + self.leg_length),
+                     color, 2)  # Legs
+        if self.noise_frames is not None:
+            positive, negative = self.noise_frames[self.frames_read % len(self.noise_frames)]
+            cv2.add(target, positive, dst=target)
+            cv2.subtract(target, negative, dst=target)
+    
+    def _next(self):
+        if not self.opened or (self.frames and self.frames_read >= self.frames):
+            return False
+        self._pace()
+        self._step()
+        self.frames_read += 1
+        return True
+    
+    def isOpened(self):
+        return self.opened
+    
+    def read(self, image=None):
+        """
+        Next frame
+        :param image: Optional preallocated buffer of the frame shape (e.g. a ring slot) to draw into
+        :return: (ret, frame)
+        """
+        if not self._next():
+            return False, None
+        target = image if (image is not None and image.shape == self.buffer.shape and
+                           image.dtype == np.uint8) else self.buffer
+        start_time = time.perf_counter()
+        self._draw(target)
+        self.render_time += time.perf_counter() - start_time
+        return True, target
+    
+    def grab(self):
+        """Skip a frame (the simulation advances, nothing is drawn)"""
+        return self._next()
+    
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.frames_read)
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.frames)
+        return 0.0
+    
+    def set(self, prop, value):
+        return False  # The scene is fixed when the source is created
+    
+    def release(self):
+        self.opened = False
@@ -1,11 +1,157 @@
 import cv2
 import numpy as np
+import math
+import os
 from datetime import datetime
 import threading
-import queue
 import time
+import weakref
 from collections import deque
 import base64
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.ffmpeg_capture import FFmpegCapture
+from utils.synthetic_source import SyntheticCapture, is_synthetic_source
+from utils.frame_ring import FrameRing
+from utils.recording import AsyncVideoWriter, PreEventBuffer
+from utils.streaming import GridCompositor, MJPEGBroadcaster
+
+# Minimum number of captured frames per analyzed frame (settings.FRAME_SKIP)
+FRAME_SKIP = int(os.getenv("FRAME_SKIP", "3"))
+
+# Connection handling (settings.CAMERA_RECONNECT_ATTEMPTS / settings.CAMERA_TIMEOUT)
+CAMERA_RECONNECT_ATTEMPTS = int(os.getenv("CAMERA_RECONNECT_ATTEMPTS", "3"))
+CAMERA_TIMEOUT = float(os.getenv("CAMERA_TIMEOUT", "10"))
+
+# Decode backend: 'opencv' (cv2.VideoCapture) or 'ffmpeg' (subprocess, scaled raw frames over a pipe)
+CAPTURE_BACKEND = os.getenv("CAPTURE_BACKEND", "opencv")
+
+# Denoise tiers from cheapest to most expensive ('nlm' is offline-only, hundreds of ms per frame)
+DENOISE_TIERS = ('none', 'median', 'bilateral', 'temporal', 'nlm')
+
+
+class RateMeter:
+    """
+    Measured events per second over a short window.
+    Ticks are serialized by a lock (analysis results may arrive on any worker thread);
+    readers only see plain numbers and take no lock.
+    """
+    
+    def __init__(self, window=2.0):
+        self.lock = threading.Lock()
+        self.window = window
+        self.count = 0
+        self.rate = 0.0
+        self.window_start = time.time()
+        self.window_count = 0
+    
+    def tick(self, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            self.count += 1
+            self.window_count += 1
+            elapsed = now - self.window_start
+            if elapsed >= self.window:
+                self.rate = self.window_count / elapsed
+                self.window_start = now
+                self.window_count = 0
+    
+    def get_rate(self, now=None):
+        """Rate of the last full window (decays when events stop arriving)"""
+        elapsed = (time.time() if now is None else now) - self.window_start
+        if elapsed >= self.window or (self.count == self.window_count and elapsed > 0):
+            # Stale or still in the very first window: use the current partial window
+            return self.window_count / elapsed
+        return self.rate
+
+
+class SampleWindow:
+    """
+    Fixed-size ring of the latest samples for percentiles (preallocated).
+    Every consumer's cursor thread adds dwell times, so writes and reads take a lock.
+    """
+    
+    def __init__(self, size=512):
+        self.lock = threading.Lock()
+        self.samples = np.zeros(size)
+        self.count = 0
+    
+    def add(self, value):
+        with self.lock:
+            self.samples[self.count % len(self.samples)] = value
+            self.count += 1
+    
+    def percentiles(self, points=(50, 95, 99), scale=1000.0):
+        """Percentiles of the kept samples (milliseconds by default)"""
+        with self.lock:
+            kept = self.samples[:min(self.count, len(self.samples))].copy()
+        if not len(kept):
+            return {f"p{p}": None for p in points}
+        values = np.percentile(kept, points) * scale
+        return {f"p{p}": round(float(v), 2) for p, v in zip(points, values)}
+
+
+class AnalysisRateController:
+    """
+    Picks the analysis rate of a camera (how many captured frames per analyzed frame):
+    - Never analyzes more than every min_skip-th frame (FRAME_SKIP)
+    - Backs off when the measured detection latency no longer fits the frame budget,
+      and speeds up again (with hysteresis) when detection gets faster
+    """
+    
+    def __init__(self, min_skip=FRAME_SKIP, max_skip=30, target_utilization=0.8, alpha=0.2):
+        """
+        :param min_skip: Lower bound on the skip (configured FRAME_SKIP)
+        :param max_skip: Upper bound on the skip
+        :param target_utilization: Fraction of the analysis interval detection may use
+        :param alpha: EWMA smoothing factor for the latency
+        """
+        self.min_skip = max(int(min_skip), 1)
+        self.max_skip = max(int(max_skip), self.min_skip)
+        self.target_utilization = target_utilization
+        self.alpha = alpha
+        self.latency = None
+        self.skip = self.min_skip
+    
+    def record_latency(self, seconds):
+        """Fold one detection latency measurement into the EWMA"""
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency += self.alpha * (seconds - self.latency)
+    
+    def update(self, source_fps):
+        """
+        Recompute the skip for the camera's frame rate
+        :return: Frames to skip per analyzed frame
+        """
+        if self.latency is None or not source_fps:
+            return self.skip
+        
+        # Frames that arrive while one detection runs (at the target utilization)
+        needed = self.latency * source_fps / self.target_utilization
+        if needed > self.skip or needed < self.skip - 1:
+            self.skip = min(max(math.ceil(needed), self.min_skip), self.max_skip)
+        return self.skip
+    
+    def fit_rate(self, source_fps, rate):
+        """
+        Skip that still delivers rate analyses per second, for callers that run analyses
+        in parallel (the serial latency model in update() would throttle them)
+        :return: Frames to skip per analyzed frame
+        """
+        if not source_fps or not rate:
+            return self.skip
+        self.skip = min(max(int(source_fps // rate), self.min_skip), self.max_skip)
+        return self.skip
+    
+    def get_stats(self, source_fps=None):
+        return {
+            'skip': self.skip,
+            'min_skip': self.min_skip,
+            'detection_latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'target_analysis_fps': round(source_fps / self.skip, 2) if source_fps else None
+        }
 
 
 class VideoProcessor:
@@ -17,68 +163,175 @@ class VideoProcessor:
     - Snapshot capture
     """
     
-    def __init__(self, source=0, name="Camera-1"):
+    def __init__(self, source=0, name="Camera-1", ring_slots=10, shared_memory=False, adaptive_skip=True,
+                 connect_timeout=CAMERA_TIMEOUT, reconnect_attempts=CAMERA_RECONNECT_ATTEMPTS,
+                 backend=CAPTURE_BACKEND, ffmpeg_options=None):
         """
         Initialize video processor
-        :param source: Video source (0 for webcam, RTSP URL for IP camera)
+        :param source: Video source (0 for webcam, RTSP URL for IP camera, synthetic:// URL for a
+                       generated test scene, see utils.synthetic_source)
         :param name: Camera identifier
+        :param ring_slots: Frames kept in the frame ring (zero-copy views stay valid this long)
+        :param shared_memory: Put the frame ring in shared memory so other processes can attach
+        :param adaptive_skip: Adapt skip_frames to the reported detection latency
+        :param connect_timeout: Open/read timeout for network sources (seconds)
+        :param reconnect_attempts: Reconnect attempts (with exponential backoff) before giving up
+        :param backend: 'opencv' or 'ffmpeg' (decoder scales to resize_width x resize_height itself)
+        :param ffmpeg_options: FFmpegCapture options for the 'ffmpeg' backend (threads, keyframes_only,
+                               fps, pixel_format...)
         """
+        if backend not in ('opencv', 'ffmpeg'):
+            raise ValueError(f"Unknown capture backend: {backend}")
         self.source = source
         self.name = name
+        self.backend = backend
+        self.ffmpeg_options = dict(ffmpeg_options or {})
         self.cap = None
         self.is_running = False
-        self.frame_queue = queue.Queue(maxsize=10)
-        self.latest_frame = None
-        self.fps = 0
+        self.stopped_by_user = False  # Set by stop_capture so supervisors leave the camera alone
+        
+        # Connection state and reconnect policy
+        self.state = 'disconnected'  # connecting / connected / reconnecting / failed
+        self.connect_timeout = connect_timeout
+        self.reconnect_attempts = reconnect_attempts
+        self.backoff_base = 0.5
+        self.backoff_max = 30.0
+        self.max_read_failures = 3  # Consecutive failed reads before reconnecting
+        self.reconnects = 0
+        self.last_error = None
+        self.stop_event = threading.Event()
+        
+        # Frames are decoded once into the ring; each consumer reads through its own cursor
+        self.frame_ring = FrameRing(num_slots=ring_slots, shared=shared_memory)
+        self.fps = 0  # Nominal source FPS (CAP_PROP_FPS)
         self.frame_count = 0
         self.recording = False
         self.video_writer = None
+        self.last_recording_stats = None
+        self.pre_event_buffer = None
+        self.broadcaster = None
         
         # Performance optimization
-        self.skip_frames = 1  # Process every Nth frame
+        self.rate_controller = AnalysisRateController()
+        self.adaptive_skip = adaptive_skip
+        self.skip_frames = self.rate_controller.skip  # Process every Nth frame
+        self.target_analysis_rate = None  # Set by an external scheduler, overrides adaptive_skip
+        self.frames_grabbed = 0  # Skipped frames (grabbed, never decoded)
+        self.decode_demands = {}  # consumer -> frames per second it needs decoded (math.inf = every frame)
+        
+        # Measured rates and drop accounting (read without locks)
+        self.capture_meter = RateMeter()
+        self.decode_meter = RateMeter()
+        self.analysis_meter = RateMeter()
+        self.read_failures = 0
+        self.dwell_times = SampleWindow()
+        self.sequential_cursors = weakref.WeakSet()
+        self.frame_cursor = self.create_cursor('sequential')
         self.resize_width = 640  # Resize for faster processing
         self.resize_height = 480
         
+        # Denoising: default tier for preprocess_frame and measured cost per tier
+        self.denoise_tier = 'none'
+        self.temporal_frames = 3  # Ring frames averaged by the 'temporal' tier
+        self.temporal_motion_threshold = 40  # Pixels changing more than this are not averaged
+        self.denoise_costs = {tier: SampleWindow(128) for tier in DENOISE_TIERS}
+        
         # Thread for capturing frames
         self.capture_thread = None
         
     def connect(self):
         """Connect to video source"""
+        self.state = 'connecting'
         try:
-            self.cap = cv2.VideoCapture(self.source)
+            if self.cap is not None:
+                self.cap.release()
+            if is_synthetic_source(self.source):
+                self.cap = SyntheticCapture.from_url(self.source)
+            elif self.backend == 'ffmpeg':
+                self.cap = FFmpegCapture(self.source, self.resize_width, self.resize_height,
+                                         timeout=self.connect_timeout, **self.ffmpeg_options)
+            elif isinstance(self.source, str):
+                # Bound how long a dead network stream can block (FFmpeg backend)
+                timeout_ms = int(self.connect_timeout * 1000)
+                self.cap = cv2.VideoCapture(self.source, cv2.CAP_ANY, [
+                    cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_ms,
+                    cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_ms
+                ])
+            else:
+                self.cap = cv2.VideoCapture(self.source)
             
             # Set camera properties for better performance
-            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.resize_width)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resize_height)
+            if self.backend == 'opencv':
+                self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.resize_width)
+                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resize_height)
             
             if self.cap.isOpened():
                 self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30
+                self.state = 'connected'
                 print(f"✅ {self.name} connected - FPS: {self.fps}")
                 return True
             else:
+                self.state = 'failed'
+                self.last_error = 'open_failed'
                 print(f"❌ Failed to connect to {self.name}")
                 return False
                 
         except Exception as e:
+            self.state = 'failed'
+            self.last_error = str(e)
             print(f"❌ Connection error for {self.name}: {str(e)}")
             return False
     
+    def reconnect(self):
+        """
+        Reconnect with exponential backoff (up to reconnect_attempts tries)
+        :return: True once connected again, False when giving up or stopped
+        """
+        self.state = 'reconnecting'
+        if self.cap is not None:
+            self.cap.release()
+        
+        for attempt in range(self.reconnect_attempts):
+            delay = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+            if self.stop_event.wait(delay):
+                return False
+            print(f"🔄 {self.name}: reconnect attempt {attempt + 1}/{self.reconnect_attempts}")
+            if self.connect():
+                self.reconnects += 1
+                return True
+        
+        self.state = 'failed'
+        print(f"❌ {self.name}: giving up after {self.reconnect_attempts} reconnect attempts")
+        return False
+    
     def disconnect(self):
         """Disconnect from video source"""
         self.is_running = False
+        self.stopped_by_user = True
+        self.stop_event.set()
+        self.state = 'disconnected'
         if self.cap:
             self.cap.release()
         if self.video_writer:
             self.video_writer.release()
+        if self.pre_event_buffer:
+            self.pre_event_buffer.stop()
+        if self.broadcaster:
+            self.broadcaster.stop()
+        self.frame_ring.close()
         print(f"🔌 {self.name} disconnected")
     
     def start_capture(self):
         """Start capturing frames in background thread"""
+        self.stopped_by_user = False
+        if self.capture_thread is not None and self.capture_thread.is_alive():
+            return True
         if not self.cap or not self.cap.isOpened():
             if not self.connect():
                 return False
         
+        self.stop_event.clear()
         self.is_running = True
         self.capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
         self.capture_thread.start()
@@ -87,7 +340,9 @@ class VideoProcessor:
     
     def stop_capture(self):
         """Stop capturing frames"""
+        self.stopped_by_user = True
         self.is_running = False
+        self.stop_event.set()
         if self.capture_thread:
             self.capture_thread.join(timeout=2)
         print(f"⏹️ {self.name} capture stopped")
@@ -95,64 +350,177 @@ class VideoProcessor:
     def _capture_loop(self):
         """Background thread for capturing frames"""
         frame_counter = 0
+        consecutive_failures = 0
         
         while self.is_running:
             try:
-                ret, frame = self.cap.read()
+                # Skipped frames are only grabbed (demuxed), never decoded
+                if (frame_counter + 1) % self.decode_skip() != 0:
+                    if not self.cap.grab():
+                        consecutive_failures = self._handle_read_failure("grab", consecutive_failures + 1)
+                        if consecutive_failures is None:
+                            break
+                        continue
+                    consecutive_failures = 0
+                    frame_counter += 1
+                    self.frames_grabbed += 1
+                    self.capture_meter.tick()
+                    continue
+                
+                # Decode straight into the next ring slot (copied in only when the size changes)
+                slot = self.frame_ring.begin_write()
+                ret, frame = self.cap.read(slot) if slot is not None else self.cap.read()
                 
                 if not ret:
-                    print(f"⚠️ {self.name}: Frame read failed")
-                    time.sleep(0.1)
+                    self.frame_ring.abort()
+                    consecutive_failures = self._handle_read_failure("read", consecutive_failures + 1)
+                    if consecutive_failures is None:
+                        break
                     continue
-                
-                # Skip frames for performance
+                consecutive_failures = 0
                 frame_counter += 1
-                if frame_counter % self.skip_frames != 0:
-                    continue
                 
-                # Store latest frame
-                self.latest_frame = frame.copy()
+                # Publish to all consumers
+                self.frame_ring.commit(frame)
                 self.frame_count += 1
-                
-                # Add to queue (non-blocking)
-                if not self.frame_queue.full():
-                    self.frame_queue.put(frame)
-                
-                # Record if enabled
-                if self.recording and self.video_writer:
-                    self.video_writer.write(frame)
+                now = time.time()
+                self.capture_meter.tick(now)
+                self.decode_meter.tick(now)
                 
             except Exception as e:
                 print(f"❌ Capture error for {self.name}: {str(e)}")
                 time.sleep(0.1)
     
+    def _handle_read_failure(self, operation, consecutive_failures):
+        """
+        Count a failed grab/read; after max_read_failures in a row, reconnect with backoff
+        :return: Consecutive failure count to continue with, or None when capture must stop
+        """
+        self.read_failures += 1
+        if consecutive_failures < self.max_read_failures:
+            print(f"⚠️ {self.name}: Frame {operation} failed")
+            self.stop_event.wait(0.1)
+            return consecutive_failures
+        
+        if self.is_running and self.reconnect():
+            return 0
+        self.is_running = False
+        return None
+    
+    def require_decode_rate(self, consumer, fps=math.inf):
+        """
+        Keep at least fps frames per second decoded for a live consumer (recording, pre-event
+        buffer, grid...), whatever the analysis skip is
+        :param fps: Needed rate, math.inf for every frame
+        """
+        self.decode_demands[consumer] = fps
+    
+    def release_decode_rate(self, consumer):
+        self.decode_demands.pop(consumer, None)
+    
+    def decode_skip(self):
+        """Skip used by the capture loop: skip_frames, lowered so live consumers get their frame rate"""
+        required = max(list(self.decode_demands.values()), default=0.0)
+        broadcaster = self.broadcaster
+        if broadcaster is not None and broadcaster.is_running:
+            required = max(required, broadcaster.max_fps or math.inf)
+        if not required:
+            return self.skip_frames
+        if math.isinf(required):
+            return 1
+        return max(min(self.skip_frames, int((self.fps or 30) // required)), 1)
+    
+    def report_detection_latency(self, seconds):
+        """
+        Feed back how long analysis of one frame took; with adaptive_skip the
+        capture loop then decodes only as many frames as can be analyzed
+        """
+        self.analysis_meter.tick()
+        self.rate_controller.record_latency(seconds)
+        if self.adaptive_skip and self.target_analysis_rate is None:
+            self.skip_frames = self.rate_controller.update(self.capture_meter.get_rate() or self.fps)
+        return self.skip_frames
+    
+    def set_target_analysis_rate(self, rate):
+        """
+        Hand the analysis rate to a scheduler that analyzes frames in parallel: skip_frames then
+        follows its target rate instead of the latency fed to report_detection_latency
+        :param rate: Analyses per second the scheduler wants (None returns control to adaptive_skip)
+        """
+        self.target_analysis_rate = rate
+        if rate is not None:
+            self.skip_frames = self.rate_controller.fit_rate(self.capture_meter.get_rate() or self.fps, rate)
+        return self.skip_frames
+    
     def get_frame(self, timeout=1.0):
         """
-        Get next frame from queue
+        Get next frame in capture order (frames older than the ring are skipped)
         :param timeout: Wait timeout in seconds
-        :return: Frame or None
+        :return: Frame copy or None
         """
-        try:
-            return self.frame_queue.get(timeout=timeout)
-        except queue.Empty:
-            return None
+        result = self.frame_cursor.next(timeout=timeout, copy=True)
+        return None if result is None else result[0]
     
-    def get_latest_frame(self):
-        """Get the most recent frame"""
-        return self.latest_frame
+    def get_latest_frame(self, copy=True):
+        """
+        Get the most recent frame
+        :param copy: Return a private copy; with copy=False the view is only valid
+                     until the ring wraps (see create_cursor for zero-copy consumers)
+        """
+        result = self.frame_ring.latest(copy=copy)
+        return None if result is None else result[0]
+    
+    def _use_latest_frame(self, use, attempts=3):
+        """
+        Run use(frame) on a zero-copy view of the newest frame and keep the result only if the
+        ring did not overwrite the slot meanwhile (retried on the newer frame, then on a copy)
+        :return: use()'s result, or None without a frame
+        """
+        for _ in range(attempts):
+            result = self.frame_ring.latest(copy=False)
+            if result is None:
+                return None
+            frame, _, seq = result
+            value = use(frame)
+            if self.frame_ring.is_valid(seq):
+                return value
+        result = self.frame_ring.latest(copy=True)
+        return None if result is None else use(result[0])
     
-    def preprocess_frame(self, frame, grayscale=False, denoise=False):
+    def create_cursor(self, policy='latest'):
+        """
+        Independent zero-copy reader for a consumer (detection, streaming, recording...)
+        :param policy: 'latest' skips to the newest frame, 'sequential' reads every frame
+        """
+        cursor = self.frame_ring.cursor(policy, on_read=self.dwell_times.add)
+        if policy == 'sequential':
+            # Frames a sequential reader never got to are counted as overrun drops
+            self.sequential_cursors.add(cursor)
+        return cursor
+    
+    def preprocess_frame(self, frame, grayscale=False, denoise=None, seq=None):
         """
         Preprocess frame for AI model input
         :param frame: Input frame
         :param grayscale: Convert to grayscale
-        :param denoise: Apply denoising
+        :param denoise: Denoise tier (see DENOISE_TIERS); None uses the camera's denoise_tier,
+                        True means 'nlm' and False 'none'
+        :param seq: Ring sequence number of frame ('temporal' tier; default: the newest frame)
         :return: Preprocessed frame
         """
         if frame is None:
             return None
         
-        processed = frame.copy()
+        tier = self.denoise_tier if denoise is None else denoise
+        tier = {True: 'nlm', False: 'none'}.get(tier, tier)
+        if tier not in DENOISE_TIERS:
+            raise ValueError(f"Unknown denoise tier: {tier}")
+        
+        start_time = time.time()
+        if tier == 'temporal':
+            processed = self._temporal_denoise(frame, seq)
+        else:
+            processed = frame.copy()
         
         # Resize for consistent processing
         if processed.shape[1] != self.resize_width or processed.shape[0] != self.resize_height:
@@ -163,66 +531,143 @@ class VideoProcessor:
             processed = cv2.cvtColor(processed, cv2.COLOR_BGR2GRAY)
         
         # Apply denoising
-        if denoise:
-            processed = cv2.fastNlMeansDenoisingColored(processed, None, 10, 10, 7, 21)
+        if tier in ('median', 'bilateral'):
+            processed = self._spatial_denoise(processed, tier)
+        elif tier == 'nlm':
+            if processed.ndim == 2:
+                processed = cv2.fastNlMeansDenoising(processed, None, 10, 7, 21)
+            else:
+                processed = cv2.fastNlMeansDenoisingColored(processed, None, 10, 10, 7, 21)
         
+        if tier != 'none':
+            self.denoise_costs[tier].add(time.time() - start_time)
         return processed
     
+    def _spatial_denoise(self, frame, tier):
+        """Median or bilateral filter on a half-size frame, scaled back up"""
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (width // 2, height // 2), interpolation=cv2.INTER_AREA)
+        if tier == 'median':
+            small = cv2.medianBlur(small, 3)
+        else:
+            small = cv2.bilateralFilter(small, 5, 40, 5)
+        return cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+    
+    def _temporal_denoise(self, frame, seq=None):
+        """
+        Average frame with the preceding frames still in the ring. Pixels that moved
+        (difference above temporal_motion_threshold) keep the current value, so people don't ghost.
+        """
+        seq = self.frame_ring.latest_seq if seq is None else seq
+        total = frame.astype(np.uint16)
+        count = 1
+        gated = np.empty_like(frame)
+        for previous_seq in range(seq - 1, max(seq - self.temporal_frames, 0), -1):
+            result = self.frame_ring.read(previous_seq)
+            if result is None or result[0].shape != frame.shape:
+                break
+            previous = result[0]
+            still = cv2.compare(cv2.absdiff(previous, frame), self.temporal_motion_threshold, cv2.CMP_LT)
+            np.copyto(gated, frame)
+            cv2.copyTo(previous, still, gated)
+            if not self.frame_ring.is_valid(previous_seq):
+                break  # Overwritten while reading
+            cv2.add(total, gated, dst=total, dtype=cv2.CV_16U)
+            count += 1
+        return cv2.convertScaleAbs(total, alpha=1.0 / count)
+    
+    def set_denoise_tier(self, tier):
+        """Default denoise tier for this camera (e.g. 'temporal' at night)"""
+        if tier not in DENOISE_TIERS:
+            raise ValueError(f"Unknown denoise tier: {tier}")
+        self.denoise_tier = tier
+        print(f"🌙 {self.name}: denoise tier set to {tier}")
+    
+    def benchmark_denoise(self, frame=None, repeats=3, tiers=DENOISE_TIERS):
+        """
+        Measure the cost of each denoise tier on a frame
+        :return: {tier: median milliseconds per frame}
+        """
+        frame = self.get_latest_frame() if frame is None else frame
+        if frame is None:
+            return {}
+        costs = {}
+        for tier in tiers:
+            timings = []
+            for _ in range(repeats):
+                start_time = time.time()
+                self.preprocess_frame(frame, denoise=tier)
+                timings.append((time.time() - start_time) * 1000)
+            costs[tier] = round(float(np.median(timings)), 2)
+        return costs
+    
     def capture_snapshot(self, filename=None):
         """
         Capture and save current frame as snapshot
         :param filename: Output filename (auto-generated if None)
         :return: Filename or None
         """
-        frame = self.get_latest_frame()
-        if frame is None:
-            return None
-        
         if filename is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"snapshot_{self.name}_{timestamp}.jpg"
         
         try:
-            cv2.imwrite(filename, frame)
+            # Encoded in memory so a frame torn by the capture thread never reaches the file
+            extension = os.path.splitext(filename)[1] or '.jpg'
+            encoded = self._use_latest_frame(lambda frame: cv2.imencode(extension, frame)[1])
+            if encoded is None:
+                return None
+            encoded.tofile(filename)
             print(f"📸 Snapshot saved: {filename}")
             return filename
         except Exception as e:
             print(f"❌ Failed to save snapshot: {str(e)}")
             return None
     
+    def get_broadcaster(self, **kwargs):
+        """
+        Shared MJPEG broadcaster of this camera: frames are encoded once for all viewers
+        :param kwargs: MJPEGBroadcaster options (only used when it is created)
+        """
+        if self.broadcaster is None:
+            self.broadcaster = MJPEGBroadcaster(self.create_cursor('latest'), name=self.name, **kwargs)
+        return self.broadcaster
+    
     def get_frame_as_base64(self, frame=None):
         """
         Convert frame to base64 for web transmission
         :param frame: Frame to convert (uses latest if None)
         :return: Base64 encoded string
         """
-        if frame is None:
-            frame = self.get_latest_frame()
-        
-        if frame is None:
-            return None
-        
         try:
-            _, buffer = cv2.imencode('.jpg', frame)
+            if frame is None:
+                buffer = self._use_latest_frame(lambda latest: cv2.imencode('.jpg', latest)[1])
+            else:
+                buffer = cv2.imencode('.jpg', frame)[1]
+            if buffer is None:
+                return None
             jpg_as_text = base64.b64encode(buffer).decode('utf-8')
             return f"data:image/jpeg;base64,{jpg_as_text}"
         except Exception as e:
             print(f"❌ Base64 encoding failed: {str(e)}")
             return None
     
-    def start_recording(self, filename=None, codec='mp4v'):
+    def start_recording(self, filename=None, codec='mp4v', queue_size=60, policy='drop_oldest'):
         """
         Start recording video
         :param filename: Output filename
         :param codec: Video codec
+        :param queue_size: Frames buffered for the writer thread
+        :param policy: When the encoder falls behind: 'drop_oldest', 'drop_newest' or 'block'
+                       ('block' only holds back the recorder's own cursor thread, never capture)
         :return: Success status
         """
         if self.recording:
             print("⚠️ Already recording")
             return False
         
-        frame = self.get_latest_frame()
-        if frame is None:
+        frame_size = self._use_latest_frame(lambda frame: frame.shape[:2])
+        if frame_size is None:
             print("❌ No frame available to start recording")
             return False
         
@@ -232,17 +677,28 @@ class VideoProcessor:
         
         try:
             fourcc = cv2.VideoWriter_fourcc(*codec)
-            height, width = frame.shape[:2]
+            height, width = frame_size
             
-            self.video_writer = cv2.VideoWriter(
-                filename, fourcc, self.fps, (width, height)
+            # Every frame is decoded while recording; the file is tagged with the rate it is fed at
+            self.require_decode_rate('recording')
+            fps = (self.fps or 30) / self.decode_skip()
+            self.video_writer = AsyncVideoWriter(
+                filename, fourcc, fps, (width, height), queue_size=queue_size, policy=policy
             )
+            if not self.video_writer.isOpened():
+                print(f"❌ Failed to open video writer: {filename}")
+                self.video_writer = None
+                self.release_decode_rate('recording')
+                return False
             
+            # The writer reads the ring through its own cursor; the capture thread never waits on it
+            self.video_writer.start(self.create_cursor('sequential'))
             self.recording = True
             print(f"🔴 Recording started: {filename}")
             return True
             
         except Exception as e:
+            self.release_decode_rate('recording')
             print(f"❌ Failed to start recording: {str(e)}")
             return False
     
@@ -252,13 +708,40 @@ class VideoProcessor:
             return None
         
         self.recording = False
+        self.release_decode_rate('recording')
         if self.video_writer:
-            self.video_writer.release()
-            self.video_writer = None
+            video_writer, self.video_writer = self.video_writer, None
+            video_writer.release()
+            self.last_recording_stats = video_writer.get_stats()
         
         print("⏺️ Recording stopped")
         return True
     
+    def enable_pre_event_buffer(self, pre_seconds=10.0, post_seconds=5.0, fps=10.0, **kwargs):
+        """
+        Keep the last pre_seconds of frames in memory (JPEG) so incident clips
+        can start before the alert, without continuous recording
+        :return: The PreEventBuffer
+        """
+        if self.pre_event_buffer is None:
+            self.pre_event_buffer = PreEventBuffer(pre_seconds, post_seconds, fps,
+                                                   name=self.name.replace(' ', '_'), **kwargs)
+            self.require_decode_rate('pre_event_buffer', fps)
+            self.pre_event_buffer.start(self.create_cursor('sequential'))
+            print(f"⏪ {self.name}: pre-event buffer enabled ({pre_seconds}s pre / {post_seconds}s post)")
+        return self.pre_event_buffer
+    
+    def save_incident_clip(self, reason="alert"):
+        """
+        Flush pre-roll + post-roll to disk for an alert (done automatically by the detection
+        scheduler and the worker pipelines when an analysis requires an alert)
+        :return: Path of the clip being written, or None without a pre-event buffer
+        """
+        if self.pre_event_buffer is None:
+            print(f"⚠️ {self.name}: pre-event buffer not enabled")
+            return None
+        return self.pre_event_buffer.trigger(reason)
+    
     def draw_detections(self, frame, detections, show_count=True):
         """
         Draw bounding boxes and labels on frame
@@ -313,10 +796,38 @@ class VideoProcessor:
             'name': self.name,
             'source': self.source,
             'is_running': self.is_running,
-            'fps': self.fps,
+            'state': self.state,
+            'reconnects': self.reconnects,
+            'last_error': self.last_error,
+            'fps': round(self.capture_meter.get_rate(), 2),
+            'nominal_fps': self.fps,
+            'decode_fps': round(self.decode_meter.get_rate(), 2),
+            'analysis_fps': round(self.analysis_meter.get_rate(), 2),
+            'frames_captured': self.capture_meter.count,
             'frames_processed': self.frame_count,
-            'queue_size': self.frame_queue.qsize(),
+            'frames_skipped': self.frames_grabbed,
+            'decode_skip': self.decode_skip(),
+            'frames_dropped': {
+                'skip': self.frames_grabbed,
+                'read_failure': self.read_failures,
+                'overrun': sum(cursor.skipped for cursor in list(self.sequential_cursors))
+            },
+            'dwell_ms': self.dwell_times.percentiles(),
+            'analysis_rate': self.rate_controller.get_stats(self.capture_meter.get_rate() or self.fps),
+            'queue_size': self.frame_cursor.pending(),
+            'ring_seq': self.frame_ring.latest_seq,
+            'ring_slots': self.frame_ring.num_slots,
+            'shared_memory': self.frame_ring.name,
             'recording': self.recording,
+            'recording_writer': (self.video_writer.get_stats() if self.video_writer
+                                 else self.last_recording_stats),
+            'pre_event_buffer': self.pre_event_buffer.get_stats() if self.pre_event_buffer else None,
+            'stream': self.broadcaster.get_stats() if self.broadcaster else None,
+            'denoise': {
+                'tier': self.denoise_tier,
+                'cost_ms': {tier: window.percentiles((50, 95)) for tier, window in self.denoise_costs.items()
+                            if window.count}
+            },
             'connected': self.cap is not None and self.cap.isOpened()
         }
 
@@ -324,11 +835,37 @@ class VideoProcessor:
 class MultiCameraProcessor:
     """
     Manages multiple camera streams simultaneously
+    - 'threads' mode: one capture thread per camera in this process
+    - 'processes' mode: cameras sharded over worker processes that also run detection;
+      only metrics and JPEG thumbnails come back to this process
     """
     
-    def __init__(self):
+    def __init__(self, mode='threads', num_workers=None):
+        """
+        :param mode: 'threads' or 'processes'
+        :param num_workers: Worker processes in 'processes' mode (default MAX_WORKERS)
+        """
+        if mode not in ('threads', 'processes'):
+            raise ValueError(f"Unknown mode: {mode}")
         self.cameras = {}
         self.is_running = False
+        self.mode = mode
+        self.worker_pool = None
+        
+        # Parallel connect and background reconnect supervisor ('threads' mode)
+        self.connect_workers = 16
+        self.supervisor_interval = 1.0
+        self.retry_backoff_base = 1.0
+        self.retry_backoff_max = 60.0
+        self.retry_state = {}  # camera_id -> {'attempts', 'next_retry', 'pending'}
+        self.connect_executor = None
+        self.supervisor_thread = None
+        self.stop_event = threading.Event()
+        self.compositor = None
+        self.grid_broadcaster = None
+        if mode == 'processes':
+            from utils.camera_workers import CameraWorkerPool, MAX_WORKERS
+            self.worker_pool = CameraWorkerPool(num_workers or MAX_WORKERS)
         
     def add_camera(self, camera_id, source, name=None):
         """
@@ -340,13 +877,29 @@ class MultiCameraProcessor:
         if name is None:
             name = f"Camera-{camera_id}"
         
+        if self.worker_pool is not None:
+            self.cameras[camera_id] = self.worker_pool.add_camera(camera_id, source, name)
+            if self.compositor:
+                self.compositor.add_source(camera_id, self._grid_source(camera_id))
+            print(f"➕ Added {name} (ID: {camera_id}) to worker pool")
+            return None
+        
         processor = VideoProcessor(source, name)
         self.cameras[camera_id] = processor
+        if self.compositor:
+            self.compositor.add_source(camera_id, self._grid_source(camera_id))
+            processor.require_decode_rate('grid', self.compositor.max_fps)
         print(f"➕ Added {name} (ID: {camera_id})")
         return processor
     
     def remove_camera(self, camera_id):
         """Remove camera from processor"""
+        if self.compositor:
+            self.compositor.remove_source(camera_id)
+        if self.worker_pool is not None:
+            self.worker_pool.remove_camera(camera_id)
+            self.cameras.pop(camera_id, None)
+            return
         if camera_id in self.cameras:
             self.cameras[camera_id].stop_capture()
             self.cameras[camera_id].disconnect()
@@ -355,17 +908,86 @@ class MultiCameraProcessor:
     
     def start_all(self):
         """Start all cameras"""
-        success_count = 0
-        for camera_id, processor in self.cameras.items():
-            if processor.start_capture():
-                success_count += 1
+        if self.worker_pool is not None:
+            self.worker_pool.start()
+            self.is_running = True
+            return len(self.cameras)
+        
+        # Connect all cameras in parallel so dead streams only cost their own timeout
+        self.stop_event.clear()
+        self.connect_executor = ThreadPoolExecutor(max_workers=self.connect_workers,
+                                                   thread_name_prefix="camera-connect")
+        camera_ids = list(self.cameras.keys())
+        results = list(self.connect_executor.map(
+            lambda camera_id: self.cameras[camera_id].start_capture(), camera_ids))
+        
+        for camera_id, started in zip(camera_ids, results):
+            if not started:
+                self._schedule_retry(camera_id)
+        success_count = sum(results)
         
         self.is_running = True
+        self.supervisor_thread = threading.Thread(target=self._supervise_loop, daemon=True)
+        self.supervisor_thread.start()
         print(f"▶️ Started {success_count}/{len(self.cameras)} cameras")
         return success_count
     
+    def _schedule_retry(self, camera_id):
+        """Back off exponentially before the next restart attempt of a camera"""
+        retry = self.retry_state.setdefault(camera_id, {'attempts': 0, 'next_retry': 0.0, 'pending': False})
+        delay = min(self.retry_backoff_base * (2 ** retry['attempts']), self.retry_backoff_max)
+        retry['attempts'] += 1
+        retry['next_retry'] = time.time() + delay
+        retry['pending'] = False
+    
+    def _retry_camera(self, camera_id):
+        processor = self.cameras.get(camera_id)
+        if processor is None or processor.stopped_by_user or self.stop_event.is_set():
+            return
+        if processor.start_capture():
+            self.retry_state.pop(camera_id, None)
+            print(f"🔄 {processor.name} back online")
+        else:
+            self._schedule_retry(camera_id)
+    
+    def _supervise_loop(self):
+        """
+        Restart cameras whose connect failed or whose capture gave up reconnecting; cameras
+        stopped with stop_capture or never started are left alone
+        """
+        while not self.stop_event.wait(self.supervisor_interval):
+            now = time.time()
+            for camera_id, processor in list(self.cameras.items()):
+                if processor.stopped_by_user:
+                    self.retry_state.pop(camera_id, None)
+                    continue
+                if processor.is_running or processor.state != 'failed':
+                    continue
+                retry = self.retry_state.get(camera_id)
+                if retry is None:
+                    # Capture gave up on its own: start backing off from now
+                    self._schedule_retry(camera_id)
+                    continue
+                if not retry['pending'] and now >= retry['next_retry']:
+                    retry['pending'] = True
+                    self.connect_executor.submit(self._retry_camera, camera_id)
+    
     def stop_all(self):
         """Stop all cameras"""
+        if self.grid_broadcaster:
+            self.grid_broadcaster.stop()
+        if self.worker_pool is not None:
+            self.worker_pool.stop()
+            self.is_running = False
+            return
+        
+        self.stop_event.set()
+        if self.supervisor_thread:
+            self.supervisor_thread.join(timeout=2)
+        if self.connect_executor:
+            self.connect_executor.shutdown(wait=False)
+        self.retry_state.clear()
+        
         for processor in self.cameras.values():
             processor.stop_capture()
             processor.disconnect()
@@ -374,66 +996,109 @@ class MultiCameraProcessor:
         print("⏹️ All cameras stopped")
     
     def get_camera(self, camera_id):
-        """Get specific camera processor"""
+        """Get specific camera processor (None in 'processes' mode: frames stay in the workers)"""
+        if self.worker_pool is not None:
+            return None
         return self.cameras.get(camera_id)
     
-    def get_all_frames(self):
-        """Get latest frame from all cameras"""
+    def get_all_frames(self, copy=True):
+        """Get latest frame from all cameras (decoded thumbnails in 'processes' mode)"""
         frames = {}
+        if self.worker_pool is not None:
+            for camera_id in self.cameras:
+                thumbnail = self.worker_pool.get_thumbnail(camera_id)
+                if thumbnail is not None:
+                    frames[camera_id] = cv2.imdecode(np.frombuffer(thumbnail, np.uint8), cv2.IMREAD_COLOR)
+            return frames
+        
         for camera_id, processor in self.cameras.items():
-            frame = processor.get_latest_frame()
+            frame = processor.get_latest_frame(copy=copy)
             if frame is not None:
                 frames[camera_id] = frame
         return frames
     
     def get_all_stats(self):
         """Get statistics from all cameras"""
+        if self.worker_pool is not None:
+            return {
+                camera_id: self.worker_pool.get_metrics(camera_id)
+                for camera_id in self.cameras
+            }
         return {
             camera_id: processor.get_stats()
             for camera_id, processor in self.cameras.items()
         }
     
-    def create_grid_view(self, max_cols=2):
+    def create_scheduler(self, analyze, **kwargs):
         """
-        Create grid view of all camera feeds
-        :param max_cols: Maximum columns in grid
-        :return: Combined grid frame
+        Detection scheduler sharing one worker pool across all cameras ('threads' mode),
+        analyzing risky cameras more often
+        :param analyze: callable(camera_id, frame, captured_at) -> result dict with 'risk_level'
+        :param kwargs: DetectionScheduler options (pool_size, min_rate...)
         """
-        frames = self.get_all_frames()
-        if not frames:
-            return None
-        
-        # Get frame dimensions
-        sample_frame = next(iter(frames.values()))
-        height, width = sample_frame.shape[:2]
+        from utils.detection_scheduler import DetectionScheduler
         
-        # Calculate grid dimensions
-        num_cameras = len(frames)
-        cols = min(num_cameras, max_cols)
-        rows = (num_cameras + cols - 1) // cols
-        
-        # Create blank grid
-        grid_height = height * rows
-        grid_width = width * cols
-        grid = np.zeros((grid_height, grid_width, 3), dtype=np.uint8)
+        if self.worker_pool is not None:
+            raise RuntimeError("'processes' mode analyzes cameras inside the worker processes")
+        scheduler = DetectionScheduler(analyze, **kwargs)
+        for camera_id, processor in self.cameras.items():
+            scheduler.add_camera(camera_id, processor)
+        return scheduler
+    
+    def get_compositor(self, **kwargs):
+        """
+        Long-lived grid renderer over all cameras (created on first use)
+        :param kwargs: GridCompositor options (tile_size, max_cols, max_fps...), used when it is created
+        """
+        if self.compositor is None:
+            sources = {camera_id: self._grid_source(camera_id) for camera_id in self.cameras}
+            self.compositor = GridCompositor(sources, labels=self._camera_name, **kwargs)
+            if self.worker_pool is None:
+                for processor in self.cameras.values():
+                    processor.require_decode_rate('grid', self.compositor.max_fps)
+        return self.compositor
+    
+    def _grid_source(self, camera_id):
+        """Per-camera frame source for the compositor: a ring cursor, or the newest thumbnail"""
+        if self.worker_pool is None:
+            return self.cameras[camera_id].create_cursor('latest')
         
-        # Place frames in grid
-        for idx, (camera_id, frame) in enumerate(frames.items()):
-            row = idx // cols
-            col = idx % cols
-            
-            y_start = row * height
-            y_end = y_start + height
-            x_start = col * width
-            x_end = x_start + width
-            
-            # Add camera label
-            processor = self.cameras[camera_id]
-            frame_with_label = processor.add_camera_label(frame.copy())
-            
-            grid[y_start:y_end, x_start:x_end] = frame_with_label
+        last_thumbnail = [None]
         
-        return grid
+        def poll_thumbnail():
+            thumbnail = self.worker_pool.get_thumbnail(camera_id)
+            if thumbnail is None or thumbnail is last_thumbnail[0]:
+                return None  # Unchanged: the tile keeps its pixels
+            last_thumbnail[0] = thumbnail
+            return cv2.imdecode(np.frombuffer(thumbnail, np.uint8), cv2.IMREAD_COLOR)
+        return poll_thumbnail
+    
+    def create_grid_view(self, max_cols=2, copy=True):
+        """
+        Create grid view of all camera feeds
+        :param max_cols: Maximum columns in grid (when the compositor is created)
+        :param copy: Return a private copy of the compositor's canvas
+        :return: Combined grid frame
+        """
+        grid = self.get_compositor(max_cols=max_cols).render()
+        if grid is None:
+            return None
+        return grid.copy() if copy else grid
+    
+    def get_grid_broadcaster(self, **kwargs):
+        """
+        MJPEG stream of the grid view; the canvas is only re-encoded when a tile changed
+        :param kwargs: MJPEGBroadcaster options (quality, width, max_fps), used when it is created
+        """
+        if self.grid_broadcaster is None:
+            compositor = self.get_compositor()
+            kwargs.setdefault('max_fps', compositor.max_fps)
+            self.grid_broadcaster = MJPEGBroadcaster(compositor.poll, name="grid", **kwargs)
+        return self.grid_broadcaster
+    
+    def _camera_name(self, camera_id):
+        camera = self.cameras[camera_id]
+        return camera['name'] if isinstance(camera, dict) else camera.name
 
 
 # Example usage and testing